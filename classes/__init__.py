@@ -1,7 +1,14 @@
 from .experiment import *
 from .machine_config import *
 from .generator import *
+from .instruction import *
+from .peephole import *
+from .code_analysis import *
+from .register_allocator import *
 from .compiler import *
+from .build_cache import *
+from .build_graph import *
 from .constants import *
 from .logger import *
+from .result_store import *
 from .execution_manager import *
\ No newline at end of file
@@ -0,0 +1,127 @@
+import os
+import shutil
+import hashlib
+from .logger import Logger
+
+class BuildCache:
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def hash_path(self, key, path):
+        if os.path.isfile(path):
+            with open(path, 'rb') as file:
+                key.update(hashlib.sha256(file.read()).digest())
+            return True
+        elif os.path.isdir(path):
+            # Directories (includes, libraries) are identified by the size and modification time of their files
+            for name in sorted(os.listdir(path)):
+                stat = os.stat(os.path.join(path, name))
+                key.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+            return True
+        return False
+
+    def get_key(self, command, outfile, code=None):
+        # Flags are collected through sets, so the order of arguments must not influence the key
+        arguments = command.split(' ')
+        key = hashlib.sha256()
+
+        if not code is None:
+            key.update(hashlib.sha256(code.encode()).digest())
+
+        cc = shutil.which(arguments[0])
+        if not cc is None:
+            stat = os.stat(cc)
+            key.update(f"{cc}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+        tokens = []
+        skip = False
+        for argument in arguments[1:]:
+            if skip or argument == outfile:
+                skip = False
+                continue
+            if argument == "-o":
+                skip = True
+                continue
+
+            # Replace paths by their contents, so identical builds in other directories match
+            path = argument
+            for prefix in ["@", "-I", "-L"]:
+                if path.startswith(prefix):
+                    path = path[len(prefix):]
+                    break
+
+            path_key = hashlib.sha256()
+            if path and self.hash_path(path_key, path):
+                tokens.append(f"{argument[:len(argument) - len(path)]}{path_key.hexdigest()}")
+            else:
+                tokens.append(argument)
+
+        for token in sorted(tokens):
+            key.update(token.encode())
+            key.update(b'\0')
+
+        return key.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def place(self, source, destination):
+        if os.path.exists(destination):
+            os.unlink(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+
+    def load(self, key, outfile):
+        cache_path = self.get_path(key)
+        if not os.path.exists(cache_path):
+            return False
+
+        try:
+            self.place(cache_path, outfile)
+            # Mark as recently used
+            os.utime(cache_path)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, outfile):
+        if not os.path.isfile(outfile):
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Store aside and move into place, generator processes may race to store the same build
+        temp_path = f"{self.get_path(key)}.{os.getpid()}.tmp"
+        try:
+            self.place(outfile, temp_path)
+            os.replace(temp_path, self.get_path(key))
+        except OSError as e:
+            Logger.warn(f"Could not store {outfile} in the build cache: {e}")
+            return
+
+        self.evict()
+
+    def evict(self):
+        # Remove least recently used builds until the cache fits its size limit
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        size = sum([entry[1] for entry in entries])
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.unlink(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            size -= entry_size
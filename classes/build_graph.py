@@ -0,0 +1,100 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .logger import Logger
+
+class BuildNode:
+    def __init__(self, name, function, args, dependencies, local, partial):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.dependencies = dependencies
+        self.local = local
+        self.partial = partial
+
+class BuildGraph:
+    def __init__(self, jobs=None):
+        self.jobs = jobs if not jobs is None else os.cpu_count()
+        self.nodes = {}
+        self.pending = []
+        self.results = {}
+        self.failures = {}
+        self.scopes = {}
+
+    def scope(self, name):
+        # Unique prefix for the nodes of a kernel that is added multiple times
+        self.scopes[name] = self.scopes.get(name, 0) + 1
+        return f"{name}#{self.scopes[name]}"
+
+    def add(self, name, function, args=(), dependencies=[], local=False, partial=False):
+        # The function is called with its arguments followed by the results of its dependencies
+        # Local nodes run in the scheduling process and may add nodes, partial nodes also run when dependencies failed
+        if not name in self.nodes.keys():
+            self.nodes[name] = BuildNode(name, function, tuple(args), list(dependencies), local, partial)
+            self.pending.append(name)
+        return name
+
+    def get_result(self, name, default=None):
+        result = self.results.get(name)
+        return result if not result is None else default
+
+    def is_finished(self, name):
+        return name in self.results.keys() or name in self.failures.keys()
+
+    def fail(self, name, reason):
+        self.failures[name] = reason
+        Logger.warn(f"Build step {name} failed: {reason}")
+
+    def start(self, executor, running):
+        # Start all nodes of which the dependencies are finished, returns whether any node finished locally
+        progressed = False
+        for name in list(self.pending):
+            node = self.nodes[name]
+            if not all([self.is_finished(dependency) for dependency in node.dependencies]):
+                continue
+            self.pending.remove(name)
+
+            failed = [dependency for dependency in node.dependencies if dependency in self.failures.keys()]
+            if failed and not node.partial:
+                self.fail(name, f"dependency {failed[0]} failed")
+                progressed = True
+                continue
+
+            args = node.args + tuple([self.results.get(dependency) for dependency in node.dependencies])
+            if node.local:
+                try:
+                    self.results[name] = node.function(*args)
+                except Exception as e:
+                    traceback.print_exception(type(e), e, e.__traceback__)
+                    self.fail(name, ''.join(traceback.format_exception_only(type(e), e)).strip())
+                progressed = True
+            else:
+                running[executor.submit(node.function, *args)] = name
+
+        return progressed
+
+    def run(self):
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            while True:
+                if self.start(executor, running):
+                    continue
+                if not running:
+                    break
+
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except BaseException as e:
+                        traceback.print_exception(type(e), e, e.__traceback__)
+                        self.fail(name, ''.join(traceback.format_exception_only(type(e), e)).strip())
+
+        for name in self.pending:
+            self.fail(name, f"unresolved dependencies {[dependency for dependency in self.nodes[name].dependencies if not self.is_finished(dependency)]}")
+        self.pending = []
+
+        if self.failures:
+            Logger.warn(f"{len(self.failures)} of {len(self.nodes)} build steps failed.")
+        return len(self.failures) == 0
@@ -0,0 +1,268 @@
+from .instruction import Instruction, Register, Memory, Masked, Label, LabelRef
+
+class Access:
+    __slots__ = ("reads", "writes", "memory_reads", "memory_writes", "barrier", "jump")
+
+    def __init__(self):
+        self.reads = set()
+        self.writes = set()
+        self.memory_reads = []
+        self.memory_writes = []
+        self.barrier = False
+        self.jump = False
+
+class CodeAnalysis:
+    READ_ONLY = ["cmp", "test", "vucomi", "vcomi", "vptest"]
+    READ_WRITE = ["add", "sub", "and", "or", "xor", "adc", "sbb", "inc", "dec", "neg", "not", "shl", "shr", "sar", "sal", "rol", "ror", "imul", "vfmadd", "vfmsub", "vfnmadd", "vfnmsub"]
+    WRITE = ["mov", "lea", "v", "cvt", "kmov"]
+    # Idioms that clear a register when all register operands are the same, without depending on its value
+    ZERO_IDIOMS = ["xor", "sub", "vxor", "vpxor", "vpsub"]
+    # Registers read and written by instructions besides their operands
+    IMPLICIT = {"divq": (["rax", "rdx"], ["rax", "rdx"])}
+    # Size in bytes of the registers per column, accesses without register operands are assumed to be as wide as the widest register
+    REGISTER_BYTES = {"default": [8, 4, 2, 1, 1], "simd": [64, 32, 16], "mask": [8]}
+    ACCESS_BYTES = 64
+
+    def __init__(self, register_sets):
+        # Registers are identified by their set and row, such that all sizes of a register are the same location
+        self.physical = {}
+        self.names = {}
+        for set_name, rows in register_sets.items():
+            for row, names in enumerate(rows):
+                for column, name in enumerate(names):
+                    if not name is None:
+                        self.physical[name] = (set_name, row)
+                        self.names[(set_name, row, column)] = name
+        self.columns = {name: location[2] for location, name in self.names.items()}
+        self.all_registers = set(self.physical.values())
+        self.stack_pointer = self.physical.get("rsp")
+        # Only the stack pointer must be preserved at the end of the function body, callee-saved registers are restored after it
+        self.live_at_exit = set([self.stack_pointer]) if not self.stack_pointer is None else set()
+        self.accesses = {}
+
+    def get_physical(self, operand):
+        if type(operand) == Register:
+            return self.physical.get(operand.name)
+        return None
+
+    def is_partial(self, register):
+        # Writes to 16 and 8 bit registers preserve the remaining bits
+        physical = self.physical[register.name]
+        return physical[0] == "default" and self.columns[register.name] >= 2
+
+    def get_bytes(self, register):
+        return CodeAnalysis.REGISTER_BYTES[self.physical[register.name][0]][self.columns[register.name]]
+
+    def get_access_bytes(self, statement):
+        sizes = [self.get_bytes(operand) for operand in statement.operands if not self.get_physical(operand) is None]
+        return max(sizes) if sizes else CodeAnalysis.ACCESS_BYTES
+
+    def analyze(self, statement):
+        # Statements are replaced rather than modified, so their analysis can be cached
+        cached = self.accesses.get(id(statement))
+        if not cached is None and cached[0] is statement:
+            return cached[1]
+        access = self.analyze_statement(statement)
+        self.accesses[id(statement)] = (statement, access)
+        return access
+
+    def analyze_statement(self, statement):
+        access = Access()
+        if type(statement) == Label:
+            return access
+
+        opcode = statement.opcode
+        operands = statement.operands
+
+        if opcode.startswith('j'):
+            access.jump = True
+            return access
+
+        if len(operands) == 0 or any([type(operand) == LabelRef for operand in operands]):
+            access.barrier = True
+            return access
+
+        if opcode in CodeAnalysis.IMPLICIT.keys():
+            reads, writes = CodeAnalysis.IMPLICIT[opcode]
+            access.reads.update([self.physical[name] for name in reads])
+            access.writes.update([self.physical[name] for name in writes])
+            read_write, write = False, False
+        elif any([opcode.startswith(prefix) for prefix in CodeAnalysis.READ_ONLY]):
+            read_write, write = False, False
+        elif opcode == "imul" and len(operands) > 2:
+            read_write, write = False, True
+        elif any([opcode.startswith(prefix) for prefix in CodeAnalysis.READ_WRITE]):
+            read_write, write = True, True
+        elif any([opcode.startswith(prefix) for prefix in CodeAnalysis.WRITE]):
+            read_write, write = False, True
+        else:
+            access.barrier = True
+            return access
+
+        registers = [operand.name for operand in operands if type(operand) == Register]
+        zero_idiom = len(registers) == len(operands) and len(set(registers)) == 1 and any([opcode.startswith(prefix) for prefix in CodeAnalysis.ZERO_IDIOMS])
+
+        for position, operand in enumerate(operands):
+            destination = write and position == len(operands) - 1
+            # Values masked off by an opmask are kept in the destination unless they are zeroed
+            merge = False
+            if type(operand) == Masked:
+                mask = self.get_physical(operand.mask)
+                if not mask is None:
+                    access.reads.add(mask)
+                merge = destination and not operand.zeroing
+                operand = operand.operand
+            if type(operand) == Register:
+                physical = self.get_physical(operand)
+                if physical is None:
+                    continue
+                if destination:
+                    access.writes.add(physical)
+                    # Legacy SSE instructions merge into the destination register
+                    if (read_write and not zero_idiom) or merge or self.is_partial(operand) or (physical[0] == "simd" and not opcode.startswith('v')):
+                        access.reads.add(physical)
+                elif not zero_idiom:
+                    access.reads.add(physical)
+            elif type(operand) == Memory:
+                for register in operand.get_registers():
+                    physical = self.get_physical(register)
+                    if not physical is None:
+                        access.reads.add(physical)
+                if opcode.startswith("lea"):
+                    continue
+                if destination:
+                    access.memory_writes.append(operand)
+                    if read_write:
+                        access.memory_reads.append(operand)
+                else:
+                    access.memory_reads.append(operand)
+
+        return access
+
+    def get_key(self, memory):
+        # Memory operands are compared by their address registers and displacement, None when the address is unknown
+        try:
+            displacement = int(memory.displacement) if memory.displacement else 0
+        except ValueError:
+            return None
+        registers = [(self.get_physical(register) or register.name) if not register is None else None for register in [memory.base, memory.index]]
+        return (registers[0], registers[1], memory.scale, displacement)
+
+    def may_alias(self, a, a_bytes, b, b_bytes):
+        if a is None or b is None:
+            return True
+        if a[:3] == b[:3]:
+            return a[3] < b[3] + b_bytes and b[3] < a[3] + a_bytes
+        # The stack is never accessed through other registers
+        if (a[0] == self.stack_pointer and a[1] is None) != (b[0] == self.stack_pointer and b[1] is None):
+            return False
+        return True
+
+    def get_blocks(self, code):
+        blocks = []
+        start = 0
+        for i, statement in enumerate(code):
+            if type(statement) == Label and i > start:
+                blocks.append((start, i))
+                start = i
+            if type(statement) == Instruction and statement.opcode.startswith('j'):
+                blocks.append((start, i + 1))
+                start = i + 1
+        if start < len(code):
+            blocks.append((start, len(code)))
+        return blocks
+
+    def get_live_out(self, code, blocks):
+        labels = {}
+        for b, (start, _) in enumerate(blocks):
+            if type(code[start]) == Label:
+                labels[code[start].label] = b
+
+        successors = []
+        for b, (_, end) in enumerate(blocks):
+            last = code[end - 1]
+            following = [b + 1] if b + 1 < len(blocks) else [None]
+            if type(last) == Instruction and last.opcode.startswith('j'):
+                # All registers are live at unknown jump targets
+                targets = [labels.get(operand.label, -1) if type(operand) == LabelRef else -1 for operand in last.operands]
+                successors.append(targets + ([] if last.opcode == "jmp" else following))
+            else:
+                successors.append(following)
+
+        live_in = [set() for _ in blocks]
+        live_out = [set() for _ in blocks]
+        changed = True
+        while changed:
+            changed = False
+            for b in reversed(range(len(blocks))):
+                out = set()
+                for successor in successors[b]:
+                    if successor is None:
+                        out |= self.live_at_exit
+                    elif successor < 0:
+                        out |= self.all_registers
+                    else:
+                        out |= live_in[successor]
+                live = set(out)
+                for statement in code[blocks[b][0]:blocks[b][1]][::-1]:
+                    if statement is None:
+                        continue
+                    access = self.analyze(statement)
+                    if access.barrier:
+                        live = set(self.all_registers)
+                        continue
+                    live = (live - access.writes) | access.reads
+                if out != live_out[b] or live != live_in[b]:
+                    live_out[b] = out
+                    live_in[b] = live
+                    changed = True
+        return live_out
+
+    def get_live_ranges(self, code):
+        # First and last position at which each register holds a value that is used, or is referenced
+        blocks = self.get_blocks(code)
+        live_out = self.get_live_out(code, blocks)
+        ranges = {}
+
+        def extend(register, position):
+            first, last = ranges.get(register, (position, position))
+            ranges[register] = (min(first, position), max(last, position))
+
+        for b, (start, end) in enumerate(blocks):
+            live = set(live_out[b])
+            for position in reversed(range(start, end)):
+                statement = code[position]
+                if statement is None:
+                    continue
+                access = self.analyze(statement)
+                if access.barrier:
+                    live = set(self.all_registers)
+                for register in live | access.writes | access.reads:
+                    extend(register, position)
+                if not access.barrier:
+                    live = (live - access.writes) | access.reads
+        return ranges
+
+    def is_live(self, code, register, start, end, live_out):
+        for statement in code[start:end]:
+            if statement is None:
+                continue
+            access = self.analyze(statement)
+            if access.barrier or register in access.reads:
+                return True
+            if register in access.writes:
+                return False
+        return register in live_out
+
+    def rename(self, statement, source, destination):
+        return Instruction(statement.opcode, [self.rename_operand(operand, source, destination) for operand in statement.operands], indent=statement.indent)
+
+    def rename_operand(self, operand, source, destination):
+        if self.get_physical(operand) == source:
+            return Register(self.names[destination + (self.columns[operand.name],)])
+        if type(operand) == Memory and source in [self.get_physical(register) for register in operand.get_registers()]:
+            registers = [Register(self.names[destination + (self.columns[register.name],)]) if self.get_physical(register) == source else register for register in [operand.base, operand.index]]
+            return Memory(operand.displacement, registers[0], registers[1], operand.scale)
+        if type(operand) == Masked:
+            return Masked(self.rename_operand(operand.operand, source, destination), self.rename_operand(operand.mask, source, destination), operand.zeroing)
+        return operand
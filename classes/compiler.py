@@ -1,9 +1,10 @@
+import os
 import re
 import copy
 import subprocess
 
 class Compiler:
-    def __init__(self, cc, mode='', standard='', debug=False, profile=False, opt='', warn=[], pedantic=False, include=[], lib=[], dmacro={}, umacro='', fopt=[], mopt=[], outfile='', flagfile='', infiles=[], libraries=[]):
+    def __init__(self, cc, mode='', standard='', debug=False, profile=False, opt='', warn=[], pedantic=False, include=[], lib=[], dmacro={}, umacro='', fopt=[], mopt=[], aopt=[], outfile='', flagfile='', infiles=[], libraries=[]):
         self.cc = cc
         self.mode = mode
         self.standard = standard
@@ -18,15 +19,20 @@ class Compiler:
         self.umacro = umacro
         self.fopt = fopt
         self.mopt = mopt
+        self.aopt = aopt
         self.outfile = outfile
         self.flagfile = flagfile
         self.infiles = infiles
         self.libraries = libraries
+        self.cache = None
 
     def prebuild(self, infile, outfile):
         pass
 
-    def compile(self, infile, outfile):
+    def prepare(self):
+        pass
+
+    def get_command(self, infile, outfile):
         # Build compilation command
         cc = self.cc
         mode = (f"-{self.mode}" if self.mode[0] != '-' else self.mode) if self.mode else ''
@@ -42,22 +48,57 @@ class Compiler:
         umacro = (f"-U{self.umacro}" if self.umacro[0] != '-' else self.umacro) if self.umacro else ''
         fopt = ' '.join([(f"-f{f}" if f[0] != '-' else f) for f in self.fopt])
         mopt = ' '.join([(f"-m{m}" if m[0] != '-' else m) for m in self.mopt])
+        aopt = ' '.join([(f"-Wa,{a}" if not a.startswith("-Wa,") else a) for a in self.aopt])
         flagfile = (f"@{self.flagfile}" if self.flagfile[0] != '@' else self.flagfile) if self.flagfile else ''
         libraries = ' '.join([(f"-l{l}" if l[0] != '-' else l) for l in self.libraries])
 
         infiles_str = ' '.join([infile] + self.infiles)
         outfile_str = f"-o {outfile}"
 
-        command = f"{cc} {mode} {standard} {debug_flag} {profile} {opt} {warn} {include} {lib} {dmacro} {umacro} {fopt} {mopt} {outfile_str} {flagfile} {infiles_str} {libraries}"
-        command = re.sub(' +', ' ', command).strip()
+        command = f"{cc} {mode} {standard} {debug_flag} {profile} {opt} {warn} {include} {lib} {dmacro} {umacro} {fopt} {mopt} {aopt} {outfile_str} {flagfile} {infiles_str} {libraries}"
+        return re.sub(' +', ' ', command).strip()
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def compile(self, infile, outfile, code=None):
+        # Generated assembly can be piped to the compiler instead of being read from infile
+        if code is None:
+            command = self.get_command(infile, outfile)
+        else:
+            command = self.get_command("-x assembler - -x none", outfile)
+
+        # Debug builds refer to their source paths, so they are never taken from the cache
+        key = None
+        if not self.cache is None and not self.debug:
+            key = self.cache.get_key(command, outfile, code=code)
+            if self.cache.load(key, outfile):
+                print(f"{command} (cached)")
+                return 0
 
         print(command)
-        subprocess.call(command.split(' '))
+        retval = subprocess.run(command.split(' '), input=code.encode() if not code is None else None).returncode
+
+        if not key is None and retval == 0:
+            self.cache.store(key, outfile)
+
+        return retval
+
+    def build(self, infile, outfile, code=None):
+        # Compile as a step of a build graph, which fails when no output is produced
+        if self.compile(infile, outfile, code=code) != 0 or not os.path.exists(outfile):
+            if not code is None:
+                # Keep piped assembly of failed builds for inspection
+                os.makedirs(os.path.dirname(infile), exist_ok=True)
+                with open(infile, 'w+') as asm_file:
+                    asm_file.write(code)
+            raise RuntimeError(f"Compilation of {infile} into {outfile} failed.")
+        return outfile
 
     def copy(self, cc=None, mode=None, standard=None, debug=None, 
              profile=None, opt=None, warn=[], pedantic=None, 
              include=[], lib=[], dmacro={}, umacro=None, 
-             fopt=[], mopt=[], outfile=None, flagfile=None, 
+             fopt=[], mopt=[], aopt=[], outfile=None, flagfile=None, 
              infiles=[], libraries=[]):
         compiler = copy.deepcopy(self)
 
@@ -75,6 +116,7 @@ class Compiler:
         compiler.umacro = umacro if not umacro is None else compiler.umacro
         compiler.fopt = list(set(compiler.fopt + fopt))
         compiler.mopt = list(set(compiler.mopt + mopt))
+        compiler.aopt = list(set(compiler.aopt + aopt))
         compiler.outfile = outfile if not outfile is None else compiler.outfile
         compiler.flagfile = flagfile if not flagfile is None else compiler.flagfile
         compiler.infiles = list(set(compiler.infiles + infiles))
@@ -97,7 +139,9 @@ class Compiler:
         self.umacro = compiler.umacro if not compiler.umacro is None else self.umacro
         self.fopt = list(set(self.fopt + compiler.fopt))
         self.mopt = list(set(self.mopt + compiler.mopt))
+        self.aopt = list(set(self.aopt + compiler.aopt))
         self.outfile = compiler.outfile if not compiler.outfile is None else self.outfile
         self.flagfile = compiler.flagfile if not compiler.flagfile is None else self.flagfile
         self.infiles = list(set(self.infiles + compiler.infiles))
-        self.libraries = list(set(self.libraries + compiler.libraries))
\ No newline at end of file
+        self.libraries = list(set(self.libraries + compiler.libraries))
+        self.cache = compiler.cache if not compiler.cache is None else self.cache
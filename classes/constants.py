@@ -11,7 +11,8 @@ class Constants:
                  realpath,
                  construct_resource_path,
                  construct_result_path,
-                 test_input_filename, test_output_filename):
+                 test_input_filename, test_output_filename,
+                 dispatch=False, lean=False, mask_register_set=[], parametric=False, test_data_dir=None, scaling=False, page_size=None, cache_mode=None):
         self.entry_function = entry_function
         self.dtype_size_bytes = dtype_size_bytes
         self.warmup = warmup
@@ -25,12 +26,20 @@ class Constants:
         self.default_register_set_default_column = default_register_set_default_column
         self.simd_register_set = simd_register_set
         self.simd_register_set_default_column = simd_register_set_default_column
+        self.mask_register_set = mask_register_set
         self.machine_config = machine_config
         self.realpath = realpath
         self.construct_resource_path = construct_resource_path
         self.construct_result_path = construct_result_path
         self.test_input_filename = test_input_filename
         self.test_output_filename = test_output_filename
+        self.test_data_dir = test_data_dir
+        self.scaling = scaling
+        self.page_size = page_size
+        self.cache_mode = cache_mode
+        self.dispatch = dispatch
+        self.lean = lean
+        self.parametric = parametric
         self.n_default_regs = len(default_register_set)
         self.n_simd_regs = len(simd_register_set)
 
@@ -1,8 +1,69 @@
+import os
 from .logger import Logger
+from .result_store import ResultStore
+
+# Lines the benchmark harness writes while testing, any other line is a diagnostic such as the mismatch summary
+TEST_PROGRESS = ["Initializing data...", "Done initializing data!", "Comparing result...", "PASS", "FAIL"]
 
 class ExecutionManager():
     def __init__(self, execution_manager_name):
         self.execution_manager_name = execution_manager_name
+        self.test_results = []
 
     def run(self, commands, n_entries, test_functions=None):
-        Logger.warn(f"\"run\" not implemented for execution manager {self.execution_manager_name}.")
\ No newline at end of file
+        Logger.warn(f"\"run\" not implemented for execution manager {self.execution_manager_name}.")
+
+    def record_test(self, executable_path, resfile_path, retval=None):
+        # Tests that were skipped as their result exists are reported by the outcome in their result file
+        lines = []
+        if os.path.exists(resfile_path):
+            with open(resfile_path, 'r') as resfile:
+                lines = [line.strip() for line in resfile if line.strip() and not line.startswith("====")]
+
+        passed = retval == 0 if not retval is None else "PASS" in lines and not "FAIL" in lines
+        self.test_results.append((executable_path, passed, [line for line in lines if not line in TEST_PROGRESS]))
+
+    def pop_test_results(self):
+        test_results = self.test_results
+        self.test_results = []
+        return test_results
+
+    def get_result_name(self, executable_path, suffix=''):
+        executable_name = os.path.basename(executable_path)
+        suffix_used = f'-{suffix}' if suffix else ''
+        return '_'.join([f"{executable_name.split('_')[0]}{suffix_used}"] + executable_name.split('_')[1:])
+
+    def get_result_store(self, executable_path, test_function=None):
+        # Results of tests and of binaries outside of the experiments are kept in files
+        if not test_function is None:
+            return None
+        return ResultStore.locate(executable_path)
+
+    def plan_jobs(self, commands, test_functions, suffix=''):
+        # Stored runs are journaled as planned before any of them runs, such that an interrupted sweep shows the work that is left
+        jobs = {}
+        for command, test_function in zip(commands, test_functions):
+            embedded_command = command[1] if type(command) == tuple else command
+            executable_path = (command[0] if type(command) == tuple else command).split(' ')[0]
+            location = self.get_result_store(executable_path, test_function=test_function)
+            if not location is None:
+                store, experiment_name, kernel_name = location
+                jobs.setdefault((store.path, experiment_name), (store, []))[1].append((kernel_name, self.get_result_name(executable_path, suffix=suffix), embedded_command))
+
+        for (_, experiment_name), (store, experiment_jobs) in jobs.items():
+            store.plan_jobs(experiment_name, experiment_jobs)
+
+    @staticmethod
+    def get_partial_path(path):
+        # Results are written to a partial file that is only moved in place once all entries are done
+        return f"{path}.part"
+
+    def get_result_paths(self, executable_path, suffix='', swap_stdout=False):
+        result_name = self.get_result_name(executable_path, suffix=suffix)
+        resdir = os.path.join(os.path.dirname(os.path.dirname(executable_path)), 'res')
+        resfile_path = os.path.join(resdir, f"{result_name}.csv")
+        errfile_path = os.path.join(resdir, f"{result_name}.err")
+
+        if swap_stdout:
+            return errfile_path, resfile_path
+        return resfile_path, errfile_path
@@ -1,6 +1,7 @@
 import os
 from .logger import Logger
-from .generator import CodeContext
+from .result_store import ResultStore
+from .build_graph import BuildGraph
 
 class Experiment:
     def __init__(self, experiment_name, constants, compilers, machine_specific_experiment_configuration):
@@ -8,28 +9,107 @@ class Experiment:
         self.constants = constants
         self.compilers = compilers
         self.machine_specific_experiment_configuration = machine_specific_experiment_configuration
+        self.result_store = None
 
     def run(self):
         Logger.warn(f"\"run\" not implemented for experiment {self.experiment_name}.")
 
+    def sweep(self):
+        # Runs the experiment within the journal of a sweep, resuming the jobs of an interrupted sweep that are not done
+        store = self.get_result_store()
+        sweep = store.start_sweep(self.experiment_name)
+        unfinished = store.get_jobs(sweep, states=["planned", "running", "failed"])
+        if unfinished:
+            Logger.note(f"Resuming sweep {sweep} of {self.experiment_name}, {len(unfinished)} of {len(store.get_jobs(sweep))} jobs are not done")
+
+        self.run()
+
+        failed = store.get_jobs(sweep, states=["failed"])
+        store.finish_sweep(sweep)
+        if failed:
+            Logger.warn(f"{len(failed)} jobs of {self.experiment_name} failed, which are run again by the next sweep: {', '.join([job['name'] for job in failed])}")
+
+    def get_result_store(self):
+        if self.result_store is None:
+            self.result_store = ResultStore(os.path.join(self.constants.construct_resource_path(), ResultStore.FILENAME))
+        return self.result_store
+
     def get_result_configurations(self):
-        kernels_dir = os.path.join(self.constants.construct_resource_path(experiment_name=self.experiment_name), "kernels")
-        
+        store = self.get_result_store()
+        self.import_result_files(store)
+
         configurations = []
+        for configuration in store.get_configurations(experiment=self.experiment_name):
+            if configuration["trueN"] is None:
+                continue
+            configuration["kernel_name"] = configuration["kernel"]
+            if not configuration["stride_unrolls"] is None:
+                configuration["total_unrolls"] = configuration["stride_unrolls"] * configuration["portion_unrolls"]
+            configurations.append(configuration)
+
+        return configurations
+
+    def get_samples(self, configuration):
+        store = self.get_result_store()
+        return store.get_samples(**{column: configuration[column] for column in ResultStore.CONFIGURATION_COLUMNS})
+
+    def import_result_files(self, store):
+        # Result files are still written by SLURM jobs and earlier runs, which are added to the store once
+        kernels_dir = os.path.join(self.constants.construct_resource_path(experiment_name=self.experiment_name), "kernels")
+        if not os.path.exists(kernels_dir):
+            return
 
-        kernels = os.listdir(kernels_dir)
-        for kernel in kernels:
+        for kernel in os.listdir(kernels_dir):
             res_dir = os.path.join(kernels_dir, kernel, "res")
-            res_dir_files = os.listdir(res_dir)
-            for res_dir_file in res_dir_files:
-                name, extension = res_dir_file.split('.')
-                if extension == 'csv':
-                    configuration = CodeContext.decode_name(name)
-                    configuration["kernel_name"] = kernel
-                    configuration["path"] = os.path.join(res_dir, res_dir_file)
-                    configurations.append(configuration)
+            if not os.path.exists(res_dir):
+                continue
 
-        return configurations
+            for res_dir_file in os.listdir(res_dir):
+                name, extension = os.path.splitext(res_dir_file)
+                if extension != ".csv" or store.has_run(self.experiment_name, kernel, name):
+                    continue
+
+                with open(os.path.join(res_dir, res_dir_file), 'r') as resfile:
+                    store.add_run(self.experiment_name, kernel, name, None, None, [resfile.read()])
+
+    @staticmethod
+    def get_precision(df):
+        # Adaptive runs report the relative half-width of the confidence interval of the median next to the samples of every entry
+        precision = df.loc[df["metric_unit"] == "median_ci", "metric"]
+        return float(precision.max()) if len(precision) > 0 else None
+
+    def run_dispatch(self, commands):
+        # All configurations of a kernel are timed by a single binary against the same buffer
+        machine_config = self.constants.machine_config
+        machine_config.execution_manager.run([(command, machine_config.get_pinned_command(command)) for command in commands], self.constants.entries)
+
+    def create_build_graph(self):
+        return BuildGraph(jobs=self.constants.machine_config.build_jobs)
+
+    def get_kernel_compiler(self, in_process=True):
+        # Generated kernels are either assembled for in-process execution or linked against the prebuilt harness
+        if in_process and "jit" in self.compilers.keys():
+            return self.compilers["jit"].copy()
+        return self.compilers["kernel"].copy()
+
+    def report_tests(self):
+        # Outcomes of all tests of the experiment in a single report, along with the diagnostics of the harness
+        test_results = self.constants.machine_config.execution_manager.pop_test_results()
+        if not test_results:
+            return
+
+        report_path = os.path.join(self.constants.construct_resource_path(experiment_name=self.experiment_name), "test_report.txt")
+        failed = [test_result for test_result in test_results if not test_result[1]]
+        with open(report_path, 'w+') as report:
+            report.write(f"{len(test_results) - len(failed)} of {len(test_results)} tests passed\n")
+            for executable_path, passed, diagnostics in sorted(test_results, key=lambda test_result: (test_result[1], test_result[0])):
+                report.write(f"{'PASS' if passed else 'FAIL'} {executable_path}\n")
+                report.writelines([f"    {line}\n" for line in diagnostics])
+
+        if failed:
+            Logger.warn(f"{len(failed)} of {len(test_results)} tests of {self.experiment_name} failed, see {report_path}")
+        else:
+            Logger.ok(f"All {len(test_results)} tests of {self.experiment_name} passed, see {report_path}")
 
     def run_tests(self, generator_classes, compiler, configurations):
         for generator_class in generator_classes:
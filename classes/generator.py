@@ -1,19 +1,31 @@
 import re
 import os
 import math
-import multiprocessing
 import traceback
 import functools
 import numpy as np
 from .logger import Logger
+from .build_graph import BuildGraph
+from .instruction import Instruction, Label, LabelRef, parse_operand
+from .peephole import PeepholeOptimizer
+from .register_allocator import RegisterAllocator, RegisterAssignment
 
 class Generator:
+    # Configuration keys of the problem sizes, generators listing these can take the sizes as an argument at runtime
+    size_keys = []
+
     def __init__(self, experiment, kernel_name, testing=False):
         self.experiment = experiment
         self.kernel_name = kernel_name
         self.commands = []
         self.testing = testing
         self.test_functions = []
+        self.dispatch = False
+        self.parametric = False
+        self.lean = False
+        self.function_index = 0
+        self.functions = []
+        self.builds = []
 
     def lcm(self, l):
         lcm = 1
@@ -51,30 +63,231 @@ class Generator:
 
         return N
 
-    def generate(self, configurations, compiler):
+    def get_exact_N(self, N, unalignment_factor=1.0):
+        # Kernels with tails process exactly the requested number of values
+        N = int(N * unalignment_factor)
+
+        if N == 0:
+            Logger.warn("Could not find dimensions for N.")
+            return None
+
+        return N
+
+    def get_vectors(self):
+        # Full vectors and the single values that are processed in tails
+        constants = self.experiment.constants
+        return Vector(constants.simd_vec_values, constants.simd_vec_bytes, constants.simd_register_set_default_column), Vector(1, constants.dtype_size_bytes, 2, scalar=True)
+
+    def blocks(self, cc, count, unrolls, body, down=False, pointer=None, step=None):
+        # Emit the body for blocks of unrolls in a loop, and once for the remaining count
+        # The loop is bounded by a pointer when the body advances it by step per unroll
+        if count // unrolls > 0:
+            with For(cc, f"${count // unrolls}", down=down, pointer=pointer, step=None if step is None else step * unrolls):
+                body(unrolls)
+        if count % unrolls > 0:
+            body(count % unrolls)
+
+    def vector_blocks(self, cc, values, unrolls, body, down=False, pointer=None):
+        # Emit the body for blocks of unrolls vectors, the remaining vectors and the remaining single values
+        # The remaining single values are a single masked vector when opmask registers are available
+        vector, scalar = self.get_vectors()
+        self.blocks(cc, values // vector.values, unrolls, lambda portions: body(vector, portions), down=down, pointer=pointer, step=vector.bytes)
+        remainder = values % vector.values
+        if remainder > 0 and self.experiment.constants.mask_register_set:
+            mask = f"%{cc.get_register(register_set='mask', variable='tail_mask')}"
+            cc.add_statement("movl", f"${(1 << remainder) - 1}", f"%{cc.get_register(variable='tail_bits', size_column=1)}")
+            cc.add_statement("kmovw", f"%{cc.get_variable('tail_bits', size_column=1)}", mask)
+            cc.unset_variable('tail_bits')
+            body(Vector(remainder, remainder * scalar.bytes, vector.column, mask=mask), 1)
+            cc.unset_variable('tail_mask')
+        elif remainder > 0:
+            body(scalar, remainder)
+
+    def runtime_divide(self, cc, dividend, divisor):
+        # Divide the value of a register by a constant at runtime, returning the registers of the quotient and remainder
+        # Powers of two are divided by shifting, otherwise divq is used, which takes rax and rdx
+        quotient = f"%{cc.get_register()}"
+        remainder = f"%{cc.get_register()}"
+        if divisor & (divisor - 1) == 0:
+            cc.add_statement("movq", dividend, quotient)
+            cc.add_statement("shrq", f"${divisor.bit_length() - 1}", quotient)
+            cc.add_statement("movq", dividend, remainder)
+            cc.add_statement("andq", f"${divisor - 1}", remainder)
+            return quotient, remainder
+
+        cc.add_statement("movq", dividend, f"%{cc.set_variable('rax', 'dividend')}")
+        cc.add_statement("xorq", f"%{cc.set_variable('rdx', 'high')}", f"%{cc.get_variable('high')}")
+        cc.add_statement("movq", f"${divisor}", f"%{cc.get_register(variable='divisor')}")
+        cc.add_statement("divq", f"%{cc.get_variable('divisor')}")
+        cc.add_statement("movq", f"%{cc.get_variable('dividend')}", quotient)
+        cc.add_statement("movq", f"%{cc.get_variable('high')}", remainder)
+        cc.unset_variable('dividend')
+        cc.unset_variable('high')
+        cc.unset_variable('divisor')
+        return quotient, remainder
+
+    def runtime_blocks(self, cc, count, unrolls, body, down=False, pointer=None, step=None):
+        # Emit the body for blocks of unrolls in a loop, and once per remaining element, where the count is held in a register
+        if unrolls > 1:
+            blocks, remainder = self.runtime_divide(cc, count, unrolls)
+            with For(cc, blocks, skip_empty=True, down=down, pointer=pointer, step=None if step is None else step * unrolls):
+                body(unrolls)
+        else:
+            remainder = count
+        with For(cc, remainder, skip_empty=True, down=down, pointer=pointer, step=step):
+            body(1)
+
+    def runtime_vector_blocks(self, cc, values, unrolls, body, down=False, pointer=None):
+        # Emit the body for blocks of unrolls vectors, the remaining vectors and the remaining single values, where the number of values is held in a register
+        vector, scalar = self.get_vectors()
+        vectors, singles = self.runtime_divide(cc, values, vector.values)
+        self.runtime_blocks(cc, vectors, unrolls, lambda portions: body(vector, portions), down=down, pointer=pointer, step=vector.bytes)
+        with For(cc, singles, skip_empty=True, down=down, pointer=pointer, step=scalar.bytes):
+            body(scalar, 1)
+
+    def group_sizes(self, configurations):
+        # Configurations that only differ in their sizes share a kernel, which is run once per size
+        groups = {}
+        for dmacro, configuration in configurations:
+            key = tuple(sorted([(k, v) for k, v in configuration.items() if not k in self.size_keys]))
+            groups.setdefault(key, []).append((dmacro, configuration))
+
+        grouped = []
+        for members in groups.values():
+            dmacro = {k: v for k, v in members[0][0].items() if k != "N"}
+            configuration = dict(members[0][1])
+            configuration["sizes"] = [member[1] for member in members]
+            grouped.append((dmacro, configuration))
+        return grouped
+
+    def generate(self, configurations, compiler, dispatch=False):
+        graph = BuildGraph(jobs=self.experiment.constants.machine_config.build_jobs)
+        generated = self.add_to_graph(graph, configurations, compiler, dispatch=dispatch)
+        graph.run()
+        return graph.get_result(generated, ([], [], []))
+
+    def add_to_graph(self, graph, configurations, compiler, dispatch=False):
+        # Generate and compile every configuration as separate steps, the returned node collects the results
+        self.dispatch = dispatch
+        self.parametric = self.experiment.constants.parametric and not dispatch and len(self.size_keys) > 0
+        if self.parametric:
+            configurations = self.group_sizes(configurations)
+            compiler = compiler.copy(dmacro={"PARAMETRIC": ""})
+        compiler.prepare()
+
+        scope = graph.scope(f"{self.experiment.experiment_name}:{self.kernel_name}")
+        contexts = []
+        for i, configuration in enumerate(configurations):
+            generated = graph.add(f"{scope}:generate:{i}", self.build_wrapper, args=((i, compiler.copy(dmacro=configuration[0]), configuration[1]),))
+            if dispatch:
+                contexts.append(generated)
+            else:
+                contexts.append(graph.add(f"{scope}:compile:{i}", Generator.compile_context, dependencies=[generated]))
+
+        dependencies = list(contexts)
+        if dispatch:
+            dispatch_asm = graph.add(f"{scope}:dispatch", self.build_dispatch, args=(compiler.debug,), dependencies=contexts, local=True, partial=True)
+            dependencies.append(graph.add(f"{scope}:compile:dispatch", Generator.compile_dispatch, args=(compiler,), dependencies=[dispatch_asm]))
+
+        return graph.add(scope, Generator.collect_contexts, args=(dispatch,), dependencies=dependencies, local=True, partial=True)
+
+    def build_wrapper(self, configuration):
+        self.function_index = configuration[0]
+        self.compiler = configuration[1]
+        true_configuration = self.build(configuration[2])
+        return (self.commands, self.test_functions, true_configuration, self.functions, self.builds)
+
+    @staticmethod
+    def compile_context(context):
+        if not context is None:
+            for compiler, asm_path, bin_path, code in context[4]:
+                compiler.build(asm_path, bin_path, code=code)
+        return context
+
+    @staticmethod
+    def compile_dispatch(compiler, dispatch):
+        asm_path, bin_path, N_allocated, code = dispatch
+        return compiler.copy(dmacro={"N": N_allocated, "DISPATCH": ""}).build(asm_path, bin_path, code=code)
+
+    @staticmethod
+    def collect_contexts(dispatch, *contexts):
         commands = []
         test_functions = []
         true_configurations = []
 
-        with multiprocessing.Pool() as pool:
-            compilers = [compiler.copy(dmacro=configuration[0]) for configuration in configurations]
-            gen_config = [configuration[1] for configuration in configurations]
-            
-            for context in pool.map(self.build_wrapper, zip(compilers, gen_config)):
-                if not context is None:
-                    if not context[0] is None:
-                        commands += context[0]
-                    if not context[1] is None:
-                        test_functions += context[1]
-                    if not context[2] is None:
-                        true_configurations.append(context[2])
+        if dispatch:
+            if not contexts[-1] is None:
+                commands.append(contexts[-1])
+            contexts = contexts[:-1]
+
+        for context in contexts:
+            if not context is None:
+                if not context[0] is None:
+                    commands += context[0]
+                if not context[1] is None:
+                    test_functions += context[1]
+                if not context[2] is None:
+                    true_configurations.append(context[2])
 
         return (commands, test_functions, true_configurations)
-    
-    def build_wrapper(self, configuration):
-        self.compiler = configuration[0]
-        true_configuration = self.build(configuration[1])
-        return (self.commands, self.test_functions, true_configuration)
+
+    def build_dispatch(self, debug, *contexts):
+        # Dispatch table over all generated configurations, iterated by the harness
+        functions = []
+        for context in contexts:
+            if not context is None and not context[3] is None:
+                functions += context[3]
+
+        if not functions:
+            raise RuntimeError(f"No configurations of {self.kernel_name} were generated.")
+
+        name = f"{functions[0][0].split('_')[0]}-dispatch"
+        N_allocated = max([function[1] for function in functions])
+
+        code = []
+        code.append(f"    .file \"{name}.gen\"")
+        code.append(f"    .text")
+        for function in functions:
+            code.append(function[2])
+
+        code.append(f"    .section .rodata")
+        for i, function in enumerate(functions):
+            code.append(f"..N{i}:")
+            code.append(f"    .asciz \"{function[0]}\"")
+
+        code.append(f"    .data")
+        code.append(f"    .align 8")
+        code.append(f"    .global experiments")
+        code.append(f"experiments:")
+        for function in functions:
+            code.append(f"    .quad {function[3]}")
+        code.append(f"    .global experiment_names")
+        code.append(f"experiment_names:")
+        for i in range(len(functions)):
+            code.append(f"    .quad ..N{i}")
+        code.append(f"    .global n_experiments")
+        code.append(f"n_experiments:")
+        code.append(f"    .quad {len(functions)}")
+        code += CodeContext.get_data_code(N_allocated)
+
+        base_dir = self.experiment.constants.construct_resource_path(experiment_name=self.experiment.experiment_name, kernel_name=self.kernel_name)
+
+        code = '\n'.join(code) + '\n'
+
+        asm_dir = os.path.join(base_dir, "asm")
+        asm_path = os.path.join(asm_dir, f"{name}.s")
+        if debug:
+            os.makedirs(asm_dir, exist_ok=True)
+            with open(asm_path, 'w+') as asm_file:
+                asm_file.write(code)
+
+        bin_dir = os.path.join(base_dir, "bin")
+        bin_path = os.path.join(bin_dir, name)
+        os.makedirs(bin_dir, exist_ok=True)
+
+        os.makedirs(os.path.join(base_dir, "res"), exist_ok=True)
+
+        return (asm_path, bin_path, N_allocated, None if debug else code)
 
     def build(self, configurations, testing=False):
         Logger.warn(f"\"build\" not implemented for kernel {self.kernel_name}.")
@@ -96,6 +309,12 @@ class Generator:
     def register_command(self, command):
         self.commands.append(command)
     
+    def register_build(self, asm_path, bin_path, code=None):
+        self.builds.append((self.compiler, asm_path, bin_path, code))
+
+    def register_function(self, name, N_allocated, code, symbol):
+        self.functions.append((name, N_allocated, code, symbol))
+
     def register_test_function(self, test_function):
         self.test_functions.append(test_function)
 
@@ -125,98 +344,31 @@ class Generator:
     def write_test_output(self, test_data_dir, *arrays):
         self.store_arrays(self.get_test_output_filename(test_data_dir), *arrays)
 
-class RegisterAllocator:
-    def __init__(self, register_set, default_column):
-        self.pos = 0
-        self.register_map = {register[0][default_column]:register[0] for register in register_set}
-        self.registers = [register[0][default_column] for register in register_set] # Preserve order
-        self.callee_saved = [register[1] for register in register_set]
-        self.availability = {}
-        self.used_callee_saved = []
-        
-        for register in self.registers:
-            self.availability[register] = True
-
-    def reserve(self, register, size_column=None):
-        if not self.availability[register]:
-            Logger.warn(f"Reserving an unavailable register: {register}.")
-            
-        self.availability[register] = False
-
-        pos = self.registers.index(register)
-        if self.callee_saved[pos] and register not in self.used_callee_saved:
-            self.used_callee_saved.append(register)
-
-        if size_column is None:
-            return (register, register)
-        return (register, self.register_map[register][size_column])
-
-    def release(self, register):
-        if self.availability[register]:
-            Logger.warn(f"Releasing an unavailable register: {register}.")
-            
-        self.availability[register] = True
-        
-    def obtain(self, size_column=None):
-        callee_saved_positions = []
-
-        pos = self.pos
-
-        # First check all non-callee saved positions
-        while pos != (self.pos + len(self.registers) - 1) % len(self.registers):
-            if self.callee_saved[pos]:
-                callee_saved_positions.append(pos)
-            elif self.availability[self.registers[pos]]:
-                break
-            pos = (pos + 1) % len(self.registers)
-
-        if pos == (self.pos + len(self.registers) - 1) % len(self.registers) and not self.availability[self.registers[pos]]:
-            for pos in callee_saved_positions:
-                if self.availability[self.registers[pos]]:
-                    break
-            if not self.availability[self.registers[pos]]:
-                Logger.warn(f"No available register could be found .")
-                return None
-            
-            # Do not change starting position
-            # - This makes it more likely to re-use callee-saved register in the future (reducing stack use)
-            # - This does not offset the register in such a way that makes it more likely to re-use recently freed non-callee-saved registers
-                
-        else:
-            # Start at next position next time
-            self.pos = (pos + 1) % len(self.registers)
-
-        register = self.registers[pos]
-        
-        if self.callee_saved[pos] and register not in self.used_callee_saved:
-            self.used_callee_saved.append(register)
-
-        self.availability[register] = False
-
-        if size_column is None:
-            return (register, register)
-        
-        return (register, self.register_map[register][size_column])
-
 class CodeContext:
-    def __init__(self, generator, stride_unrolls, portion_unrolls, N_allocated, trueN, suffix="", test_function_configuration=None):
+    def __init__(self, generator, stride_unrolls, portion_unrolls, N_allocated, trueN, suffix="", test_function_configuration=None, sizes=None):
         self.generator = generator
         self.stride_unrolls = stride_unrolls
         self.portion_unrolls = portion_unrolls
         self.N_allocated = N_allocated
         self.trueN = trueN
         self.test_function_configuration = test_function_configuration
+        # Kernels taking their size as an argument are run for all sizes given as (N_allocated, trueN, size, configuration)
+        self.sizes = sizes
 
         self.label = 0
         self.code = []
+        if generator.lean:
+            suffix = '-'.join([s for s in [suffix, "lean"] if s != ""])
         self.prepare_name(generator.kernel_name, stride_unrolls, portion_unrolls, N_allocated, trueN, suffix=suffix)
 
-        self.default_register_allocator = RegisterAllocator(generator.experiment.constants.default_register_set, generator.experiment.constants.default_register_set_default_column)
-        self.simd_register_allocator = RegisterAllocator(generator.experiment.constants.simd_register_set, generator.experiment.constants.simd_register_set_default_column)
+        self.default_register_allocator = RegisterAllocator("default", generator.experiment.constants.default_register_set, generator.experiment.constants.default_register_set_default_column)
+        self.simd_register_allocator = RegisterAllocator("simd", generator.experiment.constants.simd_register_set, generator.experiment.constants.simd_register_set_default_column)
         self.register_allocators = {
             "default": self.default_register_allocator,
             "simd": self.simd_register_allocator
         }
+        if generator.experiment.constants.mask_register_set:
+            self.register_allocators["mask"] = RegisterAllocator("mask", generator.experiment.constants.mask_register_set, 0)
 
         self.variables = {}
 
@@ -225,8 +377,11 @@ class CodeContext:
         return self
 
     def prepare_name(self, kernel_name, stride_unrolls, portion_unrolls, N, trueN, suffix=""):
-        attr = [kernel_name + (('-' + suffix) if suffix != "" else ""), stride_unrolls * portion_unrolls, stride_unrolls, N, trueN]
-        self.output_name = '_'.join([str(x) for x in attr])
+        self.name_attr = [kernel_name + (('-' + suffix) if suffix != "" else ""), stride_unrolls * portion_unrolls, stride_unrolls]
+        self.output_name = self.get_sized_name(N, trueN) if self.sizes is None else '_'.join([str(x) for x in self.name_attr])
+
+    def get_sized_name(self, N, trueN):
+        return '_'.join([str(x) for x in self.name_attr + [N, trueN]])
 
     @staticmethod
     def decode_name(name):
@@ -264,25 +419,56 @@ class CodeContext:
         else:
             return self.output_name
 
-    def get_final_code(self):
+    def get_function_name(self):
         func = self.generator.experiment.constants.entry_function
+        if self.generator.dispatch:
+            return f"{func}_{self.generator.function_index}"
+        return func
+
+    def get_label_name(self, label):
+        return f"..B{self.generator.function_index + 1}.{label}"
+
+    @staticmethod
+    def get_data_code(N_allocated):
+        # The number of values to allocate is given on the command line for kernels taking their size as an argument
+        code = []
+        if not N_allocated is None:
+            code.append(f"    .data")
+            code.append(f"    .align 8")
+            code.append(f"    .global N")
+            code.append(f"N:")
+            code.append(f"    .long	{hex(N_allocated & ((1 << 32) - 1))},{hex(N_allocated >> 32)}")
+            code.append(f"    .type	N,@object")
+            code.append(f"    .size	N,8")
+        code.append(f"    .section .note.GNU-stack, \"\"")
+        return code
+
+    def get_function_code(self):
+        func = self.get_function_name()
 
         code = []
-        code.append(f"    .file \"{self.get_name('gen')}\"")
-        code.append(f"    .text")
         code.append(f"    .align    16,0x90")
         code.append(f"    .globl {func}")
         code.append(f"{func}:")
-        code.append(f"..B1.{self.get_label()}:")
+        code.append(f"{self.get_label_name(self.get_label())}:")
         code.append(f"    .cfi_startproc")
 
+        register_sets = {name: register_allocator.get_rows() for name, register_allocator in self.register_allocators.items()}
+        statements = self.code
+        if self.generator.lean:
+            statements = PeepholeOptimizer(register_sets).run(statements)
+
+        # Physical registers are assigned to the virtual registers once all live ranges are known
+        register_assignment = RegisterAssignment(self.register_allocators)
+        statements = register_assignment.run(statements)
+
         pushed_registers = []
-        for register_allocator in self.register_allocators.values():
-            for register in register_allocator.used_callee_saved:
-                code.append(self.indent(f"pushq     %{register}"))
-                pushed_registers.append(register)
+        for register in register_assignment.used_callee_saved:
+            code.append(self.indent(f"pushq     %{register}"))
+            pushed_registers.append(register)
 
-        code += self.code
+        statements = register_assignment.get_prologue() + statements + register_assignment.get_epilogue()
+        code += [statement.format(self.get_label_name) for statement in statements]
 
         for pushed_register in pushed_registers[::-1]:
             code.append(self.indent(f"popq     %{pushed_register}"))
@@ -293,17 +479,18 @@ class CodeContext:
         code.append(f"    .cfi_endproc")
         code.append(f"    .type	{func},@function")
         code.append(f"    .size	{func},.-{func}")
-        code.append(f"    .data")
-        code.append(f"    .align 8")
-        code.append(f"    .global N")
-        code.append(f"N:")
-        code.append(f"    .long	{hex(self.N_allocated & ((1 << self.generator.experiment.constants.simd_vec_bytes) - 1))},{hex(self.N_allocated >> self.generator.experiment.constants.simd_vec_bytes)}")
-        code.append(f"    .type	N,@object")
-        code.append(f"    .size	N,8")
-        code.append(f"    .section .note.GNU-stack, \"\"")
-        
+
         return '\n'.join(code)
 
+    def get_final_code(self):
+        code = []
+        code.append(f"    .file \"{self.get_name('gen')}\"")
+        code.append(f"    .text")
+        code.append(self.get_function_code())
+        code += CodeContext.get_data_code(self.N_allocated if self.sizes is None else None)
+        
+        return '\n'.join(code) + '\n'
+
     def __exit__(self, exception_type, exception_value, exception_traceback):
         if not exception_type is None:
             print("exception_type:", exception_type)
@@ -313,33 +500,57 @@ class CodeContext:
             for variable, register in self.variables.items():
                 Logger.warn(f"Variable {variable} is still mapped to register {register} in kernel {self.generator.kernel_name}.")
 
+        if self.generator.dispatch:
+            self.generator.register_function(self.get_name(), self.N_allocated, self.get_function_code(), self.get_function_name())
+            return
+
         code = self.get_final_code()
 
         base_dir = self.generator.experiment.constants.construct_resource_path(experiment_name=self.generator.experiment.experiment_name, kernel_name=self.generator.kernel_name)
         
         if not self.test_function_configuration is None:
             base_dir = os.path.join(base_dir, "test", self.get_name())
-            data_dir = os.path.join(base_dir, "data")
-            os.makedirs(data_dir, exist_ok=True)
 
+        # Assembly is piped to the compiler, and only kept on disk for debug builds
         asm_dir = os.path.join(base_dir, "asm")
         asm_path = os.path.join(asm_dir, self.get_name("s"))
-        os.makedirs(asm_dir, exist_ok=True)
-        with open(asm_path, 'w+') as asm_file:
-            asm_file.write(code)
+        if self.generator.compiler.debug:
+            os.makedirs(asm_dir, exist_ok=True)
+            with open(asm_path, 'w+') as asm_file:
+                asm_file.write(code)
 
         bin_dir = os.path.join(base_dir, "bin")
         bin_path = os.path.join(bin_dir, self.get_name())
         os.makedirs(bin_dir, exist_ok=True)
-        self.generator.compiler.compile(asm_path, bin_path)
-
-        if not self.test_function_configuration is None:
-            input_file = self.generator.get_test_input_filename(data_dir)
-            output_file = self.generator.get_test_output_filename(data_dir)
-            self.generator.register_test_function(functools.partial(self.test_function_configuration[0], self.test_function_configuration[1], data_dir))
-            self.generator.register_command(f"{bin_path} {input_file} {output_file}")
+        self.generator.register_build(asm_path, bin_path, code=None if self.generator.compiler.debug else code)
+
+        # Test data is kept apart from the resources when it is passed through shared memory
+        data_dir = os.path.join(base_dir, "data")
+        test_data_dir = self.generator.experiment.constants.test_data_dir
+        if not test_data_dir is None:
+            data_dir = os.path.join(test_data_dir, os.path.relpath(data_dir, self.generator.experiment.constants.construct_resource_path()))
+
+        # A kernel taking its size as an argument is run per size through a link named after that size, keeping the results apart
+        runs = []
+        if self.sizes is None:
+            runs.append((bin_path, data_dir, "", None if self.test_function_configuration is None else self.test_function_configuration[1]))
         else:
-            self.generator.register_command(bin_path)
+            for N_allocated, trueN, size, configuration in self.sizes:
+                link_path = os.path.join(bin_dir, self.get_sized_name(N_allocated, trueN))
+                if os.path.lexists(link_path):
+                    os.unlink(link_path)
+                os.symlink(os.path.basename(bin_path), link_path)
+                runs.append((link_path, os.path.join(data_dir, os.path.basename(link_path)), f" {N_allocated} {size}", configuration))
+
+        for path, data_dir, arguments, configuration in runs:
+            if not self.test_function_configuration is None:
+                os.makedirs(data_dir, exist_ok=True)
+                input_file = self.generator.get_test_input_filename(data_dir)
+                output_file = self.generator.get_test_output_filename(data_dir)
+                self.generator.register_test_function(functools.partial(self.test_function_configuration[0], configuration, data_dir))
+                self.generator.register_command(f"{path} {input_file} {output_file}{arguments}")
+            else:
+                self.generator.register_command(f"{path}{arguments}")
 
         res_dir = os.path.join(base_dir, "res")
         os.makedirs(res_dir, exist_ok=True)
@@ -358,20 +569,19 @@ class CodeContext:
         return None
     
     def get_variable(self, variable, size_column=None):
-        register = self.variables[variable][1]
+        register = self.variables[variable]
 
         if size_column is None:
-            return register
+            return register[1]
         
         for register_allocator in self.register_allocators.values():
-            for registers in register_allocator.register_map.values():
-                if register in registers:
-                    return registers[size_column]        
+            if register[0] in register_allocator.register_map.keys():
+                return register_allocator.register_map[register[0]][size_column]
 
     def unset_variable(self, variable):
         register = self.variables[variable][0]
         for register_allocator in self.register_allocators.values():
-            if register in register_allocator.registers:
+            if register in register_allocator.registers or register in register_allocator.virtual_positions.keys():
                 register_allocator.release(register)
                 del self.variables[variable]
                 return
@@ -383,7 +593,7 @@ class CodeContext:
                 variables.append(variable)
 
         for variable in variables:
-            self.unset_variable(self, variable)
+            self.unset_variable(variable)
 
     def get_register(self, register_set="default", variable=None, size_column=None):
         if not variable is None and variable in self.variables.keys():
@@ -402,28 +612,103 @@ class CodeContext:
         return self.label
     
     def add_statement(self, operation, *operands, indent=True):
-        statement = operation + (' ' * max(1, (10 - len(operation)))) + ', '.join(operands)
-        
-        if indent:
-            statement = self.indent(statement)
-        
-        self.code.append(statement)
+        # Statements are kept as instructions with parsed operands, text is only emitted in get_final_code
+        self.code.append(Instruction(operation, [parse_operand(operand) if type(operand) == str else operand for operand in operands], indent=indent))
+
+    def add_label(self, label):
+        self.code.append(Label(label))
         
+class Vector:
+    # Instructions on full vectors and their counterparts on the lowest value
+    SCALAR_OPCODES = {
+        "vmovaps": "vmovss",
+        "vmovups": "vmovss",
+        "vmovntdq": "vmovss",
+        "vmovntdqa": "vmovss",
+        "vaddps": "vaddss",
+        "vmulps": "vmulss",
+        "vfmadd231ps": "vfmadd231ss",
+    }
+
+    # Counterparts under an opmask, non-temporal moves cannot be masked and tails are not aligned to the vector size
+    MASKED_OPCODES = {
+        "vmovaps": "vmovups",
+        "vmovntdq": "vmovups",
+        "vmovntdqa": "vmovups",
+    }
+
+    def __init__(self, values, bytes, column, scalar=False, mask=None):
+        self.values = values
+        self.bytes = bytes
+        self.column = column
+        self.scalar = scalar
+        self.mask = mask
+
+    def op(self, opcode):
+        if self.scalar:
+            return Vector.SCALAR_OPCODES.get(opcode, opcode)
+        if not self.mask is None:
+            return Vector.MASKED_OPCODES.get(opcode, opcode)
+        return opcode
+
+    def add_statement(self, cc, opcode, *operands):
+        # Masked vectors only write the values under the mask, registers are zeroed beyond them such that no stale values are used
+        if not self.mask is None:
+            destination = operands[-1]
+            operands = operands[:-1] + (f"{destination}{{{self.mask}}}" + ("{z}" if destination.startswith('%') else ""),)
+        cc.add_statement(self.op(opcode), *operands)
+
 class For:
-    def __init__(self, cc, limit):
+    # Loops count up to the limit by default, count down to zero when down is set, or run until a pointer that the body advances by step bytes per iteration reaches its end
+    # The latter two save the compare against the limit, and the pointer form also the increment of a counter
+    def __init__(self, cc, limit, skip_empty=False, down=False, pointer=None, step=None):
         self.cc = cc
         self.reg = cc.get_register()
         self.start_label = cc.get_label()
         self.limit = limit
+        self.skip_empty = skip_empty
+        self.down = down
+        self.pointer = pointer
+        self.step = step
         
     def __enter__(self):
-        self.cc.add_statement(f"xorq", f"%{self.reg}", f"%{self.reg}")
-        self.cc.add_statement(f"..B1.{self.start_label}:", indent=False)
-        self.cc.add_statement(f"incq", f"%{self.reg}")
+        # Loops are executed at least once, unless a limit held in a register may be zero
+        if self.skip_empty:
+            self.skip_label = self.cc.get_label()
+            self.cc.add_statement(f"testq", f"{self.limit}", f"{self.limit}")
+            self.cc.add_statement(f"jz", LabelRef(self.skip_label))
+
+        if not self.pointer is None:
+            if not self.limit.startswith("$"):
+                self.cc.add_statement(f"imul", f"${self.step}", f"{self.limit}", f"%{self.reg}")
+                self.cc.add_statement(f"addq", f"{self.pointer}", f"%{self.reg}")
+            elif int(self.limit[1:]) * self.step < 1 << 31:
+                self.cc.add_statement(f"leaq", f"{int(self.limit[1:]) * self.step}({self.pointer})", f"%{self.reg}")
+            else:
+                self.cc.add_statement(f"movq", f"${int(self.limit[1:]) * self.step}", f"%{self.reg}")
+                self.cc.add_statement(f"addq", f"{self.pointer}", f"%{self.reg}")
+            self.cc.add_label(self.start_label)
+        elif self.down:
+            self.cc.add_statement(f"movq", f"{self.limit}", f"%{self.reg}")
+            self.cc.add_label(self.start_label)
+        else:
+            self.cc.add_statement(f"xorq", f"%{self.reg}", f"%{self.reg}")
+            self.cc.add_label(self.start_label)
+            self.cc.add_statement(f"incq", f"%{self.reg}")
         return self
 
     def __exit__(self, exception_type, exception_value, exception_traceback):
         end_label = self.cc.get_label()
-        self.cc.add_statement(f"cmpq",f"{self.limit}",f"%{self.reg}")
-        self.cc.add_statement(f"jb",f"..B1.{self.start_label}")
-        self.cc.add_statement(f"..B1.{end_label}:", indent=False)
\ No newline at end of file
+        if not self.pointer is None:
+            self.cc.add_statement(f"cmpq", f"%{self.reg}", f"{self.pointer}")
+            self.cc.add_statement(f"jb", LabelRef(self.start_label))
+        elif self.down:
+            # Decrementing and branching on the flags it sets are fused
+            self.cc.add_statement(f"decq", f"%{self.reg}")
+            self.cc.add_statement(f"jnz", LabelRef(self.start_label))
+        else:
+            self.cc.add_statement(f"cmpq",f"{self.limit}",f"%{self.reg}")
+            self.cc.add_statement(f"jb", LabelRef(self.start_label))
+        self.cc.add_label(end_label)
+        if self.skip_empty:
+            self.cc.add_label(self.skip_label)
\ No newline at end of file
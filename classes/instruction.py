@@ -0,0 +1,114 @@
+import functools
+
+class Register:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def format(self, label_name):
+        return f"%{self.name}"
+
+class Immediate:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def format(self, label_name):
+        return f"${self.value}"
+
+class Memory:
+    __slots__ = ("displacement", "base", "index", "scale")
+
+    def __init__(self, displacement, base=None, index=None, scale=None):
+        self.displacement = displacement
+        self.base = base
+        self.index = index
+        self.scale = scale
+
+    def get_registers(self):
+        return [register for register in [self.base, self.index] if not register is None]
+
+    def format(self, label_name):
+        address = [self.base.format(label_name) if not self.base is None else '']
+        if not self.index is None:
+            address.append(self.index.format(label_name))
+        if not self.scale is None:
+            address.append(self.scale)
+        return f"{self.displacement}({','.join(address)})"
+
+class Masked:
+    # AVX-512 operands written under an opmask register, where zeroing clears the masked-off values instead of keeping them
+    __slots__ = ("operand", "mask", "zeroing")
+
+    def __init__(self, operand, mask, zeroing=False):
+        self.operand = operand
+        self.mask = mask
+        self.zeroing = zeroing
+
+    def get_registers(self):
+        registers = self.operand.get_registers() if type(self.operand) == Memory else [self.operand]
+        return registers + [self.mask]
+
+    def format(self, label_name):
+        return f"{self.operand.format(label_name)}{{{self.mask.format(label_name)}}}" + ("{z}" if self.zeroing else "")
+
+class LabelRef:
+    __slots__ = ("label",)
+
+    def __init__(self, label):
+        self.label = label
+
+    def format(self, label_name):
+        return label_name(self.label)
+
+class Symbol:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def format(self, label_name):
+        return self.name
+
+class Instruction:
+    __slots__ = ("opcode", "operands", "indent")
+
+    def __init__(self, opcode, operands, indent=True):
+        self.opcode = opcode
+        self.operands = operands
+        self.indent = indent
+
+    def format(self, label_name):
+        statement = self.opcode + (' ' * max(1, (10 - len(self.opcode)))) + ', '.join([operand.format(label_name) for operand in self.operands])
+        return f"        {statement}" if self.indent else statement
+
+class Label:
+    __slots__ = ("label",)
+
+    def __init__(self, label):
+        self.label = label
+
+    def format(self, label_name):
+        return f"{label_name(self.label)}:"
+
+@functools.lru_cache(maxsize=4096)
+def parse_operand(operand):
+    # Operands are written in AT&T syntax, parsed operands are shared since they are never modified
+    if operand.endswith('}') and '{' in operand:
+        operand, decorations = operand[:-1].split('{', 1)
+        decorations = decorations.split('}{')
+        return Masked(parse_operand(operand), parse_operand(decorations[0]), zeroing="z" in decorations[1:])
+    if operand.startswith('%'):
+        return Register(operand[1:])
+    if operand.startswith('$'):
+        return Immediate(operand[1:])
+    if operand.endswith(')') and '(' in operand:
+        displacement, address = operand[:-1].split('(', 1)
+        address = address.split(',')
+        base = parse_operand(address[0]) if address[0] else None
+        index = parse_operand(address[1]) if len(address) > 1 and address[1] else None
+        scale = address[2] if len(address) > 2 else None
+        return Memory(displacement, base, index, scale)
+    return Symbol(operand)
@@ -3,13 +3,28 @@ from .logger import Logger
 
 
 class MachineConfig:
-    def __init__(self, machine_name, execution_manager, remote=None, msr=False, use_sudo=False, runtime_arguments={}):
+    def __init__(self, machine_name, execution_manager, remote=None, msr=False, use_sudo=False, runtime_arguments={}, build_jobs=None, vector_widths=None, cores=None, numa=None, core=0, page_sizes=None, cache_modes=None, sweep_size=None, test_jobs=None):
         self.machine_name = machine_name
         self.execution_manager = execution_manager
         self.remote = remote
         self.msr = msr
         self.use_sudo = use_sudo
         self.runtime_arguments = runtime_arguments
+        self.build_jobs = build_jobs
+        self.vector_widths = vector_widths
+        self.cores = cores
+        self.numa = numa
+        self.core = core
+        self.page_sizes = page_sizes
+        self.cache_modes = cache_modes
+        self.sweep_size = sweep_size
+        self.test_jobs = test_jobs
+
+    def get_pinned_command(self, command, args=''):
+        # The NUMA policy is passed on the command line as well, as sudo does not keep the environment
+        sudo = "sudo" if self.use_sudo else ""
+        numa = f"MULTISTRIDING_NUMA={self.numa}" if not self.numa is None else ""
+        return f"{sudo} {args} {numa} taskset -c {self.core} {command}"
 
     def handle_msr(self, nohwpf):
         if self.msr:
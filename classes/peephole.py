@@ -0,0 +1,123 @@
+from .instruction import Instruction, Register, Memory, Masked, Label
+from .code_analysis import CodeAnalysis
+
+class PeepholeOptimizer(CodeAnalysis):
+    # Full vector moves of which loads can be forwarded and stores can be removed
+    MOVES = ["vmovaps", "vmovups"]
+
+    def forward(self, code, start, end, k, source, live_out):
+        # Replace the register loaded at k by the register already holding the value, up to its last use
+        destination = self.get_physical(code[k].operands[1])
+        if not self.is_live(code, source, k + 1, end, live_out):
+            last = k
+            source_used = end
+            redefined = False
+            for i in range(k + 1, end):
+                if code[i] is None:
+                    continue
+                access = self.analyze(code[i])
+                if access.barrier or any([destination in [self.get_physical(register) for register in operand.get_registers()] for operand in code[i].operands if type(operand) in [Memory, Masked]]):
+                    last = None
+                    break
+                if (source in access.reads or source in access.writes) and source_used == end:
+                    source_used = i
+                if destination in access.reads:
+                    last = i
+                elif destination in access.writes:
+                    redefined = True
+                    break
+
+            if not last is None and last < source_used and (redefined or not destination in live_out):
+                for i in range(k + 1, last + 1):
+                    if not code[i] is None:
+                        code[i] = self.rename(code[i], destination, source)
+                code[k] = None
+                return
+
+        statement = code[k]
+        code[k] = Instruction("vmovaps", [Register(self.names[source + (self.columns[statement.operands[1].name],)]), statement.operands[1]], indent=statement.indent)
+
+    def optimize_block(self, code, start, end, live_out):
+        # Memory holding the value of a register, and stores that have not been read yet, with the register size
+        known = {}
+        pending = {}
+
+        def invalidate(condition):
+            for state in [known, pending]:
+                for key in [key for key, value in state.items() if condition(key, value)]:
+                    del state[key]
+
+        for i in range(start, end):
+            statement = code[i]
+            if statement is None or type(statement) == Label:
+                continue
+
+            access = self.analyze(statement)
+            if access.barrier:
+                known.clear()
+                pending.clear()
+                continue
+
+            move = statement.opcode in PeepholeOptimizer.MOVES and len(statement.operands) == 2
+            load = move and type(statement.operands[0]) == Memory and (self.get_physical(statement.operands[1]) or ('',))[0] == "simd"
+            store = move and type(statement.operands[1]) == Memory and (self.get_physical(statement.operands[0]) or ('',))[0] == "simd"
+
+            if load:
+                key = self.get_key(statement.operands[0])
+                column = self.columns[statement.operands[1].name]
+                if not key is None and key in known.keys() and known[key][1] == column:
+                    source = known[key][0]
+                    if source == self.get_physical(statement.operands[1]):
+                        code[i] = None
+                    else:
+                        self.forward(code, start, end, i, source, live_out)
+                    if code[i] is None:
+                        continue
+                    statement = code[i]
+                    access = self.analyze(statement)
+                    load = False
+
+            size = self.get_access_bytes(statement)
+            for memory in access.memory_reads:
+                key = self.get_key(memory)
+                for pending_key in [pending_key for pending_key, value in pending.items() if self.may_alias(key, size, pending_key, value[2])]:
+                    del pending[pending_key]
+
+            if store:
+                key = self.get_key(statement.operands[1])
+                value = (self.get_physical(statement.operands[0]), self.columns[statement.operands[0].name], size)
+                if not key is None and known.get(key) == value:
+                    # The value is already in memory
+                    code[i] = None
+                    continue
+                if not key is None and key in pending.keys() and pending[key][1] == value[1]:
+                    # The previous store is overwritten before it is read
+                    code[pending[key][0]] = None
+                invalidate(lambda other, other_value: self.may_alias(key, size, other, other_value[2]))
+                if not key is None:
+                    pending[key] = (i, value[1], size)
+                    known[key] = value
+                continue
+
+            for memory in access.memory_writes:
+                key = self.get_key(memory)
+                invalidate(lambda other, other_value: self.may_alias(key, size, other, other_value[2]))
+
+            if access.writes:
+                invalidate(lambda other, value: other[0] in access.writes or other[1] in access.writes)
+                for key in [key for key, value in known.items() if value[0] in access.writes]:
+                    del known[key]
+
+            if load:
+                key = self.get_key(statement.operands[0])
+                if not key is None:
+                    known[key] = (self.get_physical(statement.operands[1]), self.columns[statement.operands[1].name], size)
+
+    def run(self, statements):
+        # Remove redundant loads and stores of vectors within basic blocks, keeping values in registers where possible
+        code = list(statements)
+        blocks = self.get_blocks(code)
+        live_out = self.get_live_out(code, blocks)
+        for b, (start, end) in enumerate(blocks):
+            self.optimize_block(code, start, end, live_out[b])
+        return [statement for statement in code if not statement is None]
@@ -0,0 +1,267 @@
+import bisect
+from .logger import Logger
+from .instruction import Instruction, Register, Immediate, Memory, Masked
+from .code_analysis import CodeAnalysis
+
+class RegisterAllocator:
+    def __init__(self, set_name, register_set, default_column):
+        self.set_name = set_name
+        self.default_column = default_column
+        self.register_map = {register[0][default_column]:register[0] for register in register_set}
+        self.registers = [register[0][default_column] for register in register_set] # Preserve order
+        self.callee_saved = [register[1] for register in register_set]
+        self.positions = {register: pos for pos, register in enumerate(self.registers)}
+
+        # Registers handed out by obtain are virtual, physical registers are assigned once the code is complete
+        self.virtual_registers = []
+        self.virtual_positions = {}
+
+        # Bitmasks of physical registers reserved at any point, and of registers that are currently in use
+        self.reserved = 0
+        self.unavailable = 0
+        self.live = 0
+
+    def get_rows(self):
+        return [self.register_map[register] for register in self.registers] + [self.register_map[register] for register in self.virtual_registers]
+
+    def reserve(self, register, size_column=None):
+        bit = 1 << self.positions[register]
+        if self.unavailable & bit:
+            Logger.warn(f"Reserving an unavailable register: {register}.")
+
+        self.reserved |= bit
+        self.unavailable |= bit
+
+        if size_column is None:
+            return (register, register)
+        return (register, self.register_map[register][size_column])
+
+    def release(self, register):
+        if register in self.virtual_positions.keys():
+            bit = 1 << self.virtual_positions[register]
+            if not self.live & bit:
+                Logger.warn(f"Releasing an unavailable register: {register}.")
+            self.live &= ~bit
+            return
+
+        bit = 1 << self.positions[register]
+        if not self.unavailable & bit:
+            Logger.warn(f"Releasing an unavailable register: {register}.")
+        self.unavailable &= ~bit
+
+    def obtain(self, size_column=None):
+        pos = len(self.virtual_registers)
+        names = [f"{self.set_name}{pos}_{column}" for column in range(len(self.register_map[self.registers[0]]))]
+        register = names[self.default_column]
+
+        self.virtual_registers.append(register)
+        self.virtual_positions[register] = pos
+        self.register_map[register] = names
+        self.live |= 1 << pos
+
+        if size_column is None:
+            return (register, register)
+
+        return (register, names[size_column])
+
+class RegisterAssignment(CodeAnalysis):
+    # Spilled values are stored in slots of the widest vector size, which keeps them aligned for all moves
+    SLOT_BYTES = 64
+    SPILL_MOVES = {"default": "movq", "simd": "vmovaps", "mask": "kmovq"}
+
+    def __init__(self, register_allocators):
+        super().__init__({set_name: register_allocator.get_rows() for set_name, register_allocator in register_allocators.items()})
+        self.register_allocators = register_allocators
+        self.spilled = {}
+        self.spill_base = None
+        self.used_callee_saved = []
+
+    def is_virtual(self, location):
+        return location[1] >= len(self.register_allocators[location[0]].registers)
+
+    def get_references(self, statement):
+        references = {}
+        for operand in statement.operands:
+            registers = operand.get_registers() if type(operand) in [Memory, Masked] else [operand]
+            for register in registers:
+                location = self.get_physical(register)
+                if not location is None:
+                    references.setdefault(location, set()).add(self.columns[register.name])
+        return references
+
+    def get_pool(self, set_name, scratch, base, columns):
+        # Caller-saved registers are preferred, avoiding stack use in the prologue
+        register_allocator = self.register_allocators[set_name]
+        pool = [pos for pos in range(len(register_allocator.registers)) if not register_allocator.reserved & (1 << pos) and (set_name, pos) != self.stack_pointer]
+        pool = [pos for pos in pool if not register_allocator.callee_saved[pos]] + [pos for pos in pool if register_allocator.callee_saved[pos]]
+
+        # Registers set aside must not be used by the generated code directly
+        aside = [pos for pos in pool if not (set_name, pos) in columns.keys()][::-1][:scratch + (1 if base else 0)][::-1]
+        if len(aside) < scratch + (1 if base else 0):
+            raise RuntimeError(f"No {set_name} registers are left to reload spilled values.")
+        return [pos for pos in pool if not pos in aside], aside
+
+    def scan(self, set_name, pool, ranges, columns):
+        # Linear scan over the live ranges, the free registers of the pool are kept in a bitmask
+        fixed = [(ranges[(set_name, pos)], 1 << bit) for bit, pos in enumerate(pool) if (set_name, pos) in ranges.keys()]
+        supported = {}
+        for bit, pos in enumerate(pool):
+            for column in range(len(self.register_allocators[set_name].register_map[self.register_allocators[set_name].registers[pos]])):
+                if (set_name, pos, column) in self.names.keys():
+                    supported[column] = supported.get(column, 0) | (1 << bit)
+
+        intervals = sorted([(first, last, location) for location, (first, last) in ranges.items() if location[0] == set_name and self.is_virtual(location) and location in columns.keys()])
+        free = (1 << len(pool)) - 1
+        active = []
+        assignment = {}
+        spilled = set()
+        # Free registers are handed out round-robin, such that independent values do not share a register
+        rotation = 0
+
+        for first, last, location in intervals:
+            while active and active[0][0] < first:
+                free |= active.pop(0)[2]
+
+            allowed = (1 << len(pool)) - 1
+            for column in columns.get(location, []):
+                allowed &= supported.get(column, 0)
+            for (fixed_first, fixed_last), bit in fixed:
+                if fixed_first <= last and first <= fixed_last:
+                    allowed &= ~bit
+
+            candidates = free & allowed
+            if candidates:
+                following = candidates & ~((1 << rotation) - 1)
+                bit = (following or candidates) & -(following or candidates)
+                rotation = bit.bit_length() % len(pool)
+                free &= ~bit
+                assignment[location] = pool[bit.bit_length() - 1]
+                bisect.insort(active, (last, location, bit))
+                continue
+
+            # Spill the value that stays live the longest
+            victims = [entry for entry in active if entry[2] & allowed]
+            victim = max(victims) if victims else None
+            if not victim is None and victim[0] > last:
+                active.remove(victim)
+                assignment[location] = assignment.pop(victim[1])
+                spilled.add(victim[1])
+                bisect.insort(active, (last, location, victim[2]))
+            else:
+                spilled.add(location)
+
+        return assignment, spilled
+
+    def run(self, statements):
+        code = list(statements)
+        ranges = self.get_live_ranges(code)
+
+        columns = {}
+        references = []
+        for statement in code:
+            statement_references = self.get_references(statement) if type(statement) == Instruction else {}
+            references.append(statement_references)
+            for location, location_columns in statement_references.items():
+                columns.setdefault(location, set()).update(location_columns)
+
+        # Registers are set aside for reloading spilled values and addressing the spill slots until no more are needed
+        scratch = {set_name: 0 for set_name in self.register_allocators.keys()}
+        base = False
+        while True:
+            assignment = {}
+            spilled = set()
+            scratch_registers = {}
+            for set_name in self.register_allocators.keys():
+                pool, aside = self.get_pool(set_name, scratch[set_name], base and set_name == "default", columns)
+                set_assignment, set_spilled = self.scan(set_name, pool, ranges, columns)
+                assignment.update(set_assignment)
+                spilled |= set_spilled
+                scratch_registers[set_name] = aside
+
+            required = {set_name: max([0] + [len([location for location in statement_references.keys() if location in spilled and location[0] == set_name]) for statement_references in references]) for set_name in self.register_allocators.keys()}
+            if all([required[set_name] <= scratch[set_name] for set_name in scratch.keys()]) and (base or not spilled):
+                break
+            scratch = {set_name: max(scratch[set_name], required[set_name]) for set_name in scratch.keys()}
+            base = base or len(spilled) > 0
+
+        if spilled:
+            self.spill_base = self.names[("default", scratch_registers["default"][-1], 0)]
+            scratch_registers["default"] = scratch_registers["default"][:-1]
+            self.spilled = {location: slot for slot, location in enumerate(sorted(spilled))}
+
+        used = {set_name: set(register_allocator.registers[pos] for pos in range(len(register_allocator.registers)) if register_allocator.reserved & (1 << pos)) for set_name, register_allocator in self.register_allocators.items()}
+        if not self.spill_base is None:
+            used["default"].add(self.spill_base)
+
+        result = []
+        for statement, statement_references in zip(code, references):
+            if type(statement) != Instruction:
+                result.append(statement)
+                continue
+
+            mapping = {}
+            reloads = []
+            spills = []
+            access = self.analyze(statement)
+            free_scratch = {set_name: list(rows) for set_name, rows in scratch_registers.items()}
+            for location in statement_references.keys():
+                if not self.is_virtual(location):
+                    mapping[location] = location[1]
+                elif location in assignment.keys():
+                    mapping[location] = assignment[location]
+                else:
+                    mapping[location] = free_scratch[location[0]].pop(0)
+                    move = RegisterAssignment.SPILL_MOVES[location[0]]
+                    register = Register(self.names[(location[0], mapping[location], min(columns[location]))])
+                    slot = Memory(str(self.spilled[location] * RegisterAssignment.SLOT_BYTES), Register(self.spill_base))
+                    if location in access.reads:
+                        reloads.append(Instruction(move, [slot, register], indent=statement.indent))
+                    if location in access.writes:
+                        spills.append(Instruction(move, [register, slot], indent=statement.indent))
+                used[location[0]].add(self.names[(location[0], mapping[location], self.register_allocators[location[0]].default_column)])
+
+            result += reloads
+            result.append(self.assign(statement, mapping))
+            result += spills
+
+        for set_name, register_allocator in self.register_allocators.items():
+            for pos, register in enumerate(register_allocator.registers):
+                if register_allocator.callee_saved[pos] and register in used[set_name]:
+                    self.used_callee_saved.append(register)
+
+        return result
+
+    def assign(self, statement, mapping):
+        return Instruction(statement.opcode, [self.assign_operand(operand, mapping) for operand in statement.operands], indent=statement.indent)
+
+    def assign_operand(self, operand, mapping):
+        if type(operand) == Register and self.get_physical(operand) in mapping.keys():
+            return self.get_assigned(operand, mapping)
+        if type(operand) == Memory and any([self.get_physical(register) in mapping.keys() for register in operand.get_registers()]):
+            registers = [self.get_assigned(register, mapping) if not register is None and self.get_physical(register) in mapping.keys() else register for register in [operand.base, operand.index]]
+            return Memory(operand.displacement, registers[0], registers[1], operand.scale)
+        if type(operand) == Masked:
+            return Masked(self.assign_operand(operand.operand, mapping), self.assign_operand(operand.mask, mapping), operand.zeroing)
+        return operand
+
+    def get_assigned(self, register, mapping):
+        location = self.get_physical(register)
+        return Register(self.names[(location[0], mapping[location], self.columns[register.name])])
+
+    def get_prologue(self):
+        # Spill slots are addressed from an aligned frame, as generated code may move the stack pointer itself
+        if self.spill_base is None:
+            return []
+        size = len(self.spilled) * RegisterAssignment.SLOT_BYTES
+        return [
+            Instruction("movq", [Register("rsp"), Register(self.spill_base)]),
+            Instruction("subq", [Immediate(size + RegisterAssignment.SLOT_BYTES), Register("rsp")]),
+            Instruction("andq", [Immediate(-RegisterAssignment.SLOT_BYTES), Register("rsp")]),
+            Instruction("movq", [Register(self.spill_base), Memory(str(size), Register("rsp"))]),
+            Instruction("movq", [Register("rsp"), Register(self.spill_base)]),
+        ]
+
+    def get_epilogue(self):
+        if self.spill_base is None:
+            return []
+        return [Instruction("movq", [Memory(str(len(self.spilled) * RegisterAssignment.SLOT_BYTES), Register(self.spill_base)), Register("rsp")])]
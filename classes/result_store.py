@@ -0,0 +1,171 @@
+import os
+import sqlite3
+from datetime import datetime
+from .generator import CodeContext
+
+class ResultStore:
+    FILENAME = "results.db"
+
+    # Samples are looked up by the configuration they were measured for and the event they count
+    CONFIGURATION_COLUMNS = ["machine", "experiment", "kernel", "code", "suffix", "stride_unrolls", "portion_unrolls", "N", "trueN"]
+    INDEX_COLUMNS = CONFIGURATION_COLUMNS + ["event"]
+    SAMPLE_COLUMNS = INDEX_COLUMNS + ["run", "entry", "repetition", "position", "value", "unit", "metric", "metric_unit"]
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, machine TEXT, experiment TEXT, kernel TEXT, name TEXT, suffix TEXT, command TEXT, time TEXT)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS runs_name ON runs (machine, experiment, kernel, name)",
+        "CREATE TABLE IF NOT EXISTS samples (run INTEGER REFERENCES runs (id), machine TEXT, experiment TEXT, kernel TEXT, code TEXT, suffix TEXT, stride_unrolls INTEGER, portion_unrolls INTEGER, N INTEGER, trueN INTEGER, event TEXT, entry INTEGER, repetition INTEGER, position INTEGER, value REAL, unit TEXT, metric REAL, metric_unit TEXT)",
+        f"CREATE INDEX IF NOT EXISTS samples_configuration ON samples ({', '.join(INDEX_COLUMNS)})",
+        "CREATE TABLE IF NOT EXISTS sweeps (id INTEGER PRIMARY KEY, machine TEXT, experiment TEXT, started TEXT, finished TEXT)",
+        "CREATE TABLE IF NOT EXISTS jobs (sweep INTEGER REFERENCES sweeps (id), kernel TEXT, name TEXT, command TEXT, state TEXT, time TEXT)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS jobs_name ON jobs (sweep, kernel, name)",
+    ]
+
+    # States of the jobs in the journal of a sweep, where only done jobs have their run stored
+    JOB_STATES = ["planned", "running", "done", "failed"]
+
+    def __init__(self, path):
+        # A store per machine directory of the resources, such that stores are kept apart when synchronizing machines
+        self.path = path
+        self.machine = os.path.basename(os.path.dirname(path))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as connection:
+            for statement in ResultStore.SCHEMA:
+                connection.execute(statement)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @staticmethod
+    def locate(executable_path):
+        # Binaries are kept in resources/<machine>/experiments/<experiment>/kernels/<kernel>, returning the store with the experiment and kernel
+        parts = os.path.abspath(executable_path).split(os.sep)
+        if not "experiments" in parts or not "kernels" in parts:
+            return None
+
+        experiments = len(parts) - 1 - parts[::-1].index("experiments")
+        kernels = len(parts) - 1 - parts[::-1].index("kernels")
+        if kernels != experiments + 2 or kernels + 1 >= len(parts):
+            return None
+        return ResultStore(os.path.join(os.sep.join(parts[:experiments]), ResultStore.FILENAME)), parts[experiments + 1], parts[kernels + 1]
+
+    @staticmethod
+    def to_number(field):
+        try:
+            return float(field)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def parse_output(output):
+        # Rows of (configuration name, event, unit, position, value, metric, metric unit), where the name is only given by multi-configuration binaries
+        rows = []
+        for line in output.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#') or line.startswith('='):
+                continue
+
+            fields = line.split(',')
+            # Multi-configuration binaries write the name, repetition and time in ns, followed by the precision of the median of adaptive runs
+            if len(fields) in [3, 4] and fields[1].isdigit() and fields[2].isdigit():
+                metric = ResultStore.to_number(fields[3]) if len(fields) == 4 else None
+                rows.append((fields[0], "kernel_time", "ns", 0, float(fields[2]), metric, "median_ci" if not metric is None else None))
+            # Same layout as perf stat -x , with the value, unit, event, run time, percentage, metric and metric unit
+            elif len(fields) >= 3 and ResultStore.to_number(fields[2]) is None and fields[2] and (not ResultStore.to_number(fields[0]) is None or fields[0].startswith('<')):
+                metric = ResultStore.to_number(fields[5]) if len(fields) > 5 else None
+                metric_unit = fields[6] if len(fields) > 6 and fields[6] else None
+                rows.append((None, fields[2], fields[1] or None, 0, ResultStore.to_number(fields[0]), metric, metric_unit))
+            # Throughput in GB/s, followed by that of every thread when scaling over cores
+            elif all([not ResultStore.to_number(field) is None for field in fields]):
+                rows += [(None, "throughput", "GB/s", position, float(field), None, None) for position, field in enumerate(fields)]
+        return rows
+
+    def has_run(self, experiment, kernel, name):
+        with self.connect() as connection:
+            return not connection.execute("SELECT 1 FROM runs WHERE machine = ? AND experiment = ? AND kernel = ? AND name = ?", (self.machine, experiment, kernel, name)).fetchone() is None
+
+    def add_run(self, experiment, kernel, name, suffix, command, outputs):
+        # Appends the samples in the outputs of every entry of a run, named after its result, in a single transaction
+        samples = []
+        for entry, output in enumerate(outputs):
+            repetitions = {}
+            for row_name, event, unit, position, value, metric, metric_unit in ResultStore.parse_output(output):
+                configuration = CodeContext.decode_name(row_name if not row_name is None else name) or {}
+                repetition = repetitions.get((row_name, event, position), 0)
+                repetitions[(row_name, event, position)] = repetition + 1
+
+                samples.append((self.machine, experiment, kernel, configuration.get("code", row_name or name), suffix,
+                                configuration.get("stride_unrolls"), configuration.get("portion_unrolls"), configuration.get("N"), configuration.get("trueN"),
+                                event, entry, repetition, position, value, unit, metric, metric_unit))
+
+        with self.connect() as connection:
+            # Runs outside of a sweep, such as those of imported result files, are not journaled
+            if not self.get_sweep(experiment, connection, create=False) is None:
+                self.set_job(experiment, kernel, name, "done", command=command, connection=connection)
+            run = connection.execute("INSERT INTO runs (machine, experiment, kernel, name, suffix, command, time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (self.machine, experiment, kernel, name, suffix, command, datetime.now().isoformat())).lastrowid
+            connection.executemany(f"INSERT INTO samples ({', '.join(ResultStore.SAMPLE_COLUMNS)}) VALUES ({', '.join(['?'] * len(ResultStore.SAMPLE_COLUMNS))})",
+                                   [sample[:10] + (run,) + sample[10:] for sample in samples])
+        return len(samples)
+
+    def get_sweep(self, experiment, connection, create=True):
+        # Sweeps that were interrupted are left unfinished, such that the next sweep of the experiment resumes their journal
+        sweep = connection.execute("SELECT id FROM sweeps WHERE machine = ? AND experiment = ? AND finished IS NULL ORDER BY id DESC", (self.machine, experiment)).fetchone()
+        if not sweep is None or not create:
+            return sweep["id"] if not sweep is None else None
+        return connection.execute("INSERT INTO sweeps (machine, experiment, started) VALUES (?, ?, ?)", (self.machine, experiment, datetime.now().isoformat())).lastrowid
+
+    def start_sweep(self, experiment):
+        with self.connect() as connection:
+            return self.get_sweep(experiment, connection)
+
+    def finish_sweep(self, sweep):
+        with self.connect() as connection:
+            connection.execute("UPDATE sweeps SET finished = ? WHERE id = ?", (datetime.now().isoformat(), sweep))
+
+    def plan_jobs(self, experiment, jobs):
+        # Jobs of (kernel, name, command) are journaled before any is run, where jobs that have their run stored are already done
+        with self.connect() as connection:
+            for kernel, name, command in jobs:
+                done = not connection.execute("SELECT 1 FROM runs WHERE machine = ? AND experiment = ? AND kernel = ? AND name = ?", (self.machine, experiment, kernel, name)).fetchone() is None
+                self.set_job(experiment, kernel, name, "done" if done else "planned", command=command, connection=connection)
+
+    def set_job(self, experiment, kernel, name, state, command=None, connection=None):
+        if not state in ResultStore.JOB_STATES:
+            raise ValueError(f"Unknown job state {state}, expected one of {ResultStore.JOB_STATES}")
+        if connection is None:
+            with self.connect() as connection:
+                return self.set_job(experiment, kernel, name, state, command=command, connection=connection)
+
+        connection.execute("INSERT INTO jobs (sweep, kernel, name, command, state, time) VALUES (?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT (sweep, kernel, name) DO UPDATE SET command = COALESCE(excluded.command, command), state = excluded.state, time = excluded.time",
+                           (self.get_sweep(experiment, connection), kernel, name, command, state, datetime.now().isoformat()))
+
+    def get_jobs(self, sweep, states=None):
+        states = states or ResultStore.JOB_STATES
+        with self.connect() as connection:
+            rows = connection.execute(f"SELECT kernel, name, command, state, time FROM jobs WHERE sweep = ? AND state IN ({', '.join(['?'] * len(states))}) ORDER BY kernel, name", (sweep, *states)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_where(self, filters):
+        # Filters match on equality over the indexed columns, where None matches missing values
+        for column in filters.keys():
+            if not column in ResultStore.INDEX_COLUMNS:
+                raise ValueError(f"Cannot filter results on {column}, expected one of {ResultStore.INDEX_COLUMNS}")
+        if not filters:
+            return "", ()
+        return "WHERE " + " AND ".join([f"{column} IS ?" for column in filters.keys()]), tuple(filters.values())
+
+    def get_configurations(self, **filters):
+        where, arguments = self.get_where(filters)
+        with self.connect() as connection:
+            rows = connection.execute(f"SELECT DISTINCT {', '.join(ResultStore.CONFIGURATION_COLUMNS)} FROM samples {where}", arguments).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_samples(self, **filters):
+        where, arguments = self.get_where(filters)
+        with self.connect() as connection:
+            rows = connection.execute(f"SELECT {', '.join(ResultStore.SAMPLE_COLUMNS)} FROM samples {where} ORDER BY run, entry, repetition, position", arguments).fetchall()
+        return [dict(row) for row in rows]
@@ -1 +1,3 @@
-from .halide import *
\ No newline at end of file
+from .halide import *
+from .harness import *
+from .jit import *
\ No newline at end of file
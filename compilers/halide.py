@@ -1,19 +1,28 @@
 import os
+import shutil
 import subprocess
-from classes import Compiler
+from classes import Compiler, BuildGraph
 
 
 class HalideCompiler(Compiler):
-    def __init__(self, cc, root_path, src_dir, resource_dir, minimal_compiler, autoschedulers, mode='', standard='', debug=False, profile=False, opt='', warn=[], pedantic=False, include=[], lib=[], dmacro={}, umacro='', fopt=[], mopt=[], outfile='', flagfile='', infiles=[], libraries=[]):
-        super().__init__(cc, mode=mode, standard=standard, debug=debug, profile=profile, opt=opt, warn=warn, pedantic=pedantic, include=include, lib=lib, dmacro=dmacro, umacro=umacro, fopt=fopt, mopt=mopt, outfile=outfile, flagfile=flagfile, infiles=infiles, libraries=libraries)
+    def __init__(self, cc, root_path, src_dir, resource_dir, minimal_compiler, autoschedulers, target="x86-64-linux-avx-avx2-f16c-fma-sse41", mode='', standard='', debug=False, profile=False, opt='', warn=[], pedantic=False, include=[], lib=[], dmacro={}, umacro='', fopt=[], mopt=[], aopt=[], outfile='', flagfile='', infiles=[], libraries=[]):
+        super().__init__(cc, mode=mode, standard=standard, debug=debug, profile=profile, opt=opt, warn=warn, pedantic=pedantic, include=include, lib=lib, dmacro=dmacro, umacro=umacro, fopt=fopt, mopt=mopt, aopt=aopt, outfile=outfile, flagfile=flagfile, infiles=infiles, libraries=libraries)
         self.root_path = root_path
         self.src_dir = src_dir
         self.resource_dir = resource_dir
         self.minimal_compiler = minimal_compiler
         self.autoschedulers = autoschedulers
+        self.target = target
 
     def prebuild(self, generators, side, trueN):
         # Prebuild autoschedulers
+        graph = BuildGraph()
+        includes_infiles = self.add_prebuild(graph, generators, side, trueN)
+        graph.run()
+        return [(include, infiles) for include, infiles, _ in includes_infiles]
+
+    def add_prebuild(self, graph, generators, side, trueN):
+        # Build the generator once, then run every autoscheduler on it as a separate step
         kernel_name = generators[0]
         halide_dir = os.path.join(self.resource_dir, kernel_name, trueN)
         os.makedirs(halide_dir, exist_ok=True)
@@ -23,26 +32,35 @@ class HalideCompiler(Compiler):
         infile = os.path.join(self.src_dir, f"{kernel_name}.cpp")
         outfile = os.path.join(halide_dir, kernel_name)
         minimal_compiler.warn = []
-        minimal_compiler.compile(infile, outfile)
+        generator_build = graph.add(f"halide:{outfile}", minimal_compiler.build, args=(infile, outfile))
+
+        includes_infiles = []
+
+        for autoscheduler, autoscheduler_lib in self.autoschedulers:
+            autoscheduler_dir = os.path.join(halide_dir, autoscheduler)
+            autoschedule = graph.add(f"halide:{autoscheduler_dir}", self.autoschedule, args=(generators, autoscheduler, autoscheduler_lib, autoscheduler_dir), dependencies=[generator_build])
+            includes_infiles.append(([autoscheduler_dir], [os.path.join(autoscheduler_dir, f"{generator}halide.a") for generator in generators], autoschedule))
 
+        self.warn = []
+        return includes_infiles
+
+    def autoschedule(self, generators, autoscheduler, autoscheduler_lib, autoscheduler_dir, generator_path):
         env = os.environ.copy()
         ld_library_path = ''
         if 'LD_LIBRARY_PATH' in env.keys():
             ld_library_path = env["LD_LIBRARY_PATH"] + ':'
         env["LD_LIBRARY_PATH"] = f"{ld_library_path}{os.path.join(self.root_path, 'bin')}"
 
-        includes_infiles = []
-
-        for autoscheduler, autoscheduler_lib in self.autoschedulers:
-            autoscheduler_dir = os.path.join(halide_dir, autoscheduler)
-            includes_infiles.append(([autoscheduler_dir], [os.path.join(autoscheduler_dir, f"{generator}halide.a") for generator in generators]))
-            
-            if not os.path.exists(autoscheduler_dir):
-                os.makedirs(autoscheduler_dir, exist_ok=True)
+        if not os.path.exists(autoscheduler_dir):
+            os.makedirs(autoscheduler_dir, exist_ok=True)
+            try:
                 for generator in generators:
-                    gen_cmd = f"{outfile} -o {autoscheduler_dir} -g {generator}_auto_schedule_gen -f {generator}halide -e static_library,h,schedule -p {os.path.join(self.root_path, 'bin', autoscheduler_lib)} target=x86-64-linux-avx-avx2-f16c-fma-sse41 autoscheduler={autoscheduler} autoscheduler.parallelism=1"
+                    gen_cmd = f"{generator_path} -o {autoscheduler_dir} -g {generator}_auto_schedule_gen -f {generator}halide -e static_library,h,schedule -p {os.path.join(self.root_path, 'bin', autoscheduler_lib)} target={self.target} autoscheduler={autoscheduler} autoscheduler.parallelism=1"
                     print(gen_cmd)
                     subprocess.run(gen_cmd.split(' '), env=env, check=True)
+            except subprocess.CalledProcessError:
+                # Retry on the next run instead of linking against incomplete libraries
+                shutil.rmtree(autoscheduler_dir, ignore_errors=True)
+                raise
 
-        self.warn = []
-        return includes_infiles
+        return autoscheduler_dir
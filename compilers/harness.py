@@ -0,0 +1,58 @@
+import os
+import copy
+import hashlib
+from classes import Compiler
+
+
+class HarnessCompiler(Compiler):
+    # Macros that differ per kernel, these are resolved through symbols in the generated assembly instead
+    KERNEL_MACROS = ["N"]
+
+    def __init__(self, cc, harness_path, cache_dir, mode='', standard='', debug=False, profile=False, opt='', warn=[], pedantic=False, include=[], lib=[], dmacro={}, umacro='', fopt=[], mopt=[], aopt=[], outfile='', flagfile='', infiles=[], libraries=[]):
+        super().__init__(cc, mode=mode, standard=standard, debug=debug, profile=profile, opt=opt, warn=warn, pedantic=pedantic, include=include, lib=lib, dmacro=dmacro, umacro=umacro, fopt=fopt, mopt=mopt, aopt=aopt, outfile=outfile, flagfile=flagfile, infiles=infiles, libraries=libraries)
+        self.harness_path = harness_path
+        self.cache_dir = cache_dir
+
+    def get_harness_compiler(self):
+        harness_compiler = copy.deepcopy(self)
+        harness_compiler.mode = 'c'
+        harness_compiler.dmacro = {k: v for k, v in self.dmacro.items() if k not in HarnessCompiler.KERNEL_MACROS}
+        harness_compiler.infiles = []
+        harness_compiler.lib = []
+        harness_compiler.libraries = []
+        return harness_compiler
+
+    def get_harness_object_path(self):
+        # Cache the harness per set of flags and macros, and per version of its sources
+        harness_compiler = self.get_harness_compiler()
+        key = hashlib.sha256(harness_compiler.get_command(self.harness_path, '').encode())
+        harness_dir = os.path.dirname(self.harness_path)
+        for source in sorted(os.listdir(harness_dir)):
+            with open(os.path.join(harness_dir, source), 'rb') as source_file:
+                key.update(source_file.read())
+
+        return os.path.join(self.cache_dir, f"harness_{key.hexdigest()[:16]}.o")
+
+    def prepare(self):
+        harness_object_path = self.get_harness_object_path()
+
+        if not os.path.exists(harness_object_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # Build aside and move into place, generator processes may race to build the same harness
+            temp_path = f"{harness_object_path}.{os.getpid()}.tmp"
+            Compiler.compile(self.get_harness_compiler(), self.harness_path, temp_path)
+            if os.path.exists(temp_path):
+                os.replace(temp_path, harness_object_path)
+
+        return harness_object_path
+
+    def compile(self, infile, outfile, code=None):
+        # Only assemble the kernel and link it against the prebuilt harness
+        linker = copy.deepcopy(self)
+        linker.dmacro = {}
+        linker.umacro = ''
+        linker.include = []
+        linker.warn = []
+        linker.infiles = [self.prepare()] + [infile for infile in self.infiles if infile != self.harness_path]
+        return Compiler.compile(linker, infile, outfile, code=code)
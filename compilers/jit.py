@@ -0,0 +1,13 @@
+from classes import Compiler
+
+
+class JITCompiler(Compiler):
+    # Macros of the benchmark harness that the JIT execution manager reads back from the object file
+    HARNESS_MACROS = ["WARMUP", "REPETITIONS", "TESTING", "TIME", "MMAP_FLAG_HUGE", "PARAMETRIC", "SAMPLES", "PAGES", "CACHE", "SWEEP_SIZE", "ADAPTIVE", "TOLERANCE_PPM", "TIME_BUDGET_MS", "MAX_REPETITIONS", "MAX_WARMUP"]
+
+    def compile(self, infile, outfile, code=None):
+        # Only assemble the generated kernel, the harness is provided by the JIT execution manager
+        defsym = [f"--defsym,{k}={v if v != '' else 1}" for k, v in self.dmacro.items() if k in JITCompiler.HARNESS_MACROS]
+        assembler = Compiler(self.cc, mode='c', debug=self.debug, aopt=self.aopt + defsym)
+        assembler.set_cache(self.cache)
+        return assembler.compile(infile, outfile, code=code)
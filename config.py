@@ -1,22 +1,33 @@
 import os
+import re
 import functools
-from classes import MachineConfig, Constants, Compiler, Logger
+import itertools
+from classes import MachineConfig, Constants, Compiler, BuildCache, Logger
 from experiments import DataMovementExperiment, ComputeExperiment, ComputeOptimizedExperiment
-from execution_managers import DirectExecutionManager, SLURMExecutionManager
+from execution_managers import DirectExecutionManager, SLURMExecutionManager, JITExecutionManager
 import shutil
 import multiprocessing
 import subprocess
-from compilers import HalideCompiler
+from compilers import HalideCompiler, HarnessCompiler, JITCompiler
 
 ENTRY_FUNCTION="experiment"
 TEST_INPUT_FILENAME="input.txt"
 TEST_OUTPUT_FILENAME="output.txt"
 DTYPE_SIZE_BYTES=4 # float
-SIMD_VEC_SIZE_BITS=256 # AVX2
 ND_TYPE='float32'
 WARMUP=0
 REPETITIONS=5
 ENTRIES=5
+BUILD_CACHE_SIZE=1 << 32 # bytes
+INIT_THREADS=min(8, multiprocessing.cpu_count())
+MMAP_POPULATE=False
+DATASET_DIR="/dev/shm"
+HUGE_DATASET_DIR="/dev/hugepages"
+TEST_DATA_DIR="/dev/shm"
+NUMA_POLICIES=r"local|remote|interleave|node[0-9]+"
+ADAPTIVE_BUDGET=10 # seconds per kernel
+MAX_REPETITIONS=10000
+MAX_WARMUP=100
 
 def resource_path_construction(realpath, machine_name, experiment_name=None, kernel_name=None):
     base_dir = os.path.join(realpath, "resources", machine_name)
@@ -58,7 +69,32 @@ x86_64_default_registers = [
 x86_64_default_registers_default_column = 0
 
 avx_simd_registers = [([f"{size}mm{no}" for size in ['z', 'y', 'x']], False) for no in range(16)]
-avx_simd_registers_default_column = 1 # AVX2
+avx512_simd_registers = [([f"{size}mm{no}" for size in ['z', 'y', 'x']], False) for no in range(32)]
+avx512_mask_registers = [([f"k{no}"], False) for no in range(1, 8)] # k0 cannot be used as a mask
+
+# Vector widths, the controls are compiled, MKL is dispatched and Halide is autoscheduled for the same width as the generated code
+simd_vector_widths = {
+    "sse": {"bits": 128, "registers": avx_simd_registers, "default_column": 2, "mask_registers": [], "mopt": ["prefer-vector-width=128"], "mkl": "SSE4_2", "halide": "x86-64-linux-sse41"},
+    "avx2": {"bits": 256, "registers": avx_simd_registers, "default_column": 1, "mask_registers": [], "mopt": ["avx2", "prefer-vector-width=256"], "mkl": "AVX2", "halide": "x86-64-linux-avx-avx2-f16c-fma-sse41"},
+    "avx512": {"bits": 512, "registers": avx512_simd_registers, "default_column": 0, "mask_registers": avx512_mask_registers, "mopt": ["avx512f", "avx512vl", "avx512dq", "avx512bw", "prefer-vector-width=512"], "mkl": "AVX512", "halide": "x86-64-linux-avx-avx2-avx512-avx512_skylake-f16c-fma-sse41"},
+}
+DEFAULT_VECTOR_WIDTH="avx2"
+
+# Pages backing the data of the benchmark harness, with the values of its PAGES macro
+memory_page_sizes = {
+    "4k": 1,
+    "thp": 2,
+    "2m": 3,
+    "1g": 4,
+}
+
+# State of the caches at the start of every repetition of the benchmark harness, with the values of its CACHE macro
+memory_cache_modes = {
+    "warm": 1,
+    "flush": 2,
+    "sweep": 3,
+    "mixed": 4,
+}
 
 # Experiments
 experiment_configurations = {
@@ -137,7 +173,21 @@ machine_configs = {
     ),
 }
 
-def configure(machine_name, experiment_names, realpath, debug=False):
+def get_dataset_dirs(machine_name):
+    return {"MULTISTRIDING_DATASET": os.path.join(DATASET_DIR, f"multistriding-{machine_name}"),
+            "MULTISTRIDING_HUGE_DATASET": os.path.join(HUGE_DATASET_DIR, f"multistriding-{machine_name}")}
+
+def clean_datasets(machine_name):
+    for dataset_dir in get_dataset_dirs(machine_name).values():
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+
+def get_test_data_dir(machine_name):
+    return os.path.join(TEST_DATA_DIR, f"multistriding-{machine_name}-test")
+
+def clean_test_data(machine_name):
+    shutil.rmtree(get_test_data_dir(machine_name), ignore_errors=True)
+
+def configure(machine_name, experiment_names, realpath, debug=False, jit=False, dispatch=False, lean=False, vector_widths=None, parametric=False, dataset=False, shared_test_data=False, scaling=False, numa=None, page_sizes=None, cache_modes=None, tolerance=None, budget=None):
     construct_resource_path = functools.partial(resource_path_construction, realpath, machine_name)
     construct_result_path = functools.partial(result_path_construction, realpath, machine_name)
 
@@ -149,8 +199,35 @@ def configure(machine_name, experiment_names, realpath, debug=False):
         machine_config["execution_manager"].set_slurm_dir(slurm_dir)
     else:
         machine_config["execution_manager"]
+    if type(machine_config["execution_manager"]) == DirectExecutionManager and not machine_config.get("test_jobs") is None:
+        machine_config["execution_manager"].test_jobs = machine_config["test_jobs"]
     machine_config["machine_name"] = machine_name
 
+    # The NUMA policy of a run overrides that of the machine, binaries started from here on place their data by it
+    if not numa is None:
+        machine_config["numa"] = numa
+    if not machine_config.get("numa") is None:
+        if re.fullmatch(NUMA_POLICIES, machine_config["numa"]) is None:
+            Logger.fail(f"NUMA policy \"{machine_config['numa']}\" is not one of local, remote, interleave or node<n>")
+        os.environ["MULTISTRIDING_NUMA"] = machine_config["numa"]
+
+    # Binaries started from here on reuse the initialized datasets of previous runs
+    if dataset:
+        os.environ.update(get_dataset_dirs(machine_name))
+
+    # Test data in shared memory is not visible to other nodes
+    if shared_test_data and type(machine_config["execution_manager"]) == SLURMExecutionManager:
+        Logger.warn("Test data in shared memory is not supported with the SLURM execution manager, writing it to the resources instead.")
+        shared_test_data = False
+
+    # Kernels repeat until the median is within the tolerance or the budget is spent, instead of a fixed number of times
+    adaptive_macros = {}
+    if not tolerance is None:
+        budget = ADAPTIVE_BUDGET if budget is None else budget
+        if tolerance <= 0 or budget <= 0:
+            Logger.fail(f"Tolerance {tolerance} and time budget {budget} must be positive")
+        adaptive_macros = {"ADAPTIVE": "", "TOLERANCE_PPM": round(tolerance * 1e6), "TIME_BUDGET_MS": round(budget * 1000), "MAX_REPETITIONS": MAX_REPETITIONS, "MAX_WARMUP": MAX_WARMUP}
+
     # Compilers and runtime arguments
     compilers = {}
 
@@ -158,8 +235,14 @@ def configure(machine_name, experiment_names, realpath, debug=False):
     runtime_arguments_map = {}
     
     if "clang" in paths.keys():
-        compilers["minimal"] = Compiler(paths["clang"], debug=debug, warn=['all', 'extra'], opt=3, fopt=['no-inline'], include=[os.path.join(realpath, "src", "multistriding")], dmacro={"WARMUP": WARMUP, "REPETITIONS": REPETITIONS})
-        compilers["default"] = compilers["minimal"].copy(mopt=["arch=native", "avx2"], fopt=["vectorize"], infiles=[os.path.join(realpath, "src", "multistriding", "main.c")])
+        compilers["minimal"] = Compiler(paths["clang"], debug=debug, warn=['all', 'extra'], opt=3, fopt=['no-inline'], include=[os.path.join(realpath, "src", "multistriding")], dmacro={"WARMUP": WARMUP, "REPETITIONS": REPETITIONS, "INIT_THREADS": INIT_THREADS}, libraries=["pthread", "m"])
+        if MMAP_POPULATE:
+            compilers["minimal"].dmacro.update({"MMAP_POPULATE": ""})
+        compilers["minimal"].dmacro.update(adaptive_macros)
+        compilers["minimal"].set_cache(BuildCache(os.path.join(construct_resource_path(), "cache"), BUILD_CACHE_SIZE))
+        compilers["kernel"] = HarnessCompiler(paths["clang"], os.path.join(realpath, "src", "multistriding", "main.c"), os.path.join(construct_resource_path(), "harness"), dmacro={})
+        compilers["kernel"].update_from_compiler(compilers["minimal"])
+        compilers["default"] = compilers["minimal"].copy(mopt=["arch=native"], fopt=["vectorize"], infiles=[os.path.join(realpath, "src", "multistriding", "main.c")])
         compilers["polly"] = compilers["default"].copy(mopt=["llvm -polly", "llvm -polly-vectorizer=stripmine"])
         
         if "openblas" in paths.keys():
@@ -249,39 +332,100 @@ def configure(machine_name, experiment_names, realpath, debug=False):
     else:
         Logger.fail("Cannot generate codes without a compiler specified in config.py")
 
-    runtime_arguments = {library: ' '.join([f"{variable}={value}" for variable, value in arguments.items()]) for library, arguments in runtime_arguments_map.items()}       
-
-    machine_config["runtime_arguments"] = runtime_arguments
-    machine = MachineConfig(**machine_config)
-
-    # Constants
-    constants_configuration = Constants(ENTRY_FUNCTION,
-                                        DTYPE_SIZE_BYTES, 
-                                        SIMD_VEC_SIZE_BITS,
-                                        ND_TYPE,
-                                        WARMUP,
-                                        REPETITIONS,
-                                        ENTRIES,
-                                        x86_64_default_registers, x86_64_default_registers_default_column, 
-                                        avx_simd_registers, avx_simd_registers_default_column,
-                                        machine,
-                                        realpath,
-                                        construct_resource_path,
-                                        construct_result_path,
-                                        TEST_INPUT_FILENAME, TEST_OUTPUT_FILENAME)
+    if jit:
+        if type(machine_config["execution_manager"]) == DirectExecutionManager:
+            machine_config["execution_manager"] = JITExecutionManager(machine_config["execution_manager"], entry_function=ENTRY_FUNCTION, core=machine_config.get("core", 0), numa=machine_config.get("numa"))
+            compilers["jit"] = JITCompiler(paths["clang"], debug=debug, dmacro={"WARMUP": WARMUP, "REPETITIONS": REPETITIONS, **adaptive_macros})
+            compilers["jit"].set_cache(compilers["minimal"].cache)
+        else:
+            Logger.warn("In-process execution is only supported with the direct execution manager, building binaries instead.")
 
-    # Experiments
-    experiments = []
-    for experiment_name in experiment_names:
-        if experiment_name not in experiment_configurations.keys():
-            Logger.fail(f"Experiment name \"{experiment_name}\" not in available names: {experiment_configurations.keys()}, register it in config.py")
-        
-        compiler_copies = {name: compiler.copy() for name, compiler in compilers.items()}
+    if vector_widths is None:
+        vector_widths = machine_config.get("vector_widths", [DEFAULT_VECTOR_WIDTH])
 
-        machine_specific_experiment_configuration = {}
-        if experiment_name in machine_specific_experiment_configurations.keys():
-            machine_specific_experiment_configuration= machine_specific_experiment_configurations[experiment_name]
+    # Without page sizes or cache modes, experiments use the pages they default to and run warm
+    if page_sizes is None:
+        page_sizes = machine_config.get("page_sizes", [None])
+    if cache_modes is None:
+        cache_modes = machine_config.get("cache_modes", [None])
 
-        experiments.append(experiment_configurations[experiment_name](constants_configuration, compiler_copies, machine_specific_experiment_configuration))
+    # Experiments
+    experiments = []
+    for vector_width, page_size, cache_mode in itertools.product(vector_widths, page_sizes, cache_modes):
+        if vector_width not in simd_vector_widths.keys():
+            Logger.fail(f"Vector width \"{vector_width}\" not in available widths: {simd_vector_widths.keys()}")
+        width = simd_vector_widths[vector_width]
+        if not page_size is None and page_size not in memory_page_sizes.keys():
+            Logger.fail(f"Page size \"{page_size}\" not in available page sizes: {memory_page_sizes.keys()}")
+        if not cache_mode is None and cache_mode not in memory_cache_modes.keys():
+            Logger.fail(f"Cache mode \"{cache_mode}\" not in available cache modes: {memory_cache_modes.keys()}")
+
+        # Resources and results of other widths than the default are kept apart per machine
+        width_machine_name = machine_name if vector_width == DEFAULT_VECTOR_WIDTH else f"{machine_name}-{vector_width}"
+        if not machine_config.get("numa") is None:
+            width_machine_name = f"{width_machine_name}-{machine_config['numa']}"
+        if not page_size is None:
+            width_machine_name = f"{width_machine_name}-{page_size}"
+        if not cache_mode is None:
+            width_machine_name = f"{width_machine_name}-{cache_mode}"
+
+        width_runtime_arguments_map = {library: dict(arguments) for library, arguments in runtime_arguments_map.items()}
+        for library in ["mkl", "opencv"]:
+            if library in width_runtime_arguments_map.keys():
+                width_runtime_arguments_map[library]["MKL_ENABLE_INSTRUCTIONS"] = width["mkl"]
+        runtime_arguments = {library: ' '.join([f"{variable}={value}" for variable, value in arguments.items()]) for library, arguments in width_runtime_arguments_map.items()}
+
+        machine_config["runtime_arguments"] = runtime_arguments
+        machine = MachineConfig(**machine_config)
+
+        # Constants
+        constants_configuration = Constants(ENTRY_FUNCTION,
+                                            DTYPE_SIZE_BYTES, 
+                                            width["bits"],
+                                            ND_TYPE,
+                                            WARMUP,
+                                            REPETITIONS,
+                                            ENTRIES,
+                                            x86_64_default_registers, x86_64_default_registers_default_column, 
+                                            width["registers"], width["default_column"],
+                                            machine,
+                                            realpath,
+                                            functools.partial(resource_path_construction, realpath, width_machine_name),
+                                            functools.partial(result_path_construction, realpath, width_machine_name),
+                                            TEST_INPUT_FILENAME, TEST_OUTPUT_FILENAME,
+                                            dispatch=dispatch,
+                                            lean=lean,
+                                            mask_register_set=width["mask_registers"],
+                                            parametric=parametric,
+                                            test_data_dir=os.path.join(get_test_data_dir(machine_name), width_machine_name) if shared_test_data else None,
+                                            scaling=scaling,
+                                            page_size=page_size,
+                                            cache_mode=cache_mode)
+
+        for experiment_name in experiment_names:
+            if experiment_name not in experiment_configurations.keys():
+                Logger.fail(f"Experiment name \"{experiment_name}\" not in available names: {experiment_configurations.keys()}, register it in config.py")
+            
+            # Only the controls are compiled for the host, generated kernels are assembled
+            compiler_copies = {name: compiler.copy(mopt=width["mopt"]) if "arch=native" in compiler.mopt else compiler.copy() for name, compiler in compilers.items()}
+            # Halide is autoscheduled for the features of the width, its libraries are kept apart per width
+            if "halide" in compiler_copies.keys():
+                compiler_copies["halide"].target = width["halide"]
+                compiler_copies["halide"].resource_dir = os.path.join(compiler_copies["halide"].resource_dir, vector_width)
+            if not page_size is None:
+                for compiler in compiler_copies.values():
+                    compiler.dmacro.update({"PAGES": memory_page_sizes[page_size]})
+            if not cache_mode is None:
+                cache_macros = {"CACHE": memory_cache_modes[cache_mode]}
+                if not machine_config.get("sweep_size") is None:
+                    cache_macros["SWEEP_SIZE"] = machine_config["sweep_size"]
+                for compiler in compiler_copies.values():
+                    compiler.dmacro.update(cache_macros)
+
+            machine_specific_experiment_configuration = {}
+            if experiment_name in machine_specific_experiment_configurations.keys():
+                machine_specific_experiment_configuration= machine_specific_experiment_configurations[experiment_name]
+
+            experiments.append(experiment_configurations[experiment_name](constants_configuration, compiler_copies, machine_specific_experiment_configuration))
         
     return experiments
\ No newline at end of file
@@ -1,2 +1,3 @@
 from .direct import *
-from .slurm import *
\ No newline at end of file
+from .slurm import *
+from .jit import *
\ No newline at end of file
@@ -1,6 +1,7 @@
 import re
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from classes import ExecutionManager
 from datetime import datetime
 from classes import Logger
@@ -8,6 +9,7 @@ from classes import Logger
 class DirectExecutionManager(ExecutionManager):
     def __init__(self):
         super().__init__("direct")
+        self.test_jobs = os.cpu_count()
 
     def run(self, commands, n_entries, test_functions=[], swap_stdout=False, suffix='', env=None):
         commands = list(commands)
@@ -16,73 +18,131 @@ class DirectExecutionManager(ExecutionManager):
                 Logger.fail("Cannot test commands, list of test functions must be of same size as list of commands.")
         else:
             test_functions = [None] * len(commands)
+        self.plan_jobs(commands, test_functions, suffix=suffix)
 
-        for command, test_function in zip(commands, test_functions):
+        # Tests only check correctness, so they run concurrently, where tests sharing their test data run in order
+        if self.test_jobs > 1 and len(commands) > 1 and all([not test_function is None for test_function in test_functions]):
+            groups = {}
+            for command, test_function in zip(commands, test_functions):
+                groups.setdefault(self.get_test_data_dir(command), []).append((command, test_function))
+
+            with ThreadPoolExecutor(max_workers=self.test_jobs) as pool:
+                futures = [pool.submit(self.run_group, group, n_entries, swap_stdout, suffix, env) for group in groups.values()]
+                for future in futures:
+                    future.result()
+        else:
+            self.run_group(zip(commands, test_functions), n_entries, swap_stdout, suffix, env)
+
+    @staticmethod
+    def get_test_data_dir(command):
+        # Test binaries take the paths of their input and output files as arguments
+        embedded_command = command[1] if type(command) == tuple else command
+        return next((os.path.dirname(argument) for argument in embedded_command.split(' ')[1:] if os.sep in argument), embedded_command)
+
+    def run_group(self, group, n_entries, swap_stdout, suffix, env):
+        for command, test_function in group:
+            self.run_command(command, test_function, n_entries, swap_stdout, suffix, env)
+
+    def run_command(self, command, test_function, n_entries, swap_stdout, suffix, env):
+        if not test_function is None:
+            test_data_dir = test_function()
+            if test_data_dir is None:
+                Logger.fail("Need to return test data directory in test function.")
+
+        exception = None
+        try:
+            if type(command) == tuple:
+                embedded_command = command[1]
+                command = command[0]
+            else:
+                embedded_command = command
+
+            # Get paths to outputs
+            executable_path = command.split(' ')[0]
+            location = self.get_result_store(executable_path, test_function=test_function)
+            if not location is None:
+                self.run_stored(location, command, embedded_command, n_entries, swap_stdout, suffix, env)
+                return
+
+            resfile_path, errfile_path = self.get_result_paths(executable_path, suffix=suffix)
+            partial_path = self.get_partial_path(resfile_path)
+
+            # Run command and write output to files
+            retval = None
+            if not os.path.exists(resfile_path):
+                with open(errfile_path, 'a+') as log_file:
+                    with open(partial_path, 'w+') as partial_file:
+                        out_file, err_file = (log_file, partial_file) if swap_stdout else (partial_file, log_file)
+                        log_file.write(f"============ {datetime.now()} ============\n")
+                        log_file.flush()
+                        os.fsync(log_file.fileno())
+                        embedded_command = re.sub(' +', ' ', embedded_command).strip()
+                        print(embedded_command)
+
+                        # Commands setting variables are run by a shell, which takes them as a single string
+                        shell = '=' in embedded_command
+                        for _ in range(n_entries):
+                            return_object = subprocess.run(embedded_command if shell else embedded_command.split(' '), stdout=out_file, stderr=err_file, env=env, shell=shell)
+                            retval = return_object.returncode
+                            if not test_function is None:
+                                if retval != 0:
+                                    Logger.warn(f"Test for {embedded_command} failed!")
+                                    print(retval)
+                                else:
+                                    Logger.ok(f"Test for {embedded_command} passed!")
+                os.replace(partial_path, resfile_path)
+
+            else:
+                Logger.ok(f"Skipping {command}: result already exists!")
+
+            if not test_function is None:
+                self.record_test(executable_path, resfile_path, retval)
+        except Exception as e:
+            print(e)
+            exception = e
+        finally:
             if not test_function is None:
-                test_data_dir = test_function()
-                if test_data_dir is None:
-                    Logger.fail("Need to return test data directory in test function.")
-
-            exception = None
-            try:
-                if type(command) == tuple:
-                    embedded_command = command[1]
-                    command = command[0]
-                else:
-                    embedded_command = command
-
-                # Get paths to outputs
-                executable_path = command.split(' ')[0]
-                executable_name = os.path.basename(executable_path)
-                suffix_used = f'-{suffix}' if suffix else ''
-                result_name = '_'.join([f"{executable_name.split('_')[0]}{suffix_used}"] + executable_name.split('_')[1:])
-                resdir = os.path.join(os.path.dirname(os.path.dirname(executable_path)), 'res')
-                resfile_path = os.path.join(resdir, f"{result_name}.csv")
-                errfile_path = os.path.join(resdir, f"{result_name}.err")
-
-                if swap_stdout:
-                    temp = resfile_path
-                    resfile_path = errfile_path
-                    errfile_path = temp
-
-                # Run command and write output to files
-                if not os.path.exists(resfile_path):
-                    with open(errfile_path, 'a+') as err_file:
-                        with open(resfile_path, 'w+') as out_file:
-                            if swap_stdout:
-                                out_file.write(f"============ {datetime.now()} ============\n")
-                                out_file.flush()
-                                os.fsync(out_file.fileno())
-                            else:
-                                err_file.write(f"============ {datetime.now()} ============\n")
-                                err_file.flush()
-                                os.fsync(err_file.fileno())
-                            embedded_command = re.sub(' +', ' ', embedded_command).strip()
-                            print(embedded_command)
-
-                            for _ in range(n_entries):
-                                return_object = subprocess.run(embedded_command.split(' '), stdout=out_file, stderr=err_file, env=env, shell=('=' in embedded_command))
-                                retval = return_object.returncode
-                                if not test_function is None:
-                                    if retval != 0:
-                                        Logger.warn(f"Test for {embedded_command} failed!")
-                                        print(retval)
-                                    else:
-                                        Logger.ok(f"Test for {embedded_command} passed!")
-
-                else:
-                    Logger.ok(f"Skipping {command}: result already exists!")
-            except Exception as e:
-                print(e)
-                exception = e 
-            finally:
-                if not test_function is None:
-                    files = os.listdir(test_data_dir)
-                    for file in files:
-                        os.unlink(os.path.join(test_data_dir, file))
-
-                if not exception is None:
-                    raise exception
-
-
-            
\ No newline at end of file
+                files = os.listdir(test_data_dir)
+                for file in files:
+                    os.unlink(os.path.join(test_data_dir, file))
+
+            if not exception is None:
+                raise exception
+
+    def run_stored(self, location, command, embedded_command, n_entries, swap_stdout, suffix, env):
+        store, experiment_name, kernel_name = location
+        executable_path = command.split(' ')[0]
+        result_name = self.get_result_name(executable_path, suffix=suffix)
+        if store.has_run(experiment_name, kernel_name, result_name):
+            Logger.ok(f"Skipping {command}: result already exists!")
+            return
+
+        # Results are read from the stream the harness or perf writes them to, the other stream is logged
+        _, errfile_path = self.get_result_paths(executable_path, suffix=suffix)
+        store.set_job(experiment_name, kernel_name, result_name, "running", command=embedded_command)
+        outputs = []
+        retval = 0
+        with open(errfile_path, 'a+') as err_file:
+            err_file.write(f"============ {datetime.now()} ============\n")
+            err_file.flush()
+            os.fsync(err_file.fileno())
+            embedded_command = re.sub(' +', ' ', embedded_command).strip()
+            print(embedded_command)
+
+            shell = '=' in embedded_command
+            for _ in range(n_entries):
+                return_object = subprocess.run(embedded_command if shell else embedded_command.split(' '),
+                                               stdout=err_file if swap_stdout else subprocess.PIPE, stderr=subprocess.PIPE if swap_stdout else err_file, env=env, shell=shell, text=True)
+                outputs.append(return_object.stderr if swap_stdout else return_object.stdout)
+                retval = retval or return_object.returncode
+
+            # Failed runs are not stored, such that the next sweep runs them again, but their output is logged as the harness reports errors on it
+            if retval != 0:
+                err_file.writelines(outputs)
+
+        if retval != 0:
+            store.set_job(experiment_name, kernel_name, result_name, "failed")
+            Logger.warn(f"{embedded_command} failed with return code {retval}, see {errfile_path}")
+            return
+
+        store.add_run(experiment_name, kernel_name, result_name, suffix or None, embedded_command, outputs)
@@ -0,0 +1,573 @@
+import io
+import re
+import glob
+import os
+import math
+import mmap
+import bisect
+import time
+import struct
+import ctypes
+import numpy as np
+from datetime import datetime
+from classes import ExecutionManager, Logger
+
+MAP_HUGETLB = 0x40000
+MAP_HUGE_2MB = 21 << 26
+MAP_HUGE_1GB = 30 << 26
+MADV_HUGEPAGE = 14
+MADV_NOHUGEPAGE = 15
+
+# Values of the PAGES macro of the benchmark harness
+PAGES_REGULAR = 1
+PAGES_TRANSPARENT = 2
+PAGES_HUGE_2MB = 3
+PAGES_HUGE_1GB = 4
+
+# Values of the CACHE macro of the benchmark harness
+CACHE_WARM = 1
+CACHE_FLUSH = 2
+CACHE_SWEEP = 3
+CACHE_MIXED = 4
+CACHE_LINE = 64
+DEFAULT_LLC_SIZE = 32 << 20
+STEADY_WINDOW = 3
+
+# Flushes the lines of a buffer given its address and size, as the harness does between repetitions:
+# add %rdi, %rsi; 1: clflush (%rdi); add $64, %rdi; cmp %rsi, %rdi; jb 1b; mfence; ret
+FLUSH_CODE = bytes.fromhex("4801fe" "0fae3f" "4883c740" "4839f7" "72f4" "0faef0" "c3")
+SYS_MBIND = 237
+MPOL_BIND = 2
+MPOL_INTERLEAVE = 3
+MPOL_MF_MOVE = 1 << 1
+MISMATCH_REPORT = 10
+COMPARE_BLOCK = 1 << 22
+
+ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+ELF_SECTION_HEADER = struct.Struct("<IIQQQQIIQQ")
+ELF_SYMBOL = struct.Struct("<IBBHQQ")
+ET_REL = 1
+SHT_SYMTAB = 2
+SHT_RELA = 4
+SHT_REL = 9
+SHN_ABS = 0xfff1
+
+
+class KernelObject:
+    def __init__(self, path, entry_function):
+        with open(path, 'rb') as object_file:
+            elf = object_file.read()
+
+        sections, names = KernelObject.get_sections(elf)
+
+        def section_data(section):
+            return elf[section[4]:section[4] + section[5]]
+
+        self.text = section_data(sections[names.index(".text")])
+
+        # The kernel is copied verbatim into executable memory, so it must not need relocating
+        if KernelObject.has_text_relocations(sections, names):
+            raise RuntimeError(f"{path} contains relocations and cannot be executed in-process.")
+
+        self.symbols = {}
+        symtab = [section for section in sections if section[1] == SHT_SYMTAB][0]
+        strtab = sections[symtab[6]]
+        for offset in range(symtab[4], symtab[4] + symtab[5], ELF_SYMBOL.size):
+            st_name, _, _, st_shndx, st_value, _ = ELF_SYMBOL.unpack_from(elf, offset)
+            name_offset = strtab[4] + st_name
+            name = elf[name_offset:elf.index(b'\0', name_offset)].decode()
+            if name:
+                self.symbols[name] = (st_shndx, st_value)
+
+        self.entry = self.symbols[entry_function][1]
+
+        # Kernels taking their size as an argument do not define the number of values to allocate
+        self.N = None
+        if "N" in self.symbols.keys():
+            data = section_data(sections[names.index(".data")])
+            self.N = struct.unpack_from("<Q", data, self.symbols["N"][1])[0]
+
+    @staticmethod
+    def get_sections(elf):
+        header = ELF_HEADER.unpack_from(elf)
+        shoff, shnum, shstrndx = header[6], header[12], header[13]
+        sections = [ELF_SECTION_HEADER.unpack_from(elf, shoff + i * ELF_SECTION_HEADER.size) for i in range(shnum)]
+
+        def section_name(section):
+            names_offset = sections[shstrndx][4] + section[0]
+            return elf[names_offset:elf.index(b'\0', names_offset)].decode()
+
+        return sections, [section_name(section) for section in sections]
+
+    @staticmethod
+    def has_text_relocations(sections, names):
+        if not ".text" in names:
+            return True
+        text_index = names.index(".text")
+        return any([section[1] in [SHT_RELA, SHT_REL] and section[7] == text_index and section[5] > 0 for section in sections])
+
+    def get_macro(self, name, default=None):
+        if name in self.symbols.keys() and self.symbols[name][0] == SHN_ABS:
+            return self.symbols[name][1]
+        return default
+
+    @staticmethod
+    def is_kernel_object(path):
+        if not os.path.isfile(path):
+            return False
+        with open(path, 'rb') as object_file:
+            ident = object_file.read(ELF_HEADER.size)
+        if len(ident) != ELF_HEADER.size or ident[:4] != b"\x7fELF" or ELF_HEADER.unpack(ident)[1] != ET_REL:
+            return False
+
+        # Objects that need relocating, such as kernels calling into other objects, are left to the fallback
+        with open(path, 'rb') as object_file:
+            elf = object_file.read()
+        return not KernelObject.has_text_relocations(*KernelObject.get_sections(elf))
+
+
+class JITExecutionManager(ExecutionManager):
+    def __init__(self, fallback, entry_function="experiment", core=0, numa=None):
+        super().__init__("jit")
+        self.fallback = fallback
+        self.entry_function = entry_function
+        self.core = core
+        self.numa = numa
+
+        self.libc = None
+
+        # Data buffer shared by all kernels, allocated and initialized once
+        self.data = None
+        self.data_size = 0
+        self.data_pages = None
+
+        # Buffer swept and code flushing the data between repetitions, created once needed
+        self.sweep = None
+        self.flush = None
+
+    def __getstate__(self):
+        # Generator pools pickle the experiment, ctypes handles and the data buffer stay in this process
+        state = self.__dict__.copy()
+        state["libc"] = None
+        state["data"] = None
+        state["data_size"] = 0
+        state["sweep"] = None
+        state["flush"] = None
+        return state
+
+    def get_libc(self):
+        if self.libc is None:
+            self.libc = ctypes.CDLL(None, use_errno=True)
+            self.libc.mmap.restype = ctypes.c_void_p
+            self.libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+            self.libc.mprotect.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int]
+            self.libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+            self.libc.madvise.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int]
+        return self.libc
+
+    def map(self, size, flags=0):
+        address = self.get_libc().mmap(None, size, mmap.PROT_READ | mmap.PROT_WRITE, mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS | flags, -1, 0)
+        if address is None or address == ctypes.c_void_p(-1).value:
+            return None
+        return address
+
+    def place(self, address, size):
+        # Same policies as the benchmark harness, relative to the node of the core kernels are pinned to
+        if self.numa is None:
+            return
+
+        with open("/sys/devices/system/node/online", 'r') as online:
+            nodes = int(re.split(r'[-,]', online.read().strip())[-1]) + 1
+        node = int(glob.glob(f"/sys/devices/system/cpu/cpu{self.core}/node[0-9]*")[0].split("node")[-1])
+
+        mode = MPOL_BIND
+        if self.numa == "local":
+            mask = 1 << node
+        elif self.numa == "remote":
+            if nodes < 2:
+                Logger.fail("No remote NUMA node to place the data on.")
+            mask = 1 << ((node + 1) % nodes)
+        elif self.numa == "interleave":
+            mode = MPOL_INTERLEAVE
+            mask = (1 << nodes) - 1
+        else:
+            mask = 1 << int(self.numa[len("node"):])
+
+        nodemask = ctypes.c_ulong(mask)
+        libc = self.get_libc()
+        if libc.syscall(SYS_MBIND, ctypes.c_void_p(address), ctypes.c_size_t(size), mode, ctypes.byref(nodemask), ctypes.sizeof(nodemask) * 8, MPOL_MF_MOVE) != 0:
+            Logger.fail(f"mbind failed: {os.strerror(ctypes.get_errno())}")
+
+    def allocate(self, size, pages):
+        # Same pages as the benchmark harness, falling back to smaller pages when huge pages are not reserved
+        while pages >= PAGES_HUGE_2MB:
+            address = self.map(size, MAP_HUGETLB | (MAP_HUGE_1GB if pages == PAGES_HUGE_1GB else MAP_HUGE_2MB))
+            if not address is None:
+                return address
+            Logger.warn(f"Cannot map {'1GB' if pages == PAGES_HUGE_1GB else '2MB'} hugetlb pages for the JIT data buffer, falling back to smaller pages.")
+            pages -= 1
+
+        # Aligned such that transparent huge pages can back the data
+        alignment = 1 << 21
+        base = self.map(size + alignment)
+        if base is None:
+            return None
+        address = (base + alignment - 1) & ~(alignment - 1)
+        if address > base:
+            self.get_libc().munmap(base, address - base)
+        self.get_libc().munmap(address + size, base + alignment - address)
+        self.get_libc().madvise(address, size, MADV_HUGEPAGE if pages == PAGES_TRANSPARENT else MADV_NOHUGEPAGE)
+        return address
+
+    def get_data(self, N, pages):
+        data_size = N * ctypes.sizeof(ctypes.c_float)
+        allocation_size = 1 << 30 if pages == PAGES_HUGE_1GB else 1 << 21
+        aligned_size = ((data_size + allocation_size - 1) // allocation_size) * allocation_size
+
+        if self.data is None or aligned_size > self.data_size or pages != self.data_pages:
+            if not self.data is None:
+                self.get_libc().munmap(self.data, self.data_size)
+                self.data = None
+
+            self.data = self.allocate(aligned_size, pages)
+            if self.data is None:
+                Logger.fail(f"mmap of {aligned_size} bytes failed: {os.strerror(ctypes.get_errno())}")
+
+            self.data_size = aligned_size
+            self.data_pages = pages
+            self.place(self.data, aligned_size)
+
+            # Initialize
+            self.get_view(aligned_size // ctypes.sizeof(ctypes.c_float))[:] = np.arange(aligned_size // ctypes.sizeof(ctypes.c_float), dtype=np.float32)
+
+        return self.data
+
+    def get_view(self, N):
+        return np.ctypeslib.as_array((ctypes.c_float * N).from_address(self.data))
+
+    def get_llc_size(self):
+        # Size of the highest level of cache of the core kernels are pinned to
+        levels = {}
+        for index in glob.glob(f"/sys/devices/system/cpu/cpu{self.core}/cache/index[0-9]*"):
+            try:
+                with open(os.path.join(index, "level"), 'r') as level, open(os.path.join(index, "size"), 'r') as size:
+                    levels[int(level.read())] = size.read().strip()
+            except OSError:
+                continue
+        if not levels:
+            return DEFAULT_LLC_SIZE
+
+        size = levels[max(levels.keys())]
+        units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+        return int(size[:-1]) * units[size[-1]] if size[-1] in units.keys() else int(size)
+
+    def evict_caches(self, cache, D, data_size, repetition, sweep_size):
+        # Same modes as the benchmark harness, outside of the timed region
+        if cache == CACHE_WARM or (cache == CACHE_MIXED and repetition % 2):
+            return
+
+        if cache == CACHE_SWEEP:
+            if self.sweep is None or len(self.sweep) != sweep_size:
+                self.sweep = np.ones(sweep_size, dtype=np.uint8)
+            self.sweep[::CACHE_LINE].sum()
+        else:
+            if self.flush is None:
+                self.flush = self.load_code(FLUSH_CODE, 0, [ctypes.c_void_p, ctypes.c_size_t])
+            self.flush[2](D, data_size)
+
+    @staticmethod
+    def median_precision(ordered):
+        # Relative half-width of the 95% confidence interval of the median, from the order statistics of the sorted samples
+        n = len(ordered)
+        spread = 1.96 * math.sqrt(n)
+        lower = max(math.floor((n - spread) / 2), 1)
+        upper = min(math.ceil(1 + (n + spread) / 2), n)
+        median = ordered[n // 2] if n % 2 else (ordered[n // 2 - 1] + ordered[n // 2]) / 2
+        return (ordered[upper - 1] - ordered[lower - 1]) / (2 * median) if median > 0 else math.inf
+
+    def run_adaptive(self, kernel_object, call, evict, repetitions):
+        # Same as the harness, warm up until steady, then repeat until the median is within the tolerance or the budget is spent
+        tolerance = kernel_object.get_macro("TOLERANCE_PPM", 10000) / 1e6
+        budget = kernel_object.get_macro("TIME_BUDGET_MS", 10000) * 1000000
+        begin = time.perf_counter_ns()
+
+        window = []
+        for _ in range(kernel_object.get_macro("MAX_WARMUP", 100)):
+            start = time.perf_counter_ns()
+            call()
+            window = (window + [time.perf_counter_ns() - start])[-STEADY_WINDOW:]
+            if len(window) == STEADY_WINDOW and max(window) - min(window) <= tolerance * min(window):
+                break
+            if time.perf_counter_ns() - begin > budget // 2:
+                break
+
+        samples = []
+        ordered = []
+        precision = math.inf
+        while len(samples) < kernel_object.get_macro("MAX_REPETITIONS", 10000):
+            evict(len(samples))
+            start = time.perf_counter_ns()
+            call()
+            samples.append(time.perf_counter_ns() - start)
+
+            bisect.insort(ordered, samples[-1])
+            precision = self.median_precision(ordered)
+            if len(samples) >= repetitions and (precision <= tolerance or time.perf_counter_ns() - begin > budget):
+                break
+        return samples, precision
+
+    def load_code(self, text, entry, arguments):
+        code_size = ((len(text) + mmap.PAGESIZE - 1) // mmap.PAGESIZE) * mmap.PAGESIZE
+        code = self.map(code_size)
+        if code is None:
+            Logger.fail(f"mmap of kernel code failed: {os.strerror(ctypes.get_errno())}")
+
+        ctypes.memmove(code, text, len(text))
+        if self.get_libc().mprotect(code, code_size, mmap.PROT_READ | mmap.PROT_EXEC) != 0:
+            Logger.fail(f"mprotect of kernel code failed: {os.strerror(ctypes.get_errno())}")
+
+        return code, code_size, ctypes.CFUNCTYPE(None, *arguments)(code + entry)
+
+    def load(self, kernel_object, parametric=False):
+        arguments = [ctypes.c_void_p, ctypes.c_size_t] if parametric else [ctypes.c_void_p]
+        return self.load_code(kernel_object.text, kernel_object.entry, arguments)
+
+    def check_data_initialize(self, N, input_filename):
+        num_elements = os.path.getsize(input_filename) // np.dtype(np.float32).itemsize
+        if num_elements != N:
+            print(f"Wrong number of values in input testfile {input_filename}: expected {N}, got {num_elements}.")
+            return False
+        if N > 0:
+            self.get_view(N)[:] = np.memmap(input_filename, dtype=np.float32, mode='r')
+        return True
+
+    def check_data_compare(self, N, output_filename, out_file):
+        num_elements = os.path.getsize(output_filename) // np.dtype(np.float32).itemsize
+        if num_elements != N:
+            out_file.write(f"Wrong number of values in output testfile {output_filename}: expected {N}, got {num_elements}.\n")
+            return False
+        if N == 0:
+            return True
+
+        expected_values = np.memmap(output_filename, dtype=np.float32, mode='r')
+        actual_values = self.get_view(N)
+
+        # Compared in blocks, such that large outputs are not copied as a whole
+        mismatches = 0
+        reported = []
+        max_absolute = 0.0
+        max_relative = 0.0
+        for begin in range(0, N, COMPARE_BLOCK):
+            expected = expected_values[begin:begin + COMPARE_BLOCK]
+            actual = actual_values[begin:begin + COMPARE_BLOCK]
+
+            # Avoid signed zeroes
+            expected = np.where(np.abs(expected) < 0.00001, np.float32(0), expected)
+            actual = np.where(np.abs(actual) < 0.00001, np.float32(0), actual)
+
+            # Large and small numbers must fall in specified margins
+            absolute = np.abs(expected)
+            difference = np.abs(actual - expected)
+            block_mismatches = np.flatnonzero((difference > 0.01 * absolute) & (difference > 1))
+
+            mismatches += len(block_mismatches)
+            reported += [begin + i for i in block_mismatches[:MISMATCH_REPORT - len(reported)]]
+            max_absolute = max(max_absolute, float(np.nanmax(difference)))
+            max_relative = max(max_relative, float(np.nanmax(np.divide(difference, absolute, out=np.zeros_like(difference), where=absolute > 0))))
+
+        # Only the first mismatches are reported, along with the largest errors over all values
+        if mismatches > 0:
+            out_file.write(f"{mismatches} of {N} values mismatch, maximum absolute error {max_absolute:f}, maximum relative error {max_relative:f}.\n")
+            for i in reported:
+                out_file.write(f"{i} Expected {expected_values[i]:f} is not equal to actual {actual_values[i]:f}.\n")
+
+        return mismatches == 0
+
+    def run_kernel(self, command, embedded_command, streams, swap_stdout):
+        arguments = command.split(' ')
+        kernel_object = KernelObject(arguments[0], self.entry_function)
+
+        warmup = kernel_object.get_macro("WARMUP", 0)
+        repetitions = kernel_object.get_macro("REPETITIONS", 1)
+        testing = not kernel_object.get_macro("TESTING") is None
+        timed = not kernel_object.get_macro("TIME") is None
+        sampled = not kernel_object.get_macro("SAMPLES") is None
+        parametric = not kernel_object.get_macro("PARAMETRIC") is None
+        cache = CACHE_WARM if testing else kernel_object.get_macro("CACHE", CACHE_WARM)
+        adaptive = not kernel_object.get_macro("ADAPTIVE") is None and sampled and not timed and not testing
+        sweep_size = kernel_object.get_macro("SWEEP_SIZE", 0) or 2 * self.get_llc_size()
+
+        # The number of values to allocate and the problem size are the last arguments of kernels taking their size as an argument
+        N = int(arguments[-2]) if parametric else kernel_object.N
+
+        event = re.search(r"-e ([^ ]+)", embedded_command)
+        event = event.group(1) if not event is None else "duration_time:u"
+        if swap_stdout and event.split(':')[0] != "duration_time":
+            Logger.warn(f"Event {event} cannot be measured in-process, skipping {arguments[0]}.")
+            return None
+
+        pages = kernel_object.get_macro("PAGES", PAGES_REGULAR if kernel_object.get_macro("MMAP_FLAG_HUGE") is None else PAGES_HUGE_1GB)
+        D = self.get_data(N, pages)
+        code, code_size, experiment = self.load(kernel_object, parametric=parametric)
+        kernel_arguments = (D, int(arguments[-1])) if parametric else (D,)
+
+        affinity = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, {self.core})
+
+        retval = 0
+        try:
+            # Every entry writes to its own pair of streams, like the output and error of a binary
+            for out_file, err_file in streams:
+                if testing:
+                    out_file.write("Initializing data...\n")
+                    if len(arguments) < 3 or not self.check_data_initialize(N, arguments[1]):
+                        out_file.write("Expected input file and output file for check.\n")
+                        retval = -2
+                        continue
+                    out_file.write("Done initializing data!\n")
+                else:
+                    for _ in range(warmup):
+                        experiment(*kernel_arguments)
+
+                if adaptive:
+                    samples, precision = self.run_adaptive(kernel_object,
+                                                           lambda: experiment(*kernel_arguments),
+                                                           lambda i: self.evict_caches(cache, D, N * ctypes.sizeof(ctypes.c_float), i, sweep_size),
+                                                           repetitions)
+                    elapsed = sum(samples)
+                elif sampled or cache != CACHE_WARM:
+                    samples = []
+                    for i in range(repetitions):
+                        self.evict_caches(cache, D, N * ctypes.sizeof(ctypes.c_float), i, sweep_size)
+                        start = time.perf_counter_ns()
+                        experiment(*kernel_arguments)
+                        samples.append(time.perf_counter_ns() - start)
+                    elapsed = sum(samples)
+                else:
+                    start = time.perf_counter_ns()
+                    for _ in range(repetitions):
+                        experiment(*kernel_arguments)
+                    elapsed = time.perf_counter_ns() - start
+
+                if testing:
+                    out_file.write("Comparing result...\n")
+                    if self.check_data_compare(N, arguments[2], out_file):
+                        out_file.write("PASS\n")
+                    else:
+                        out_file.write("FAIL\n")
+                        retval = -3
+                elif timed:
+                    out_file.write(f"{((N * ctypes.sizeof(ctypes.c_float) * repetitions) / (elapsed / 1e9)) / 1073741824:f}\n")
+
+                if sampled and not testing:
+                    # Same layout as the harness, one row per repetition
+                    metric = f"{precision:f},median_ci" if adaptive else ","
+                    out_file.writelines([f"{sample},ns,kernel_time,{sample},100.00,{metric}\n" for sample in samples])
+
+                if swap_stdout:
+                    # Same layout as perf stat -x ,
+                    err_file.write(f"{elapsed},ns,{event},{elapsed},100.00,,\n")
+        finally:
+            os.sched_setaffinity(0, affinity)
+            self.get_libc().munmap(code, code_size)
+
+        return retval
+
+    def pop_test_results(self):
+        return super().pop_test_results() + self.fallback.pop_test_results()
+
+    def run_stored(self, location, command, embedded_command, n_entries, swap_stdout, suffix):
+        store, experiment_name, kernel_name = location
+        executable_path = command.split(' ')[0]
+        result_name = self.get_result_name(executable_path, suffix=suffix)
+        if store.has_run(experiment_name, kernel_name, result_name):
+            Logger.ok(f"Skipping {command}: result already exists!")
+            return
+
+        # Results are written to a buffer per entry in place of the stream the harness or perf writes them to, the other stream is logged
+        _, errfile_path = self.get_result_paths(executable_path, suffix=suffix)
+        outputs = [io.StringIO() for _ in range(n_entries)]
+        store.set_job(experiment_name, kernel_name, result_name, "running", command=embedded_command)
+        with open(errfile_path, 'a+') as err_file:
+            err_file.write(f"============ {datetime.now()} ============\n")
+            print(f"{executable_path} (in-process)")
+            streams = [(err_file, output) if swap_stdout else (output, err_file) for output in outputs]
+            if self.run_kernel(command, embedded_command, streams, swap_stdout) is None:
+                err_file.writelines([output.getvalue() for output in outputs])
+                store.set_job(experiment_name, kernel_name, result_name, "failed")
+                return
+
+        store.add_run(experiment_name, kernel_name, result_name, suffix or None, embedded_command, [output.getvalue() for output in outputs])
+
+    def run(self, commands, n_entries, test_functions=[], swap_stdout=False, suffix='', env=None):
+        commands = list(commands)
+        if test_functions != []:
+            if len(test_functions) != len(commands):
+                Logger.fail("Cannot test commands, list of test functions must be of same size as list of commands.")
+        else:
+            test_functions = [None] * len(commands)
+        self.plan_jobs(commands, test_functions, suffix=suffix)
+
+        fallback_commands = []
+        fallback_test_functions = []
+
+        for command, test_function in zip(commands, test_functions):
+            if type(command) == tuple:
+                embedded_command = command[1]
+                command = command[0]
+            else:
+                embedded_command = command
+
+            executable_path = command.split(' ')[0]
+            if not KernelObject.is_kernel_object(executable_path):
+                fallback_commands.append((command, embedded_command))
+                fallback_test_functions.append(test_function)
+                continue
+
+            location = self.get_result_store(executable_path, test_function=test_function)
+            if not location is None:
+                self.run_stored(location, command, embedded_command, n_entries, swap_stdout, suffix)
+                continue
+
+            resfile_path, errfile_path = self.get_result_paths(executable_path, suffix=suffix)
+            partial_path = self.get_partial_path(resfile_path)
+            if os.path.exists(resfile_path):
+                Logger.ok(f"Skipping {command}: result already exists!")
+                if not test_function is None:
+                    self.record_test(executable_path, resfile_path)
+                continue
+
+            if not test_function is None:
+                test_data_dir = test_function()
+                if test_data_dir is None:
+                    Logger.fail("Need to return test data directory in test function.")
+
+            try:
+                with open(errfile_path, 'a+') as log_file:
+                    with open(partial_path, 'w+') as partial_file:
+                        log_file.write(f"============ {datetime.now()} ============\n")
+                        print(f"{executable_path} (in-process)")
+                        streams = [(log_file, partial_file) if swap_stdout else (partial_file, log_file)] * n_entries
+                        retval = self.run_kernel(command, embedded_command, streams, swap_stdout)
+
+                if retval is None:
+                    os.unlink(partial_path)
+                    continue
+                os.replace(partial_path, resfile_path)
+                if not test_function is None:
+                    self.record_test(executable_path, resfile_path, retval)
+                    if retval != 0:
+                        Logger.warn(f"Test for {command} failed!")
+                        print(retval)
+                    else:
+                        Logger.ok(f"Test for {command} passed!")
+            finally:
+                if not test_function is None:
+                    files = os.listdir(test_data_dir)
+                    for file in files:
+                        os.unlink(os.path.join(test_data_dir, file))
+
+        if fallback_commands:
+            if all(test_function is None for test_function in fallback_test_functions):
+                fallback_test_functions = []
+            self.fallback.run(fallback_commands, n_entries, test_functions=fallback_test_functions, swap_stdout=swap_stdout, suffix=suffix, env=env)
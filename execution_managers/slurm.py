@@ -60,23 +60,16 @@ class SLURMExecutionManager(ExecutionManager):
 
             # Get paths to output files
             executable_path = command.split(' ')[0]
-            executable_name = os.path.basename(executable_path)
-            resdir = os.path.join(os.path.dirname(os.path.dirname(executable_path)), 'res')
-            suffix = f'-{suffix}' if suffix else ''
-            result_name = '_'.join([f"{executable_name.split('_')[0]}{suffix}"] + executable_name.split('_')[1:])
-            resfile_path = os.path.join(resdir, f"{result_name}.csv")
-            errfile_path = os.path.join(resdir, f"{result_name}.err")
+            resfile_path, errfile_path = self.get_result_paths(executable_path, suffix=suffix)
+            partial_path = self.get_partial_path(resfile_path)
+            redirects = f">> {errfile_path} 2>> {partial_path}" if swap_stdout else f">> {partial_path} 2>> {errfile_path}"
 
             embedded_command = re.sub(' +', ' ', embedded_command).strip()
             print(embedded_command)
 
-            if swap_stdout:
-                temp = resfile_path
-                resfile_path = errfile_path
-                errfile_path = temp
-
+            # Jobs killed or failing before all entries are done leave their partial file, which the next run starts over
             if not os.path.exists(resfile_path):
-                run_commands.append((f"for i in \"$(seq 1 {n_entries})\"; do {embedded_command} >> {resfile_path} 2>> {errfile_path}; done", test_function))
+                run_commands.append((f"rm -f {partial_path}; (for i in $(seq 1 {n_entries}); do {embedded_command} {redirects} || exit 1; done) && mv {partial_path} {resfile_path}", test_function))
             else:
                 Logger.ok(f"Skipping {command}: result already exists!")
 
@@ -112,7 +105,7 @@ class SLURMExecutionManager(ExecutionManager):
             for test_data_dir in all_test_data_dirs:
                 test_res_dir = os.path.abspath(os.path.join(test_data_dir, "..", "res"))
                 for file in os.listdir(test_res_dir):
-                    if file.split('.')[1] == 'csv':
+                    if file.endswith('.csv'):
                         test_res_path = os.path.join(test_res_dir, file)
                         with open(test_res_path, 'r') as test_res_file:
                             test_res = test_res_file.read()
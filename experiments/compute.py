@@ -19,7 +19,8 @@ class ComputeExperiment(Experiment):
             side = 256
             striding_configurations = [(3, 5)]
 
-            unalignment_factor = 16/17
+            # Sizes that are not a multiple of the strides and vectors exercise the tails
+            unalignment_factor = 127/128
             self.bicg_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "X": side}) for i, j in striding_configurations]
             self.convolution3x3_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "X": side + 2}) for i, j in striding_configurations]
             self.doitgen_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "P": side, "R": side, "Q": 1}) for i, j in striding_configurations]
@@ -28,7 +29,8 @@ class ComputeExperiment(Experiment):
             self.gemverouter_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "P": side}) for i, j in striding_configurations]
             self.gemversum_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "P": side}) for i, j in striding_configurations]
             self.jacobi2d_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "X": side + 2, "S": 1}) for i, j in striding_configurations]
-            self.mxv_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "P": side}) for i, j in striding_configurations]
+            # A second size shares the kernel when the sizes are passed at runtime
+            self.mxv_configurations = [({}, {"stride_unrolls": i, "portion_unrolls": j, "unalignment_factor": unalignment_factor, "P": P}) for i, j in striding_configurations for P in [side, side - 19]]
             
 
         else:
@@ -62,26 +64,28 @@ class ComputeExperiment(Experiment):
     def run(self):
         # Figure 6
         self.configure()
-        compiler = self.compilers["minimal"].copy()
-        compiler.infiles.append(os.path.join(self.constants.realpath, 'src', 'multistriding', 'main.c'))
+        # The harness times the kernel calls themselves, leaving out allocation, initialization and teardown
+        compiler = self.get_kernel_compiler(in_process=not self.constants.dispatch).copy(dmacro={"SAMPLES": ""})
 
+        graph = self.create_build_graph()
+        generated = []
         for generator_class, configurations in self.generator_configurations:
             for configuration in configurations:
                 configuration[0]["N"] = generator_class.get_size_to_allocate(configuration[1])
             
             generator = generator_class(self)
-            commands, _, _ = generator.generate(configurations, compiler)
+            generated.append(generator.add_to_graph(graph, configurations, compiler, dispatch=self.constants.dispatch))
+        graph.run()
+
+        for name in generated:
+            commands, _, _ = graph.get_result(name, ([], [], []))
+            if self.constants.dispatch:
+                self.run_dispatch(commands)
+                continue
             
-            perf_commands = []
-            event = "duration_time"
-            args = ""
-            for command in commands:
-                sudo = ""
-                if self.constants.machine_config.use_sudo:
-                    sudo = "sudo"
-                perf_commands.append(f"{sudo} {args} taskset -c 0 perf stat -x , -e {event}:u {command}")
+            pinned_commands = [self.constants.machine_config.get_pinned_command(command) for command in commands]
 
-            self.constants.machine_config.execution_manager.run(zip(commands, perf_commands), self.constants.entries, swap_stdout=True)
+            self.constants.machine_config.execution_manager.run(zip(commands, pinned_commands), self.constants.entries)
 
 
     def plot(self):
@@ -92,11 +96,13 @@ class ComputeExperiment(Experiment):
             self.configure()
             configurations = self.get_result_configurations()
             for configuration in configurations:
-                df = pd.read_csv(configuration["path"], names=["value", "a", "event", "b", "c", "d", "e", "f"])
+                df = pd.DataFrame(self.get_samples(configuration))
                 configuration["throughput"] = ((configuration["trueN"] * self.constants.dtype_size_bytes) / 1024**3) / (df["value"].median() / 1000**3)
+                if not self.get_precision(df) is None:
+                    configuration["precision"] = self.get_precision(df)
 
             df = pd.DataFrame(configurations)
-            grouped = df.groupby('kernel_name')
+            grouped = df.groupby('code')
             for kernel, values in grouped:
                 df = values.sort_values(by="stride_unrolls")
                 ax = values.sort_values(by="stride_unrolls").plot.scatter(x="stride_unrolls", y="throughput", title=kernel, c=values["total_unrolls"], cmap='viridis')
@@ -108,8 +114,7 @@ class ComputeExperiment(Experiment):
 
     def test(self):
         self.configure(testing=True)
-        compiler = self.compilers["minimal"].copy()
-        compiler.infiles.append(os.path.join(self.constants.realpath, 'src', 'multistriding', 'main.c'))
+        compiler = self.get_kernel_compiler()
         compiler.dmacro.update({"TESTING": "", "WARMUP": 0, "REPETITIONS": 1})
 
         for generator_class, configurations in self.generator_configurations:
@@ -220,10 +220,12 @@ class ComputeOptimizedExperiment(Experiment):
 
     def run(self):
         # Figure 7
+        graph = self.create_build_graph()
+        builds = []
         for mode in ["nounroll", "singlestrided", "multistrided"]:
             self.configure(mode)
-            compiler = self.compilers["minimal"].copy()
-            compiler.infiles.append(os.path.join(self.constants.realpath, 'src', 'multistriding', 'main.c'))
+            # The harness times the kernel calls themselves, leaving out allocation, initialization and teardown
+            compiler = self.get_kernel_compiler(in_process=not self.constants.dispatch).copy(dmacro={"SAMPLES": ""})
 
             for kernel_name, generator_context in self.generator_configurations.items():
                 generator_class, configurations = generator_context
@@ -232,20 +234,27 @@ class ComputeOptimizedExperiment(Experiment):
                     configuration[0]["N"] = generator_class.get_size_to_allocate(configuration[1])
                 
                 generator = generator_class(self)
-                commands, _, true_configurations = generator.generate(configurations, compiler)
-                control_commands_arguments = self.control(kernel_name, true_configurations)
-
-                perf_commands = []
-                event = "duration_time"
-                all_commands = list(zip(commands, [''] * len(commands))) + control_commands_arguments
-                binaries = []
-                for command, args in all_commands:
-                    sudo = ""
-                    if self.constants.machine_config.use_sudo:
-                        sudo = "sudo"
-                    binaries.append(command)
-                    perf_commands.append(f"{sudo} {args} taskset -c 0 perf stat -x , -e {event}:u {command}")
-                self.constants.machine_config.execution_manager.run(zip(binaries, perf_commands), self.constants.entries, swap_stdout=True)
+                generated = generator.add_to_graph(graph, configurations, compiler, dispatch=self.constants.dispatch)
+
+                # Controls are built for the true sizes of the generated configurations
+                control = graph.add(f"{generated}:control", functools.partial(self.add_control_from_generated, graph, kernel_name), dependencies=[generated], local=True)
+                builds.append((generated, control))
+        graph.run()
+
+        for generated, control in builds:
+            commands, _, _ = graph.get_result(generated, ([], [], []))
+            if self.constants.dispatch:
+                self.run_dispatch(commands)
+                commands = []
+            control_commands_arguments = graph.get_result(graph.get_result(control), [])
+
+            pinned_commands = []
+            all_commands = list(zip(commands, [''] * len(commands))) + control_commands_arguments
+            binaries = []
+            for command, args in all_commands:
+                binaries.append(command)
+                pinned_commands.append(self.constants.machine_config.get_pinned_command(command, args))
+            self.constants.machine_config.execution_manager.run(zip(binaries, pinned_commands), self.constants.entries)
 
     def plot(self):
         if can_plot:
@@ -254,9 +263,11 @@ class ComputeOptimizedExperiment(Experiment):
 
             configurations = self.get_result_configurations()
             for configuration in configurations:
-                df = pd.read_csv(configuration["path"], names=["value", "a", "event", "b", "c", "d", "e", "f"])
+                df = pd.DataFrame(self.get_samples(configuration))
                 try:
                     configuration["throughput"] = ((configuration["trueN"] * self.constants.dtype_size_bytes) / 1024**3) / (df["value"].median() / 1000**3)
+                    if not self.get_precision(df) is None:
+                        configuration["precision"] = self.get_precision(df)
                 except Exception as e:
                     print(e)
                     continue
@@ -269,7 +280,10 @@ class ComputeOptimizedExperiment(Experiment):
 
                 results = []
                 for code_name, code_values in code_grouped:
-                    results.append({"code": code_name, "max_throughput": code_values["throughput"].max()})
+                    result = {"code": code_name, "max_throughput": code_values["throughput"].max()}
+                    if "precision" in code_values.columns and code_values["throughput"].notna().any():
+                        result["precision"] = code_values.loc[code_values["throughput"].idxmax(), "precision"]
+                    results.append(result)
                 
                 df = pd.DataFrame(results)
 
@@ -286,8 +300,7 @@ class ComputeOptimizedExperiment(Experiment):
 
     def test(self):
         self.configure(mode="multistrided", testing=True)
-        compiler = self.compilers["minimal"].copy()
-        compiler.infiles.append(os.path.join(self.constants.realpath, 'src', 'multistriding', 'main.c'))
+        compiler = self.get_kernel_compiler()
         compiler.dmacro.update({"TESTING": "", "WARMUP": 0, "REPETITIONS": 1})
 
         for kernel_name, generator_context in self.generator_configurations.items():
@@ -342,8 +355,22 @@ class ComputeOptimizedExperiment(Experiment):
 
 
     def control(self, kernel_name, true_configurations, testing=False):
-        # Run state-of-the-art implementations
+        graph = self.create_build_graph()
+        control = self.add_control(graph, kernel_name, true_configurations, testing=testing)
+        graph.run()
+        return graph.get_result(control, [])
+
+    def add_control_from_generated(self, graph, kernel_name, generated):
+        return self.add_control(graph, kernel_name, generated[2])
+
+    @staticmethod
+    def collect_control(commands, *bin_paths):
+        return [command for command, bin_path in zip(commands, bin_paths) if not bin_path is None]
+
+    def add_control(self, graph, kernel_name, true_configurations, testing=False):
+        # Build state-of-the-art implementations
         commands = []
+        builds = []
         true_configurations_immutable = [(trueN, N, tuple(sorted(d.items()))) for trueN, N, d in true_configurations]
         true_configurations_unique = list(set(true_configurations_immutable))
         true_configurations = [(trueN, N, dict(d)) for trueN, N, d in true_configurations_unique]
@@ -363,6 +390,8 @@ class ComputeOptimizedExperiment(Experiment):
             compiler = self.compilers[control_name].copy()
             if testing:
                 compiler.dmacro.update({"TESTING": "", "WARMUP": 0, "REPETITIONS": 1})
+            else:
+                compiler.dmacro.update({"SAMPLES": ""})
 
             if control_name in self.constants.machine_config.runtime_arguments.keys():
                 arguments = self.constants.machine_config.runtime_arguments[control_name]
@@ -385,17 +414,18 @@ class ComputeOptimizedExperiment(Experiment):
                     if kernel_name == "jacobi2dopt":
                         generators.append("writeback")
 
-                    includes_infiles = configured_compiler.prebuild(generators, str(side), str(trueN))
-                    for include, infiles in includes_infiles:
+                    includes_infiles = configured_compiler.add_prebuild(graph, generators, str(side), str(trueN))
+                    for include, infiles, autoschedule in includes_infiles:
                         configured_compiler = configured_compiler.copy(include=include, infiles=infiles)
                         autoscheduler = os.path.basename(include[0])
                         autoscheduler_control_bin_path = os.path.join(os.path.dirname(control_bin_path), f"{autoscheduler}{os.path.basename(control_bin_path)}")
-                        configured_compiler.compile(control_src_path, autoscheduler_control_bin_path)
+                        builds.append(graph.add(f"control:{autoscheduler_control_bin_path}", configured_compiler.build, args=(control_src_path, autoscheduler_control_bin_path), dependencies=[autoschedule]))
                         commands.append((autoscheduler_control_bin_path, arguments))
                 else:
-                    configured_compiler.compile(control_src_path, control_bin_path)
+                    builds.append(graph.add(f"control:{control_bin_path}", configured_compiler.build, args=(control_src_path, control_bin_path)))
                     commands.append((control_bin_path, arguments))
-        return commands
+
+        return graph.add(graph.scope(f"{self.experiment_name}:{kernel_name}:control"), ComputeOptimizedExperiment.collect_control, args=(commands,), dependencies=builds, local=True, partial=True)
 
 
 
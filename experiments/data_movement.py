@@ -1,5 +1,6 @@
 import shutil
 import os
+import re
 from classes import Experiment, Logger
 from generators import AlignedReadGenerator, UnalignedReadGenerator, StreamReadGenerator, AlignedWriteGenerator, UnalignedWriteGenerator, StreamWriteGroupedGenerator, StreamWriteInterleavedGenerator, AlignedReadAlignedWriteCopyGenerator, AlignedReadStreamWriteCopyGenerator, StreamReadAlignedWriteCopyGenerator, StreamReadStreamWriteCopyGenerator
 import subprocess
@@ -17,11 +18,23 @@ class DataMovementExperiment(Experiment):
     def __init__(self, constants, compilers, machine_specific_experiment_configuration):
         super().__init__("data_movement", constants, compilers, machine_specific_experiment_configuration)
 
+    def build(self, generator_classes, configurations, compiler):
+        # Build all generators at once, yielding the commands per generator
+        graph = self.create_build_graph()
+        generated = [generator_class(self).add_to_graph(graph, configurations, compiler) for generator_class in generator_classes]
+        graph.run()
+
+        for name in generated:
+            commands, _, _ = graph.get_result(name, ([], [], []))
+            yield commands
+
     def run_throughput(self, generator_classes, configurations, minimal_compiler, machine_config, entries, do_nohwpf=True):
-        for generator_class in generator_classes:
-            generator = generator_class(self)
-            compiler = minimal_compiler.copy(dmacro={"TIME": "", "MMAP_FLAG_HUGE": ""})
-            commands, _, _ = generator.generate(configurations, compiler)
+        compiler = minimal_compiler.copy(dmacro={"TIME": "", "MMAP_FLAG_HUGE": ""})
+        for commands in self.build(generator_classes, configurations, compiler):
+            # Placing data relative to a core requires pinning to it
+            if not machine_config.numa is None:
+                commands = [(command, machine_config.get_pinned_command(command)) for command in commands]
+
             if machine_config.msr:
                 machine_config.handle_msr(False)
 
@@ -32,19 +45,32 @@ class DataMovementExperiment(Experiment):
                 machine_config.execution_manager.run(commands, entries, suffix="nohwpf-throughput")
                 machine_config.handle_msr(False)
 
+    def run_scaling(self, generator_classes, configurations, minimal_compiler, machine_config, entries, do_nohwpf=True):
+        # The harness pins a thread per core, the number of threads precedes the other arguments
+        compiler = minimal_compiler.copy(dmacro={"THREADS": "", "MMAP_FLAG_HUGE": ""})
+        cores = machine_config.cores if not machine_config.cores is None else os.cpu_count()
+        for commands in self.build(generator_classes, configurations, compiler):
+            for threads in range(1, cores + 1):
+                thread_commands = []
+                for command in commands:
+                    path, *arguments = command.split(' ')
+                    thread_commands.append(' '.join([path, str(threads)] + arguments))
+
+                if machine_config.msr:
+                    machine_config.handle_msr(False)
+
+                machine_config.execution_manager.run(zip(commands, thread_commands), entries, suffix=f"hwpf-threads{threads}")
+
+                if do_nohwpf and machine_config.msr:
+                    machine_config.handle_msr(True)
+                    machine_config.execution_manager.run(zip(commands, thread_commands), entries, suffix=f"nohwpf-threads{threads}")
+                    machine_config.handle_msr(False)
+
     def run_event(self, generator_classes, configurations, events, minimal_compiler, machine_config, entries, do_nohwpf=True):
-        for generator_class in generator_classes:
-            generator = generator_class(self)
-            compiler = minimal_compiler.copy(dmacro={"MMAP_FLAG_HUGE": ""})
-            commands, _, _ = generator.generate(configurations, compiler)
+        compiler = minimal_compiler.copy(dmacro={"MMAP_FLAG_HUGE": ""})
+        for commands in self.build(generator_classes, configurations, compiler):
             for event in events:
-                perf_commands = []
-                args = ""
-                for command in commands:
-                    sudo = ""
-                    if machine_config.use_sudo:
-                        sudo = "sudo"
-                    perf_commands.append(f"{sudo} {args} taskset -c 0 perf stat -x , -e {event}:u {command}")
+                perf_commands = [machine_config.get_pinned_command(f"perf stat -x , -e {event}:u {command}") for command in commands]
 
                 event_name = event.replace('.', '').replace('_', '').replace('-', '')
 
@@ -60,7 +86,8 @@ class DataMovementExperiment(Experiment):
 
 
     def run(self):
-        compiler = self.compilers["minimal"].copy(infiles=[os.path.join(self.constants.realpath, 'src', 'multistriding', 'main.c')], dmacro={"REPETITIONS": 10, "WARMUP": 2})
+        # Hardware events are collected by perf, so these kernels are always built as binaries
+        compiler = self.get_kernel_compiler(in_process=False).copy(dmacro={"REPETITIONS": 10, "WARMUP": 2})
 
         # Figure 2
         read_write_copy_generators = [
@@ -125,22 +152,42 @@ class DataMovementExperiment(Experiment):
         unalignment_factor = 1
         configurations = [({"N": N}, {"suffix": "approx2GB", "N": N, "unalignment_factor": unalignment_factor, "stride_unrolls": sc[0], "portion_unrolls": sc[1]}) for sc in striding_configurations]
         self.run_throughput(read_write_copy_generators, configurations, compiler, self.constants.machine_config, self.constants.entries, do_nohwpf=False)
+
+        # TLB misses, when sweeping over the pages backing the data
+        if not self.constants.page_size is None:
+            generators = [AlignedReadGenerator, AlignedWriteGenerator]
+            N = 536870912
+            striding_configurations = [(1, 32), (2, 16), (4, 8), (8, 4), (16, 2), (32, 1)]
+            unalignment_factor = 1
+            events = ["dTLB-loads",
+                      "dTLB-load-misses",
+                      "dTLB-stores",
+                      "dTLB-store-misses"]
+            configurations = [({"N": N}, {"suffix": "approx2GB", "N": N, "unalignment_factor": unalignment_factor, "stride_unrolls": sc[0], "portion_unrolls": sc[1]}) for sc in striding_configurations]
+            self.run_event(generators, configurations, events, compiler, self.constants.machine_config, self.constants.entries, do_nohwpf=False)
+
+        # Scaling over cores contending for the memory bandwidth, each thread working on 128MB of its own
+        if self.constants.scaling:
+            N = 33554432
+            striding_configurations = [(1, 32), (2, 16), (4, 8), (8, 4), (16, 2), (32, 1)]
+            unalignment_factor = 1
+            configurations = [({"N": N}, {"suffix": "approx128MB", "N": N, "unalignment_factor": unalignment_factor, "stride_unrolls": sc[0], "portion_unrolls": sc[1]}) for sc in striding_configurations]
+            self.run_scaling(read_write_copy_generators, configurations, compiler, self.constants.machine_config, self.constants.entries)
     
     def plot(self):
         if can_plot:
             result_dir = self.constants.construct_result_path(self.experiment_name)
 
             configurations = self.get_result_configurations()
+            scaling_configurations = [configuration for configuration in configurations if re.search(r'-threads[0-9]+$', configuration["code"])]
+            configurations = [configuration for configuration in configurations if not re.search(r'-threads[0-9]+$', configuration["code"])]
+            self.plot_scaling(scaling_configurations, result_dir)
             
             for configuration in configurations:
-                if "throughput" in configuration["code"]:
-                    df = pd.read_csv(configuration["path"], names=["throughput"])
-                    configuration["event"] = "throughput"
-                    configuration["value"] = df["throughput"].median()
-                else:
-                    df = pd.read_csv(configuration["path"], names=["value", "a", "event", "b", "c", "d", "e", "f"])
-                    configuration["event"] = df["event"][0]
-                    configuration["value"] = df["value"].median()
+                df = pd.DataFrame(self.get_samples(configuration))
+                df = df[df["position"] == 0]
+                configuration["event"] = df["event"].iloc[0]
+                configuration["value"] = df["value"].median()
 
             df = pd.DataFrame(configurations)
             grouped = df.groupby('code')
@@ -149,13 +196,33 @@ class DataMovementExperiment(Experiment):
                 plt.savefig(os.path.join(result_dir, f"{kernel}.png"))
                 df.to_csv(os.path.join(result_dir, f"{kernel}.csv"))
 
+    def plot_scaling(self, configurations, result_dir):
+        if not configurations:
+            return
+
+        # Samples at position 0 hold the aggregate throughput, followed by the throughput of every thread
+        for configuration in configurations:
+            code, threads = re.search(r'(.*)-threads([0-9]+)$', configuration["code"]).groups()
+            df = pd.DataFrame(self.get_samples(configuration))
+            per_thread = df[df["position"] > 0].groupby(["run", "entry", "repetition"])["value"].mean()
+            configuration["code"] = f"{code}-scaling"
+            configuration["threads"] = int(threads)
+            configuration["aggregate"] = df.loc[df["position"] == 0, "value"].median()
+            configuration["per_thread"] = per_thread.median()
+
+        df = pd.DataFrame(configurations)
+        for kernel, values in df.groupby('code'):
+            values.pivot_table(index="threads", columns="stride_unrolls", values="aggregate").plot(title=kernel, ylabel="GB/s")
+            plt.savefig(os.path.join(result_dir, f"{kernel}.png"))
+            values.sort_values(by=["stride_unrolls", "threads"]).to_csv(os.path.join(result_dir, f"{kernel}.csv"))
+
     def test(self):
-        N = 1024
+        # Several sizes, which share a kernel when the sizes are passed at runtime
+        Ns = [1024, 1000]
         striding_configurations = [(1, 32), (2, 16), (4, 8), (8, 4), (16, 2), (32, 1)]
         unalignment_factor = 16/17
-        configurations = [({"N": N}, {"suffix": "approx2GB", "N": N, "unalignment_factor": unalignment_factor, "stride_unrolls": sc[0], "portion_unrolls": sc[1]}) for sc in striding_configurations]
-        compiler = self.compilers["minimal"].copy()
-        compiler.infiles.append(os.path.join(self.constants.realpath, 'src', 'multistriding', 'main.c'))
+        configurations = [({"N": N}, {"suffix": "approx2GB", "N": N, "unalignment_factor": unalignment_factor, "stride_unrolls": sc[0], "portion_unrolls": sc[1]}) for sc in striding_configurations for N in Ns]
+        compiler = self.get_kernel_compiler()
         compiler.warmup = 0
         compiler.repetitions = 1
         compiler.dmacro.update({"TESTING": ""})
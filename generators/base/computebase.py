@@ -6,6 +6,7 @@ class ComputeBaseGenerator(Generator):
     def __init__(self, experiment, kernel_name, testing=False):
         super().__init__(experiment, kernel_name)
         self.testing = testing
+        self.lean = experiment.constants.lean
 
     def get_remainder(self, configuration, trueConfiguration):
         return ((np.random.randint(100, size=(self.get_size_to_allocate_i(configuration) - self.get_size_to_allocate_i(trueConfiguration))) / 10) - 5)
@@ -40,6 +41,30 @@ class ComputeBaseGenerator(Generator):
         
         cc.add_statement("subq", f"${self.aligned(W * self.experiment.constants.dtype_size_bytes)}", base_register)
 
+    def horizontal_sum(self, cc, vector, ancilla):
+        # Sum the values of the vector variable into the lowest value of the ancilla variable, overwriting the vector
+        # Only instructions with EVEX encodings are used, such that all AVX-512 registers can be assigned
+        x_vector = f"%{cc.get_variable(vector, size_column=2)}"
+        x_ancilla = f"%{cc.get_variable(ancilla, size_column=2)}"
+
+        if self.experiment.constants.simd_vec_bits == 512:
+            y_vector = f"%{cc.get_variable(vector, size_column=1)}"
+            y_ancilla = f"%{cc.get_variable(ancilla, size_column=1)}"
+            cc.add_statement("vextractf64x4", "$0x1", f"%{cc.get_variable(vector, size_column=0)}", y_ancilla)
+            cc.add_statement("vaddps", y_vector, y_ancilla, y_ancilla)
+            cc.add_statement("vextractf32x4", "$0x1", y_ancilla, x_vector)
+            cc.add_statement("vaddps", x_vector, x_ancilla, x_ancilla)
+        elif self.experiment.constants.simd_vec_bits == 256:
+            cc.add_statement("vextractf128", "$0x1", f"%{cc.get_variable(vector, size_column=1)}", x_ancilla)
+            cc.add_statement("vaddps", x_vector, x_ancilla, x_ancilla)
+        else:
+            cc.add_statement("vmovaps", x_vector, x_ancilla)
+
+        cc.add_statement("vmovhlps", x_ancilla, x_ancilla, x_vector)
+        cc.add_statement("vaddps", x_vector, x_ancilla, x_ancilla)
+        cc.add_statement("vmovshdup", x_ancilla, x_vector)
+        cc.add_statement("vaddss", x_vector, x_ancilla, x_ancilla)
+
     def writeback(self, cc, W, I, O, stride_unrolls, portion_unrolls):
         portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
         portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
@@ -3,71 +3,158 @@ import numpy as np
 import os
 
 class DataCopyGenerator(Generator):
+    size_keys = ["N"]
+
     def __init__(self, experiment, kernel_name, testing=False):
         super().__init__(experiment, kernel_name, testing=testing)
 
+    def get_sizes(self, configuration):
+        sizes = []
+        for size_configuration in configuration["sizes"]:
+            trueI = self.get_exact_N(size_configuration["N"] // 2, unalignment_factor=size_configuration["unalignment_factor"])
+            if trueI is None:
+                Logger.warn(f"Cannot generate for {self.kernel_name}")
+                continue
+            sizes.append((size_configuration["N"], trueI * 2, trueI, size_configuration))
+        return sizes
+
     def build(self, configuration):
+        if "sizes" in configuration.keys():
+            return self.build_parametric(configuration)
+
         N = configuration["N"] 
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
         unalignment_factor = configuration["unalignment_factor"]
         
         I = N // 2
-        trueI = self.get_true_N(I, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor, page_size_bytes=None)
+        trueI = self.get_exact_N(I, unalignment_factor=unalignment_factor)
 
         if trueI is None:
             Logger.warn(f"Cannot generate for {self.kernel_name}")
             return
 
         trueN = trueI * 2
-        W = trueI // stride_unrolls
+        # Strides and the output are a whole number of vectors apart, such that aligned accesses stay aligned
+        W = trueI // stride_unrolls // self.experiment.constants.simd_vec_values * self.experiment.constants.simd_vec_values
+        output_offset = (trueI + self.experiment.constants.simd_vec_values - 1) // self.experiment.constants.simd_vec_values * self.experiment.constants.simd_vec_values
 
         with CodeContext(self, stride_unrolls, portion_unrolls, N, trueN, test_function_configuration=(self.test, configuration) if self.testing else None, suffix=configuration["suffix"]) as cc:
             cc.set_variable('rdi', 'D')
             cc.set_variable('rsp', 'stack_ptr')
             cc.add_statement(f"movq", f"%{cc.get_variable('D')}", f"%{cc.get_register(variable='I')}")
-            cc.add_statement("leaq", f"{self.aligned(trueI * self.experiment.constants.dtype_size_bytes)}(%{cc.get_variable('I')})", f"%{cc.get_register(variable='O')}")
-
-            with For (cc, f"${W // portion_unroll_values}"):
-                for i in range(stride_unrolls):
-                    for j in range(portion_unrolls):
-                        offset = self.aligned_z(i * W * self.experiment.constants.dtype_size_bytes + j * self.experiment.constants.simd_vec_bytes)
-                        cc.add_statement(*self.build_main_operation_load(f"%{cc.get_register(register_set='simd', variable='vec')}", f"{offset}(%{cc.get_variable('I')})"))
-                        cc.add_statement(*self.build_main_operation_store(f"%{cc.get_variable('vec')}", f"{offset}(%{cc.get_variable('O')})"))
+            cc.add_statement("leaq", f"{self.aligned(output_offset * self.experiment.constants.dtype_size_bytes)}(%{cc.get_variable('I')})", f"%{cc.get_register(variable='O')}")
+
+            def copies(vector, strides, stride_bytes, portions):
+                for i in range(strides):
+                    for j in range(portions):
+                        offset = self.z(i * stride_bytes + j * vector.bytes)
+                        load = self.build_main_operation_load(f"%{cc.get_register(register_set='simd', variable='vec', size_column=vector.column)}", f"{offset}(%{cc.get_variable('I')})")
+                        store = self.build_main_operation_store(f"%{cc.get_variable('vec', size_column=vector.column)}", f"{offset}(%{cc.get_variable('O')})")
+                        vector.add_statement(cc, load[0], *load[1:])
+                        vector.add_statement(cc, store[0], *store[1:])
                         cc.unset_variable('vec')
-                cc.add_statement(f"addq", f"${self.aligned(portion_unroll_bytes)}", f"%{cc.get_variable('I')}")
-                cc.add_statement(f"addq", f"${self.aligned(portion_unroll_bytes)}", f"%{cc.get_variable('O')}")
+                cc.add_statement(f"addq", f"${portions * vector.bytes}", f"%{cc.get_variable('I')}")
+                cc.add_statement(f"addq", f"${portions * vector.bytes}", f"%{cc.get_variable('O')}")
+
+            self.vector_blocks(cc, W, portion_unrolls, lambda vector, portions: copies(vector, stride_unrolls, W * self.experiment.constants.dtype_size_bytes, portions), pointer=f"%{cc.get_variable('I')}")
+
+            # The values beyond the strides are copied in order
+            if trueI > W * stride_unrolls:
+                cc.add_statement(f"addq", f"${(stride_unrolls - 1) * W * self.experiment.constants.dtype_size_bytes}", f"%{cc.get_variable('I')}")
+                cc.add_statement(f"addq", f"${(stride_unrolls - 1) * W * self.experiment.constants.dtype_size_bytes}", f"%{cc.get_variable('O')}")
+                self.vector_blocks(cc, trueI - W * stride_unrolls, portion_unrolls, lambda vector, portions: copies(vector, 1, 0, portions), pointer=f"%{cc.get_variable('I')}")
 
             cc.unset_variable('D')
             cc.unset_variable('I')
             cc.unset_variable('O')
             cc.unset_variable('stack_ptr')
 
+    def build_parametric(self, configuration):
+        stride_unrolls = configuration["stride_unrolls"]
+        portion_unrolls = configuration["portion_unrolls"]
+        vector, _ = self.get_vectors()
+
+        sizes = self.get_sizes(configuration)
+        if not sizes:
+            return
+
+        with CodeContext(self, stride_unrolls, portion_unrolls, None, None, test_function_configuration=(self.test, configuration) if self.testing else None, suffix=configuration["suffix"], sizes=sizes) as cc:
+            D = f"%{cc.set_variable('rdi', 'D')}"
+            size = f"%{cc.set_variable('rsi', 'size')}"
+            cc.set_variable('rsp', 'stack_ptr')
+
+            # Strides are a whole number of vectors apart, addressed through a pointer per stride and shared offsets of the input and output
+            vectors, _ = self.runtime_divide(cc, size, stride_unrolls * vector.values)
+            stride_bytes = f"%{cc.get_register(variable='stride_bytes')}"
+            cc.add_statement("movq", vectors, stride_bytes)
+            cc.add_statement("shlq", f"${vector.bytes.bit_length() - 1}", stride_bytes)
+
+            pointers = [D]
+            for i in range(1, stride_unrolls):
+                pointers.append(f"%{cc.get_register(variable=f'P{i}')}")
+                cc.add_statement("leaq", f"({pointers[i - 1]},{stride_bytes})", pointers[i])
+
+            # The output starts at the first whole vector after the input
+            output_bytes = f"%{cc.get_register(variable='output_bytes')}"
+            cc.add_statement("leaq", f"{vector.values - 1}({size})", output_bytes)
+            cc.add_statement("andq", f"${-vector.values}", output_bytes)
+            cc.add_statement("shlq", f"${self.experiment.constants.dtype_size_bytes.bit_length() - 1}", output_bytes)
+            I = f"%{cc.get_register(variable='I')}"
+            O = f"%{cc.get_register(variable='O')}"
+
+            def copies(vector, bases, portions):
+                for i in range(len(bases)):
+                    for j in range(portions):
+                        offset = self.z(j * vector.bytes)
+                        load = self.build_main_operation_load(f"%{cc.get_register(register_set='simd', variable='vec', size_column=vector.column)}", f"{offset}({bases[i]},{I})")
+                        store = self.build_main_operation_store(f"%{cc.get_variable('vec', size_column=vector.column)}", f"{offset}({bases[i]},{O})")
+                        vector.add_statement(cc, load[0], *load[1:])
+                        vector.add_statement(cc, store[0], *store[1:])
+                        cc.unset_variable('vec')
+                cc.add_statement(f"addq", f"${portions * vector.bytes}", I)
+                cc.add_statement(f"addq", f"${portions * vector.bytes}", O)
+
+            cc.add_statement("xorq", I, I)
+            cc.add_statement("movq", output_bytes, O)
+            self.runtime_blocks(cc, vectors, portion_unrolls, lambda portions: copies(vector, pointers, portions), pointer=I, step=vector.bytes)
+
+            # The values beyond the strides are copied in order
+            remaining = f"%{cc.get_register(variable='remaining')}"
+            cc.add_statement("imul", f"${stride_unrolls * vector.values}", vectors, remaining)
+            cc.add_statement("negq", remaining)
+            cc.add_statement("addq", size, remaining)
+            cc.add_statement("leaq", f"({pointers[-1]},{stride_bytes})", f"%{cc.get_register(variable='Dp')}")
+            cc.add_statement("xorq", I, I)
+            cc.add_statement("movq", output_bytes, O)
+            self.runtime_vector_blocks(cc, remaining, portion_unrolls, lambda vector, portions: copies(vector, [f"%{cc.get_variable('Dp')}"], portions), pointer=I)
+
+            cc.unset_variable('D')
+            cc.unset_variable('size')
+            cc.unset_variable('stack_ptr')
+            cc.unset_variable('stride_bytes')
+            for i in range(1, stride_unrolls):
+                cc.unset_variable(f"P{i}")
+            cc.unset_variable('output_bytes')
+            cc.unset_variable('I')
+            cc.unset_variable('O')
+            cc.unset_variable('remaining')
+            cc.unset_variable('Dp')
 
     def test(self, configuration, test_data_dir):
         N = configuration["N"] 
-        stride_unrolls = configuration["stride_unrolls"]
-        portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
         unalignment_factor = configuration["unalignment_factor"]
         
         I = N // 2
-        trueI = self.get_true_N(I, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor, page_size_bytes=None)
-        W = trueI // stride_unrolls
+        trueI = self.get_exact_N(I, unalignment_factor=unalignment_factor)
+        output_offset = (trueI + self.experiment.constants.simd_vec_values - 1) // self.experiment.constants.simd_vec_values * self.experiment.constants.simd_vec_values
 
         m = ((np.random.randint(100, size=(N)) / 10) - 5).astype(self.experiment.constants.nd_type)
 
         self.write_test_input(test_data_dir, m)
 
-        for x in range(0, W // portion_unroll_values):
-            for i in range(stride_unrolls):
-                for j in range(portion_unrolls):
-                    for k in range(self.experiment.constants.simd_vec_values):
-                        offset = i * W +  j * self.experiment.constants.simd_vec_values + k
-                        m[trueI + x * portion_unroll_values + offset]  = m[x * portion_unroll_values + offset]
-                    
+        m[output_offset:output_offset + trueI] = m[:trueI]
+
         self.write_test_output(test_data_dir, m)
 
         return test_data_dir
@@ -3,89 +3,183 @@ import numpy as np
 import os
 
 class DataMovementGenerator(Generator):
+    size_keys = ["N"]
+
     def __init__(self, experiment, kernel_name, testing=False, unaligned=False, grouped=True, initzero=False):
         super().__init__(experiment, kernel_name, testing=testing)
         self.unaligned = unaligned
         self.grouped = grouped
         self.initzero = initzero
 
+    def get_stride_values(self, trueN, stride_unrolls):
+        # Strides are a whole number of vectors apart, such that aligned accesses stay aligned
+        return trueN // stride_unrolls // self.experiment.constants.simd_vec_values * self.experiment.constants.simd_vec_values
+
+    def get_sizes(self, configuration):
+        sizes = []
+        for size_configuration in configuration["sizes"]:
+            trueN = self.get_exact_N(size_configuration["N"], unalignment_factor=size_configuration["unalignment_factor"])
+            if trueN is None:
+                Logger.warn(f"Cannot generate for {self.kernel_name}")
+                continue
+            sizes.append((size_configuration["N"] + (4 if self.unaligned else 0), trueN, trueN, size_configuration))
+        return sizes
+
     def build(self, configuration):
+        if "sizes" in configuration.keys():
+            return self.build_parametric(configuration)
+
         N = configuration["N"] 
         if self.unaligned:
             N += 4
             self.compiler.dmacro["N"] += 4
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
         unalignment_factor = configuration["unalignment_factor"]
 
-        trueN = self.get_true_N(N, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor, page_size_bytes=None)
+        trueN = self.get_exact_N(configuration["N"], unalignment_factor=unalignment_factor)
 
         if trueN is None:
             Logger.warn(f"Cannot generate for {self.kernel_name}")
             return
 
-        W = trueN // stride_unrolls
+        W = self.get_stride_values(trueN, stride_unrolls)
 
         with CodeContext(self, stride_unrolls, portion_unrolls, N, trueN, test_function_configuration=(self.test, configuration) if self.testing else None, suffix=configuration["suffix"]) as cc:
             cc.set_variable('rdi', 'D')
             cc.set_variable('rsp', 'stack_ptr')
 
+            registers = self.experiment.constants.get_all_registers(simd=True)
             if self.initzero:
-                registers = self.experiment.constants.get_all_registers(simd=True)
                 first = f"%{registers[0]}"
                 cc.add_statement("vxorps", first, first, first)
                 for src, dst in zip(registers[:-1], registers[1:]):
                     cc.add_statement("vmovaps", f"%{src}", f"%{dst}")
 
-            cc.add_statement(f"movq", f"%{cc.get_variable('D')}", f"%{cc.get_register(variable='Dp')}")
-            with For (cc, f"${W // portion_unroll_values}"):
+            def operations(vector, strides, stride_bytes, portions):
                 indices = []
 
                 if self.grouped:
-                    for i in range(stride_unrolls):
-                        for j in range(portion_unrolls):
+                    for i in range(strides):
+                        for j in range(portions):
                             indices.append((i, j))
                 else:
-                    for j in range(portion_unrolls):
-                        for i in range(stride_unrolls):
+                    for j in range(portions):
+                        for i in range(strides):
                             indices.append((i, j))
                 
-                for i, j in indices:
+                for k, (i, j) in enumerate(indices):
                     if self.unaligned:
-                        offset = self.z(i * W * self.experiment.constants.dtype_size_bytes + j * self.experiment.constants.simd_vec_bytes + 4)
+                        offset = self.z(i * stride_bytes + j * vector.bytes + 4)
                     else:
-                        offset = self.aligned_z(i * W * self.experiment.constants.dtype_size_bytes + j * self.experiment.constants.simd_vec_bytes)
+                        offset = self.z(i * stride_bytes + j * vector.bytes)
 
-                    cc.add_statement(*self.build_main_operation(f"%{cc.get_register(register_set='simd', variable='vec')}", f"{offset}(%{cc.get_variable('Dp')})"))
+                    # Physical registers are used round-robin, such that stores write the initialized values
+                    operation = self.build_main_operation(f"%{cc.set_variable(registers[k % len(registers)], 'vec', size_column=vector.column)}", f"{offset}(%{cc.get_variable('Dp')})")
+                    vector.add_statement(cc, operation[0], *operation[1:])
                     cc.unset_variable('vec')
-                cc.add_statement(f"addq", f"${self.aligned(portion_unroll_bytes)}", f"%{cc.get_variable('Dp')}")
+                cc.add_statement(f"addq", f"${portions * vector.bytes}", f"%{cc.get_variable('Dp')}")
+
+            cc.add_statement(f"movq", f"%{cc.get_variable('D')}", f"%{cc.get_register(variable='Dp')}")
+            self.vector_blocks(cc, W, portion_unrolls, lambda vector, portions: operations(vector, stride_unrolls, W * self.experiment.constants.dtype_size_bytes, portions), pointer=f"%{cc.get_variable('Dp')}")
+
+            # The values beyond the strides are processed in order
+            if trueN > W * stride_unrolls:
+                cc.add_statement(f"addq", f"${(stride_unrolls - 1) * W * self.experiment.constants.dtype_size_bytes}", f"%{cc.get_variable('Dp')}")
+                self.vector_blocks(cc, trueN - W * stride_unrolls, portion_unrolls, lambda vector, portions: operations(vector, 1, 0, portions), pointer=f"%{cc.get_variable('Dp')}")
 
             cc.unset_variable("D")
             cc.unset_variable("Dp")
             cc.unset_variable("stack_ptr")
 
-    def test(self, configuration, test_data_dir):
-        N = configuration["N"] 
+    def build_parametric(self, configuration):
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
-        unalignment_factor = configuration["unalignment_factor"]
+        vector, _ = self.get_vectors()
+
+        sizes = self.get_sizes(configuration)
+        if not sizes:
+            return
+
+        with CodeContext(self, stride_unrolls, portion_unrolls, None, None, test_function_configuration=(self.test, configuration) if self.testing else None, suffix=configuration["suffix"], sizes=sizes) as cc:
+            D = f"%{cc.set_variable('rdi', 'D')}"
+            size = f"%{cc.set_variable('rsi', 'size')}"
+            cc.set_variable('rsp', 'stack_ptr')
+
+            registers = self.experiment.constants.get_all_registers(simd=True)
+            if self.initzero:
+                first = f"%{registers[0]}"
+                cc.add_statement("vxorps", first, first, first)
+                for src, dst in zip(registers[:-1], registers[1:]):
+                    cc.add_statement("vmovaps", f"%{src}", f"%{dst}")
 
-        trueN = self.get_true_N(N, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor, page_size_bytes=None)
+            # Strides are a whole number of vectors apart, addressed through a pointer per stride and a shared offset
+            vectors, _ = self.runtime_divide(cc, size, stride_unrolls * vector.values)
+            stride_bytes = f"%{cc.get_register(variable='stride_bytes')}"
+            cc.add_statement("movq", vectors, stride_bytes)
+            cc.add_statement("shlq", f"${vector.bytes.bit_length() - 1}", stride_bytes)
+
+            pointers = [D]
+            for i in range(1, stride_unrolls):
+                pointers.append(f"%{cc.get_register(variable=f'P{i}')}")
+                cc.add_statement("leaq", f"({pointers[i - 1]},{stride_bytes})", pointers[i])
+            offset = f"%{cc.get_register(variable='offset')}"
+
+            def operations(vector, bases, portions):
+                indices = []
+
+                if self.grouped:
+                    for i in range(len(bases)):
+                        for j in range(portions):
+                            indices.append((i, j))
+                else:
+                    for j in range(portions):
+                        for i in range(len(bases)):
+                            indices.append((i, j))
+                
+                for k, (i, j) in enumerate(indices):
+                    displacement = self.z(j * vector.bytes + (4 if self.unaligned else 0))
+
+                    # Physical registers are used round-robin, such that stores write the initialized values
+                    operation = self.build_main_operation(f"%{cc.set_variable(registers[k % len(registers)], 'vec', size_column=vector.column)}", f"{displacement}({bases[i]},{offset})")
+                    vector.add_statement(cc, operation[0], *operation[1:])
+                    cc.unset_variable('vec')
+                cc.add_statement(f"addq", f"${portions * vector.bytes}", offset)
+
+            cc.add_statement("xorq", offset, offset)
+            self.runtime_blocks(cc, vectors, portion_unrolls, lambda portions: operations(vector, pointers, portions), pointer=offset, step=vector.bytes)
+
+            # The values beyond the strides are processed in order
+            remaining = f"%{cc.get_register(variable='remaining')}"
+            cc.add_statement("imul", f"${stride_unrolls * vector.values}", vectors, remaining)
+            cc.add_statement("negq", remaining)
+            cc.add_statement("addq", size, remaining)
+            cc.add_statement("leaq", f"({pointers[-1]},{stride_bytes})", f"%{cc.get_register(variable='Dp')}")
+            cc.add_statement("xorq", offset, offset)
+            self.runtime_vector_blocks(cc, remaining, portion_unrolls, lambda vector, portions: operations(vector, [f"%{cc.get_variable('Dp')}"], portions), pointer=offset)
+
+            cc.unset_variable("D")
+            cc.unset_variable("size")
+            cc.unset_variable("stack_ptr")
+            cc.unset_variable("stride_bytes")
+            for i in range(1, stride_unrolls):
+                cc.unset_variable(f"P{i}")
+            cc.unset_variable("offset")
+            cc.unset_variable("remaining")
+            cc.unset_variable("Dp")
+
+    def test(self, configuration, test_data_dir):
+        N = configuration["N"] 
+        unalignment_factor = configuration["unalignment_factor"]
 
-        W = trueN // stride_unrolls
+        trueN = self.get_exact_N(N, unalignment_factor=unalignment_factor)
+        offset = 1 if self.unaligned else 0
 
         m = ((np.random.randint(100, size=(N)) / 10) - 5).astype(self.experiment.constants.nd_type)
 
         self.write_test_input(test_data_dir, m)
 
-        for k in range (W // portion_unroll_values):
-            for i in range(stride_unrolls):
-                for j in range(portion_unroll_values):
-                    m[k * portion_unroll_values + i * W + j] = 0
+        m[offset:offset + trueN] = 0
         
         self.write_test_output(test_data_dir, m)
 
@@ -7,12 +7,11 @@ class MxVBaseGenerator(ComputeBaseGenerator):
     def __init__(self, experiment, kernel_name, testing=False):
         super().__init__(experiment, kernel_name, testing=testing)
 
+    def get_true_P(self, configuration):
+        return self.get_true_N(configuration["P"], configuration["stride_unrolls"], configuration["portion_unrolls"], unalignment_factor=configuration["unalignment_factor"])
+
     def test(self, configuration, test_data_dir):
-        P = configuration["P"]
-        stride_unrolls = configuration["stride_unrolls"]
-        portion_unrolls = configuration["portion_unrolls"]
-        unalignment_factor = configuration["unalignment_factor"]
-        trueP = self.get_true_N(P, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor)
+        trueP = self.get_true_P(configuration)
         
         a = ((np.random.randint(100, size=(trueP, trueP)) / 10) - 5).astype(self.experiment.constants.nd_type)
         b = ((np.random.randint(100, size=(trueP)) / 10) - 5).astype(self.experiment.constants.nd_type)
@@ -55,7 +55,7 @@ class BicGGenerator(BicGBaseGenerator):
             cc.add_statement("addq", offset, R)
             cc.add_statement("movq", stack_ptr, frame_ptr)
             cc.add_statement("subq", f"${self.aligned(trueX * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
-            cc.add_statement("andq", "$-32", stack_ptr)
+            cc.add_statement("andq", f"$-{self.experiment.constants.simd_vec_bytes}", stack_ptr)
 
             if self.testing:
                 zero_vec = f"%{cc.get_register(register_set='simd', variable='zero_vec')}"
@@ -107,7 +107,7 @@ class BicGGenerator(BicGBaseGenerator):
 
                     cc.add_statement("addq", f"${self.aligned(portion_unroll_bytes)}", D)
                     cc.add_statement("addq", f"${self.aligned(portion_unroll_bytes)}", S)
-                cc.add_statement("addq", f"${self.aligned(stride_unrolls * 8 * 4)}", stack_ptr)
+                cc.add_statement("addq", f"${self.aligned(stride_unrolls * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
                 cc.add_statement("addq", f"${stride_unrolls * self.experiment.constants.dtype_size_bytes}", R)
                 cc.add_statement("addq", f"${self.aligned(trueX * (stride_unrolls - 1) * self.experiment.constants.dtype_size_bytes)}", D)
                 cc.add_statement("subq", f"${self.aligned(trueX * self.experiment.constants.dtype_size_bytes)}", S)
@@ -119,17 +119,11 @@ class BicGGenerator(BicGBaseGenerator):
                 cc.add_statement("subq", f"${self.aligned(trueX * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
                 with For(cc, f"${trueX}"):
                     q_vec_y = f"%{cc.get_register(register_set='simd', variable='q_vec')}"
-                    q_vec_x = f"%{cc.get_variable('q_vec', size_column=2)}"
                     ancilla = f"%{cc.get_register(register_set='simd', variable='ancilla_vec', size_column=2)}"
         
                     cc.add_statement("vmovups", f"({stack_ptr})", q_vec_y)
-                    cc.add_statement("vextractf128", "$1", q_vec_y, ancilla)
-                    cc.add_statement("vaddps", q_vec_x, ancilla, q_vec_x)
-                    cc.add_statement("vmovhlps", q_vec_x, q_vec_x, ancilla)
-                    cc.add_statement("vaddps", q_vec_x, ancilla, q_vec_x)
-                    cc.add_statement("vshufps", "$85", q_vec_x, q_vec_x, ancilla)
-                    cc.add_statement("vaddss", ancilla, q_vec_x, q_vec_x)
-                    cc.add_statement("vmovss", q_vec_x, f"({Q})")
+                    self.horizontal_sum(cc, 'q_vec', 'ancilla_vec')
+                    cc.add_statement("vmovss", ancilla, f"({Q})")
                     cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", stack_ptr)
                     cc.add_statement("addq", f"${self.experiment.constants.dtype_size_bytes}", Q)
 
@@ -24,15 +24,6 @@ class BicGOptGenerator(BicGBaseGenerator):
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
 
-        # reserve unroll_i registers for q
-        # reserve unroll_i registers for r
-        # reserve at least one register for s
-        # reserve at least one register for p
-        # reserve at least one register for a <- can be used in writeback
-        if 2 * stride_unrolls + 3 > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-
         portion_unroll_init_values = portion_unrolls_init * self.experiment.constants.simd_vec_values
         portion_unroll_init_bytes = portion_unrolls_init * self.experiment.constants.simd_vec_bytes
         portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
@@ -128,16 +119,10 @@ class BicGOptGenerator(BicGBaseGenerator):
 
                 # Write back Q
                 for i in range(stride_unrolls):
-                    q_register = f"%{cc.get_variable(variable=f'q{i}')}"
-                    q_register_x = f"%{cc.get_variable(variable=f'q{i}', size_column=2)}"
-                    
                     ancilla = f"%{cc.get_register(register_set='simd', variable='ancilla', size_column=2)}"
                     
                     offset_q = self.z(i * self.experiment.constants.dtype_size_bytes)
-                    cc.add_statement("vextractf128", "$0x1", q_register, ancilla)
-                    cc.add_statement("vaddps", q_register_x, ancilla, ancilla)
-                    cc.add_statement("vhaddps", ancilla, ancilla, ancilla)
-                    cc.add_statement("vhaddps", ancilla, ancilla, ancilla)
+                    self.horizontal_sum(cc, f'q{i}', 'ancilla')
                     cc.add_statement("vmovss", ancilla, f"{offset_q}({Q})")
                     
                     cc.unset_variable(f'q{i}')
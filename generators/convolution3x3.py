@@ -21,11 +21,9 @@ class Convolution3x3Generator(ComputeBaseGenerator):
         N = self.get_size_to_allocate_i(configuration)
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
         unalignment_factor = configuration["unalignment_factor"]
         
-        trueX = self.get_true_N(X - 2, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor)
+        trueX = self.get_exact_N(X - 2, unalignment_factor=unalignment_factor)
         
         if trueX is None:
             Logger.warn(f"Cannot generate for {self.kernel_name}")
@@ -69,39 +67,33 @@ class Convolution3x3Generator(ComputeBaseGenerator):
             cc.add_statement("vbroadcastss", f"{7 * self.experiment.constants.dtype_size_bytes}({D})", CL)
             cc.add_statement("vbroadcastss", f"{8 * self.experiment.constants.dtype_size_bytes}({D})", RL)
 
-            with For(cc, f"${(trueX - 2) // stride_unrolls}"):
-                with For(cc, f"${(trueX - 2) // portion_unroll_values}"):
-                    for i in range(portion_unrolls):
-                        for j in range(stride_unrolls):
-                            out_vec = f"%{cc.get_register(register_set='simd', variable='out')}"
-
-                            offset_lu = self.z(((j + 0) * trueX + i * self.experiment.constants.simd_vec_values + 0) * self.experiment.constants.dtype_size_bytes)
-                            offset_cu = self.z(((j + 0) * trueX + i * self.experiment.constants.simd_vec_values + 1) * self.experiment.constants.dtype_size_bytes)
-                            offset_ru = self.z(((j + 0) * trueX + i * self.experiment.constants.simd_vec_values + 2) * self.experiment.constants.dtype_size_bytes)
-                            offset_lc = self.z(((j + 1) * trueX + i * self.experiment.constants.simd_vec_values + 0) * self.experiment.constants.dtype_size_bytes)
-                            offset_cc = self.z(((j + 1) * trueX + i * self.experiment.constants.simd_vec_values + 1) * self.experiment.constants.dtype_size_bytes)
-                            offset_rc = self.z(((j + 1) * trueX + i * self.experiment.constants.simd_vec_values + 2) * self.experiment.constants.dtype_size_bytes)
-                            offset_ld = self.z(((j + 2) * trueX + i * self.experiment.constants.simd_vec_values + 0) * self.experiment.constants.dtype_size_bytes)
-                            offset_cd = self.z(((j + 2) * trueX + i * self.experiment.constants.simd_vec_values + 1) * self.experiment.constants.dtype_size_bytes)
-                            offset_rd = self.z(((j + 2) * trueX + i * self.experiment.constants.simd_vec_values + 2) * self.experiment.constants.dtype_size_bytes)
-
-                            cc.add_statement("vmulps", f"{offset_lu}({I})", LU, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_cu}({I})", CU, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_ru}({I})", RU, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_lc}({I})", LC, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_cc}({I})", CC, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_rc}({I})", RC, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_ld}({I})", LL, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_cd}({I})", CL, out_vec)
-                            cc.add_statement("vfmadd231ps", f"{offset_rd}({I})", RL, out_vec)
-                            cc.add_statement("vmovups", out_vec, f"{offset_cc}({O})")
+            # Rows and columns that do not fill a block are processed by tails with fewer strides, vectors or single values
+            def rows(strides):
+                def columns(vector, portions):
+                    weights = [f"%{cc.get_variable(variable, size_column=vector.column)}" for variable in ['left_upper', 'center_upper', 'right_upper', 'left_center', 'center_center', 'right_center', 'left_lower', 'center_lower', 'right_lower']]
+
+                    for i in range(portions):
+                        for j in range(strides):
+                            out_vec = f"%{cc.get_register(register_set='simd', variable='out', size_column=vector.column)}"
+
+                            offsets = [self.z(((j + row) * trueX + column) * self.experiment.constants.dtype_size_bytes + i * vector.bytes) for row in range(3) for column in range(3)]
+
+                            vector.add_statement(cc, "vmulps", f"{offsets[0]}({I})", weights[0], out_vec)
+                            for offset_w, weight in zip(offsets[1:], weights[1:]):
+                                vector.add_statement(cc, "vfmadd231ps", f"{offset_w}({I})", weight, out_vec)
+                            vector.add_statement(cc, "vmovups", out_vec, f"{offsets[4]}({O})")
 
                             cc.unset_variable("out")
 
-                    cc.add_statement("addq", f"${portion_unroll_bytes}", I)
-                    cc.add_statement("addq", f"${portion_unroll_bytes}", O)
-                cc.add_statement("addq", f"${((stride_unrolls - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", I)
-                cc.add_statement("addq", f"${((stride_unrolls - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", O)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", I)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", O)
+
+                self.vector_blocks(cc, trueX - 2, portion_unrolls, columns, pointer=I)
+
+                cc.add_statement("addq", f"${((strides - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", I)
+                cc.add_statement("addq", f"${((strides - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", O)
+
+            self.blocks(cc, trueX - 2, stride_unrolls, rows, down=True)
 
             cc.unset_variable('right_lower')
             cc.unset_variable('center_lower')
@@ -123,10 +115,8 @@ class Convolution3x3Generator(ComputeBaseGenerator):
 
     def test(self, configuration, test_data_dir):
         X = configuration["X"]
-        stride_unrolls = configuration["stride_unrolls"]
-        portion_unrolls = configuration["portion_unrolls"]
         unalignment_factor = configuration["unalignment_factor"]
-        trueX = self.get_true_N(X - 2, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor) + 2
+        trueX = self.get_exact_N(X - 2, unalignment_factor=unalignment_factor) + 2
 
         c = ((np.random.randint(100, size=(16)) / 10) - 5).astype(self.experiment.constants.nd_type)
         a = ((np.random.randint(100, size=(trueX, trueX)) / 10) - 5).astype(self.experiment.constants.nd_type)
@@ -24,15 +24,13 @@ class DoitgenGenerator(DoitgenBaseGenerator):
 
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
         unalignment_factor = configuration["unalignment_factor"]
 
-        trueP = self.get_true_N(P, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor)
-        trueR = self.get_true_N(R, 1, 1)
+        trueP = self.get_exact_N(P, unalignment_factor=unalignment_factor)
+        trueR = self.get_exact_N(R)
 
         if not trueR is None and not trueP is None and trueR > trueP:
-            trueR = self.get_true_N(trueP, 1, 1)
+            trueR = trueP
 
         if trueP is None or trueR is None:
             Logger.warn(f"Cannot generate for {self.kernel_name}")
@@ -49,61 +47,72 @@ class DoitgenGenerator(DoitgenBaseGenerator):
 
             cc.add_statement("movq", f"${trueP}", offset)
             cc.add_statement("imul", f"${trueP * self.experiment.constants.dtype_size_bytes}", offset)
-            self.aligned(trueP * trueP * self.experiment.constants.dtype_size_bytes)
 
-            cc.add_statement("leaq", f"{self.aligned(trueP * self.experiment.constants.dtype_size_bytes)}({D})", C4)
+            cc.add_statement("leaq", f"{trueP * self.experiment.constants.dtype_size_bytes}({D})", C4)
             cc.add_statement("movq", C4, Sum)
             cc.add_statement("addq", offset, Sum)
 
+            # Sum is not aligned for all sizes of P, so it is accessed by unaligned moves
             if self.testing:
-                zero_vec = f"%{cc.get_register(register_set='simd', variable='zero_vec')}"
-                
-                cc.add_statement("vxorps", zero_vec, zero_vec, zero_vec)
-                with For (cc, f"${trueP // self.experiment.constants.simd_vec_values}"):
-                    cc.add_statement("vmovntdq", zero_vec, f"({Sum})")
-                    cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", Sum)
-                cc.add_statement("subq", f"${self.aligned(trueP * self.experiment.constants.dtype_size_bytes)}", Sum)
+                zero_vec = cc.get_register(register_set='simd', variable='zero_vec')
+                cc.add_statement("vxorps", f"%{zero_vec}", f"%{zero_vec}", f"%{zero_vec}")
+
+                def zero(vector, portions):
+                    for i in range(portions):
+                        vector.add_statement(cc, "vmovups", f"%{cc.get_variable('zero_vec', size_column=vector.column)}", f"{self.z(i * vector.bytes)}({Sum})")
+                    cc.add_statement("addq", f"${portions * vector.bytes}", Sum)
+
+                self.vector_blocks(cc, trueP, 1, zero, pointer=Sum)
+                cc.add_statement("subq", f"${trueP * self.experiment.constants.dtype_size_bytes}", Sum)
 
                 cc.unset_variable("zero_vec")
-                
-            with For(cc, f"${trueP // stride_unrolls}"):
-                with For(cc, f"${trueP // portion_unroll_values}"):
-                    for i in range(portion_unrolls):
-                        for j in range(stride_unrolls):
-                            ymm_sum = f"%{cc.get_register(register_set='simd', variable='sum')}"
-                            ymm_a = f"%{cc.get_register(register_set='simd', variable='a')}"
-
-                            offset_sum = self.aligned_z(i * self.experiment.constants.simd_vec_bytes)
+
+            # Rows and columns that do not fill a block are processed by tails with fewer strides, vectors or single values
+            def rows(strides):
+                def columns(vector, portions):
+                    for i in range(portions):
+                        for j in range(strides):
+                            ymm_sum = f"%{cc.get_register(register_set='simd', variable='sum', size_column=vector.column)}"
+                            ymm_a = f"%{cc.get_register(register_set='simd', variable='a', size_column=vector.column)}"
+
+                            offset_sum = self.z(i * vector.bytes)
                             offset_a = self.z(j * self.experiment.constants.dtype_size_bytes)
-                            offset_c4 = self.aligned_z(i * self.experiment.constants.simd_vec_bytes + j * trueP * self.experiment.constants.dtype_size_bytes)
+                            offset_c4 = self.z(i * vector.bytes + j * trueP * self.experiment.constants.dtype_size_bytes)
 
-                            cc.add_statement("vmovaps", f"{offset_sum}({Sum})", ymm_sum)
+                            vector.add_statement(cc, "vmovups", f"{offset_sum}({Sum})", ymm_sum)
                             cc.add_statement("vbroadcastss", f"{offset_a}({D})", ymm_a)
-                            cc.add_statement("vfmadd231ps", f"{offset_c4}({C4})", ymm_a, ymm_sum)
-                            cc.add_statement("vmovaps", ymm_sum, f"{offset_sum}({Sum})")
+                            vector.add_statement(cc, "vfmadd231ps", f"{offset_c4}({C4})", ymm_a, ymm_sum)
+                            vector.add_statement(cc, "vmovups", ymm_sum, f"{offset_sum}({Sum})")
 
                             cc.unset_variable("sum")
                             cc.unset_variable("a")
 
-                    cc.add_statement("addq", f"${self.aligned(portion_unroll_bytes)}", C4)
-                    cc.add_statement("addq", f"${self.aligned(portion_unroll_bytes)}", Sum)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", C4)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", Sum)
+
+                self.vector_blocks(cc, trueP, portion_unrolls, columns, pointer=Sum)
                 
-                cc.add_statement("subq", f"${self.aligned(trueP * self.experiment.constants.dtype_size_bytes)}", Sum)
-                cc.add_statement("addq", f"${self.aligned(trueP * (stride_unrolls - 1) * self.experiment.constants.dtype_size_bytes)}", C4)
-                cc.add_statement("addq", f"${stride_unrolls * self.experiment.constants.dtype_size_bytes}", D)
+                cc.add_statement("subq", f"${trueP * self.experiment.constants.dtype_size_bytes}", Sum)
+                cc.add_statement("addq", f"${trueP * (strides - 1) * self.experiment.constants.dtype_size_bytes}", C4)
+                cc.add_statement("addq", f"${strides * self.experiment.constants.dtype_size_bytes}", D)
+
+            self.blocks(cc, trueP, stride_unrolls, rows, down=True)
       
             cc.add_statement("subq", f"${trueP * self.experiment.constants.dtype_size_bytes}", D)
         
             if self.testing:
-                with For (cc, f"${trueR // self.experiment.constants.simd_vec_values}"):
-                    ymm_sum = f"%{cc.get_register(register_set='simd', variable='sum')}"
-                    
-                    cc.add_statement("vmovaps", f"({Sum})", ymm_sum)
-                    cc.add_statement("vmovntdq", ymm_sum, f"({D})")
-                    cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", Sum)
-                    cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", D)
-                    
-                    cc.unset_variable("sum")
+                def copy(vector, portions):
+                    for i in range(portions):
+                        ymm_sum = f"%{cc.get_register(register_set='simd', variable='sum', size_column=vector.column)}"
+                        
+                        vector.add_statement(cc, "vmovups", f"{self.z(i * vector.bytes)}({Sum})", ymm_sum)
+                        vector.add_statement(cc, "vmovups", ymm_sum, f"{self.z(i * vector.bytes)}({D})")
+                        
+                        cc.unset_variable("sum")
+                    cc.add_statement("addq", f"${portions * vector.bytes}", Sum)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", D)
+
+                self.vector_blocks(cc, trueR, 1, copy, pointer=D)
 
             cc.add_statement("subq", f"${trueR * self.experiment.constants.dtype_size_bytes}", D)
 
@@ -118,16 +127,14 @@ class DoitgenGenerator(DoitgenBaseGenerator):
         R = configuration["R"]
         Q = configuration["Q"]
 
-        stride_unrolls = configuration["stride_unrolls"]
-        portion_unrolls = configuration["portion_unrolls"]
         unalignment_factor = configuration["unalignment_factor"]
 
-        trueP = self.get_true_N(P, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor)
-        trueR = self.get_true_N(R, 1, 1)
+        trueP = self.get_exact_N(P, unalignment_factor=unalignment_factor)
+        trueR = self.get_exact_N(R)
         trueQ = Q
 
         if not trueR is None and not trueP is None and trueR > trueP:
-            trueR = self.get_true_N(trueP, 1, 1)
+            trueR = trueP
         
         a = ((np.random.randint(100, size=(trueP)) / 10) - 5).astype(self.experiment.constants.nd_type)
         c4 = ((np.random.randint(100, size=(trueP, trueP)) / 10) - 5).astype(self.experiment.constants.nd_type)
@@ -36,10 +36,6 @@ class DoitgenOptGenerator(DoitgenBaseGenerator):
         portion_unrolls_write = configuration["portion_unrolls_write"]
         unalignment_factor = configuration["unalignment_factor"]
 
-        if stride_unrolls + portion_unrolls > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-
         trueP = self.get_true_N(P, [stride_unrolls_init, stride_unrolls, stride_unrolls_write], [portion_unrolls_init, portion_unrolls, portion_unrolls_write], unalignment_factor=unalignment_factor)
 
         if trueP is None:
@@ -109,15 +109,10 @@ class GemverMxVGenerator(GemverMxVTBaseGenerator):
                     ancilla = f"%{cc.get_register(register_set='simd', variable='ancilla_vec', size_column=2)}"
 
                     cc.add_statement("vmovups", f"({stack_ptr})", w_vec_y)
-                    cc.add_statement("vextractf128", "$1", w_vec_y, ancilla)
-                    cc.add_statement("vaddps", w_vec_x, ancilla, w_vec_x)
-                    cc.add_statement("vmovhlps", w_vec_x, w_vec_x, ancilla)
-                    cc.add_statement("vaddps", w_vec_x, ancilla, w_vec_x)
-                    cc.add_statement("vshufps", "$85", w_vec_x, w_vec_x, ancilla)
-                    cc.add_statement("vaddss", ancilla, w_vec_x, w_vec_x)
-                    cc.add_statement("vbroadcastss", f"({W})", ancilla)
-                    cc.add_statement("vaddss", ancilla, w_vec_x, w_vec_x)
-                    cc.add_statement("vmovss", w_vec_x, f"({W})")
+                    self.horizontal_sum(cc, 'w', 'ancilla_vec')
+                    cc.add_statement("vbroadcastss", f"({W})", w_vec_x)
+                    cc.add_statement("vaddss", w_vec_x, ancilla, ancilla)
+                    cc.add_statement("vmovss", ancilla, f"({W})")
                     cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", stack_ptr)
                     cc.add_statement("addq", f"${self.experiment.constants.dtype_size_bytes}", W)
                     
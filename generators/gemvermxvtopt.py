@@ -35,10 +35,6 @@ class GemverMxVTOptGenerator(GemverMxVBaseGenerator):
 
         trueN = self.get_size_to_allocate_i({"P": trueP})
 
-        if stride_unrolls + 2 > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-
         with CodeContext(self, stride_unrolls, portion_unrolls, N, trueN, suffix=configuration["suffix"], test_function_configuration=(self.test, configuration) if self.testing else None) as cc:
             D = f"%{cc.set_variable('rdi', variable='D')}"
             stack_ptr = f"%{cc.set_variable('rsp', variable='stack_ptr')}"
@@ -54,18 +54,6 @@ class GemverOptGenerator(GemverOuterBaseGenerator):
 
         trueN = self.get_size_to_allocate_i({"P": trueP})
 
-        if stride_unrolls_outer * 2 + 3 > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-
-        if stride_unrolls_mxvt + 2 > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-        
-        if stride_unrolls_mxv + 2 > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-
         with CodeContext(self, mode, 1, N, trueN, suffix=configuration["suffix"], test_function_configuration=(self.test, configuration) if self.testing else None) as cc:
             D = f"%{cc.set_variable('rdi', variable='D')}"
             stack_ptr = f"%{cc.set_variable('rsp', variable='stack_ptr')}"
@@ -249,16 +237,12 @@ class GemverOptGenerator(GemverOuterBaseGenerator):
 
                 for i in range(stride_unrolls_mxv):
                     offset_a = self.aligned_z(i * trueP * self.experiment.constants.dtype_size_bytes + j * self.experiment.constants.simd_vec_bytes)
-                    ymm_w = cc.get_variable(f'w{i}')
                     xmm_w = cc.get_variable(f'w{i}', size_column=2)
                     ancilla = cc.get_register(register_set='simd', variable='ancilla', size_column=2)
 
                     offset_w = self.z(i * self.experiment.constants.dtype_size_bytes)
 
-                    cc.add_statement("vextractf128", "$0x1", f"%{ymm_w}", f"%{ancilla}")
-                    cc.add_statement("vaddps", f"%{xmm_w}", f"%{ancilla}", f"%{ancilla}")
-                    cc.add_statement("vhaddps", f"%{ancilla}", f"%{ancilla}", f"%{ancilla}")
-                    cc.add_statement("vhaddps", f"%{ancilla}", f"%{ancilla}", f"%{ancilla}")
+                    self.horizontal_sum(cc, f'w{i}', 'ancilla')
                     cc.add_statement("vbroadcastss", f"{offset_w}({W})", f"%{xmm_w}")
                     cc.add_statement("vaddss", f"%{xmm_w}", f"%{ancilla}", f"%{ancilla}")
                     cc.add_statement("vmovss", f"%{ancilla}", f"{offset_w}({W})")
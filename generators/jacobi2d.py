@@ -21,10 +21,8 @@ class Jacobi2DGenerator(Jacobi2DBaseGenerator):
         N = self.get_size_to_allocate_i(configuration)
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
         unalignment_factor = configuration["unalignment_factor"]
-        trueX = self.get_true_N(X - 2, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor)
+        trueX = self.get_exact_N(X - 2, unalignment_factor=unalignment_factor)
 
         if trueX is None:
             Logger.warn(f"Cannot generate for {self.kernel_name}")
@@ -56,33 +54,39 @@ class Jacobi2DGenerator(Jacobi2DBaseGenerator):
             cc.add_statement("movq", D, O)
             cc.add_statement("addq", offset, O)
 
-            with For(cc, f"${(trueX - 2) // stride_unrolls}"):
-                with For(cc, f"${(trueX - 2) // portion_unroll_values}"):
-                    for i in range(portion_unrolls):
-                        for j in range(stride_unrolls):
-                            ymm = f"%{cc.get_register(register_set='simd', variable='vec')}"
-
-                            offset_u = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * self.experiment.constants.simd_vec_bytes + self.experiment.constants.dtype_size_bytes)
-                            offset_c = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * self.experiment.constants.simd_vec_bytes + self.experiment.constants.dtype_size_bytes + trueX * self.experiment.constants.dtype_size_bytes)
-                            offset_d = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * self.experiment.constants.simd_vec_bytes + self.experiment.constants.dtype_size_bytes + 2 * trueX * self.experiment.constants.dtype_size_bytes)
-                            offset_l = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * self.experiment.constants.simd_vec_bytes + trueX * self.experiment.constants.dtype_size_bytes)
-                            offset_r = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * self.experiment.constants.simd_vec_bytes + 2 * self.experiment.constants.dtype_size_bytes + trueX * self.experiment.constants.dtype_size_bytes)
-
-                            cc.add_statement("vmovups", f"{offset_u}({I})", ymm)
-                            cc.add_statement("vaddps", f"{offset_l}({I})", ymm, ymm)
-                            cc.add_statement("vaddps", f"{offset_c}({I})", ymm, ymm)
-                            cc.add_statement("vaddps", f"{offset_r}({I})", ymm, ymm)
-                            cc.add_statement("vaddps", f"{offset_d}({I})", ymm, ymm)
-                            cc.add_statement("vmulps", ymm, alpha, ymm)
-                            cc.add_statement("vmovups", ymm, f"{offset_c}({O})")
+            # Rows and columns that do not fill a block are processed by tails with fewer strides, vectors or single values
+            def rows(strides):
+                def columns(vector, portions):
+                    for i in range(portions):
+                        for j in range(strides):
+                            ymm = f"%{cc.get_register(register_set='simd', variable='vec', size_column=vector.column)}"
+                            xmm_alpha = f"%{cc.get_variable('alpha', size_column=vector.column)}"
+
+                            offset_u = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * vector.bytes + self.experiment.constants.dtype_size_bytes)
+                            offset_c = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * vector.bytes + self.experiment.constants.dtype_size_bytes + trueX * self.experiment.constants.dtype_size_bytes)
+                            offset_d = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * vector.bytes + self.experiment.constants.dtype_size_bytes + 2 * trueX * self.experiment.constants.dtype_size_bytes)
+                            offset_l = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * vector.bytes + trueX * self.experiment.constants.dtype_size_bytes)
+                            offset_r = self.z(j * trueX * self.experiment.constants.dtype_size_bytes + i * vector.bytes + 2 * self.experiment.constants.dtype_size_bytes + trueX * self.experiment.constants.dtype_size_bytes)
+
+                            vector.add_statement(cc, "vmovups", f"{offset_u}({I})", ymm)
+                            vector.add_statement(cc, "vaddps", f"{offset_l}({I})", ymm, ymm)
+                            vector.add_statement(cc, "vaddps", f"{offset_c}({I})", ymm, ymm)
+                            vector.add_statement(cc, "vaddps", f"{offset_r}({I})", ymm, ymm)
+                            vector.add_statement(cc, "vaddps", f"{offset_d}({I})", ymm, ymm)
+                            vector.add_statement(cc, "vmulps", ymm, xmm_alpha, ymm)
+                            vector.add_statement(cc, "vmovups", ymm, f"{offset_c}({O})")
 
                             cc.unset_variable("vec")
 
-                    cc.add_statement("addq",f"${portion_unroll_bytes}", I)
-                    cc.add_statement("addq",f"${portion_unroll_bytes}", O)
+                    cc.add_statement("addq",f"${portions * vector.bytes}", I)
+                    cc.add_statement("addq",f"${portions * vector.bytes}", O)
 
-                cc.add_statement("addq", f"${((stride_unrolls - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", I)
-                cc.add_statement("addq", f"${((stride_unrolls - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", O)
+                self.vector_blocks(cc, trueX - 2, portion_unrolls, columns, pointer=I)
+
+                cc.add_statement("addq", f"${((strides - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", I)
+                cc.add_statement("addq", f"${((strides - 1) * trueX + 2) * self.experiment.constants.dtype_size_bytes}", O)
+
+            self.blocks(cc, trueX - 2, stride_unrolls, rows, down=True)
 
             cc.unset_variable('D')
             cc.unset_variable('stack_ptr')
@@ -95,10 +99,8 @@ class Jacobi2DGenerator(Jacobi2DBaseGenerator):
     def test(self, configuration, test_data_dir):
         X = configuration["X"]
         S = configuration["S"]
-        stride_unrolls = configuration["stride_unrolls"]
-        portion_unrolls = configuration["portion_unrolls"]
         unalignment_factor = configuration["unalignment_factor"]
-        trueX = self.get_true_N(X - 2, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor) + 2
+        trueX = self.get_exact_N(X - 2, unalignment_factor=unalignment_factor) + 2
         
         a = ((np.random.randint(100, size=(trueX, trueX)) / 10) - 5).astype(self.experiment.constants.nd_type)
         b = ((np.random.randint(100, size=(trueX, trueX)) / 10) - 5).astype(self.experiment.constants.nd_type)
@@ -4,6 +4,8 @@ import os
 from .base import MxVBaseGenerator
 
 class MxVGenerator(MxVBaseGenerator):
+    size_keys = ["P"]
+
     def __init__(self, experiment, testing=False):
         super().__init__(experiment, "mxv")
         self.testing = testing
@@ -16,18 +18,31 @@ class MxVGenerator(MxVBaseGenerator):
     def get_size_to_allocate_i(self, configuration):
         return MxVGenerator.get_size_to_allocate(configuration)
 
+    def get_true_P(self, configuration):
+        return self.get_exact_N(configuration["P"], unalignment_factor=configuration["unalignment_factor"])
+
+    def get_sizes(self, configuration):
+        sizes = []
+        for size_configuration in configuration["sizes"]:
+            trueP = self.get_true_P(size_configuration)
+            if trueP is None:
+                Logger.warn(f"Cannot generate for {self.kernel_name}")
+                continue
+            sizes.append((self.get_size_to_allocate_i(size_configuration), self.get_size_to_allocate_i({"P": trueP}), trueP, size_configuration))
+        return sizes
+
     def build(self, configuration):
+        if "sizes" in configuration.keys():
+            return self.build_parametric(configuration)
+
         P = configuration["P"]
 
         N = self.get_size_to_allocate_i(configuration)
 
         stride_unrolls = configuration["stride_unrolls"]
         portion_unrolls = configuration["portion_unrolls"]
-        portion_unroll_values = portion_unrolls * self.experiment.constants.simd_vec_values
-        portion_unroll_bytes = portion_unrolls * self.experiment.constants.simd_vec_bytes
-        unalignment_factor = configuration["unalignment_factor"]
 
-        trueP = self.get_true_N(P, stride_unrolls, portion_unrolls, unalignment_factor=unalignment_factor)
+        trueP = self.get_true_P(configuration)
         
         if trueP is None:
             Logger.warn(f"Cannot generate for {self.kernel_name}")
@@ -45,14 +60,13 @@ class MxVGenerator(MxVBaseGenerator):
 
             cc.add_statement("movq", f"${trueP}", offset)
             cc.add_statement("imul", f"${trueP * self.experiment.constants.dtype_size_bytes}", offset)
-            self.aligned(trueP * trueP * self.experiment.constants.dtype_size_bytes)
 
             cc.add_statement("movq", D, B)
             cc.add_statement("addq", offset, B)
 
             cc.add_statement("movq", D, C)
             cc.add_statement("addq", offset, C)
-            cc.add_statement("addq", f"${self.aligned(trueP * self.experiment.constants.dtype_size_bytes)}", C)
+            cc.add_statement("addq", f"${trueP * self.experiment.constants.dtype_size_bytes}", C)
 
             cc.add_statement("movq", stack_ptr, frame_ptr)
             cc.add_statement("subq", f"${self.aligned(trueP * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
@@ -69,31 +83,36 @@ class MxVGenerator(MxVBaseGenerator):
 
                 cc.unset_variable("zero_vec")
             
-            with For(cc, f"${trueP // stride_unrolls}"):
-                with For(cc, f"${trueP // portion_unroll_values}"):
-                    for j in range(portion_unrolls):
-                        for i in range(stride_unrolls):
+            # Rows and columns that do not fill a block are processed by tails with fewer strides, vectors or single values
+            def rows(strides):
+                def columns(vector, portions):
+                    for j in range(portions):
+                        for i in range(strides):
                             offset_c = self.aligned_z(i * self.experiment.constants.simd_vec_bytes)
-                            offset_b = self.aligned_z(j * self.experiment.constants.simd_vec_bytes)
-                            offset_a = self.aligned_z(i * trueP * self.experiment.constants.dtype_size_bytes + j * self.experiment.constants.simd_vec_bytes)
+                            offset_b = self.z(j * vector.bytes)
+                            offset_a = self.z(i * trueP * self.experiment.constants.dtype_size_bytes + j * vector.bytes)
                             
-                            ymm_c = f"%{cc.get_register(register_set='simd', variable='c')}"
-                            ymm_b = f"%{cc.get_register(register_set='simd', variable='b')}"
+                            ymm_c = f"%{cc.get_register(register_set='simd', variable='c', size_column=vector.column)}"
+                            ymm_b = f"%{cc.get_register(register_set='simd', variable='b', size_column=vector.column)}"
 
-                            cc.add_statement("vmovaps", f"{offset_c}({stack_ptr})", ymm_c)
-                            cc.add_statement("vmovaps", f"{offset_b}({B})", ymm_b)
-                            cc.add_statement("vfmadd231ps", f"{offset_a}({D})", ymm_b, ymm_c)
-                            cc.add_statement("vmovaps", ymm_c, f"{offset_c}({stack_ptr})")
+                            vector.add_statement(cc, "vmovaps", f"{offset_c}({stack_ptr})", ymm_c)
+                            vector.add_statement(cc, "vmovups", f"{offset_b}({B})", ymm_b)
+                            vector.add_statement(cc, "vfmadd231ps", f"{offset_a}({D})", ymm_b, ymm_c)
+                            vector.add_statement(cc, "vmovaps", ymm_c, f"{offset_c}({stack_ptr})")
 
                             cc.unset_variable("c")
                             cc.unset_variable("b")
                     
-                    cc.add_statement("addq", f"${self.aligned(portion_unroll_bytes)}", D)
-                    cc.add_statement("addq", f"${self.aligned(portion_unroll_bytes)}", B)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", D)
+                    cc.add_statement("addq", f"${portions * vector.bytes}", B)
+
+                self.vector_blocks(cc, trueP, portion_unrolls, columns, pointer=D)
                 
-                cc.add_statement("addq", f"${self.aligned(trueP * (stride_unrolls - 1) * self.experiment.constants.dtype_size_bytes)}", D)
-                cc.add_statement("subq", f"${self.aligned(trueP * self.experiment.constants.dtype_size_bytes)}", B)
-                cc.add_statement("addq", f"${self.aligned(stride_unrolls * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
+                cc.add_statement("addq", f"${trueP * (strides - 1) * self.experiment.constants.dtype_size_bytes}", D)
+                cc.add_statement("subq", f"${trueP * self.experiment.constants.dtype_size_bytes}", B)
+                cc.add_statement("addq", f"${self.aligned(strides * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
+
+            self.blocks(cc, trueP, stride_unrolls, rows, down=True)
 
             cc.add_statement("subq", f"${self.aligned(trueP * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
             cc.add_statement("subq", offset, D)
@@ -116,15 +135,136 @@ class MxVGenerator(MxVBaseGenerator):
                     
                     cc.add_statement("vmovups", f"({stack_ptr})", c_vec_y)
                     cc.add_statement("vmulps", c_vec_y, ymm_alpha, c_vec_y)
-                    cc.add_statement("vextractf128", "$1", c_vec_y, ancilla)
-                    cc.add_statement("vaddps", c_vec_x, ancilla, c_vec_x)
-                    cc.add_statement("vmovhlps", c_vec_x, c_vec_x, ancilla)
-                    cc.add_statement("vaddps", c_vec_x, ancilla, c_vec_x)
-                    cc.add_statement("vshufps", "$85", c_vec_x, c_vec_x, ancilla)
-                    cc.add_statement("vaddss", ancilla, c_vec_x, c_vec_x)
-                    cc.add_statement("vmulps", f"({C})", xmm_beta, ancilla)
-                    cc.add_statement("vaddss", ancilla, c_vec_x, c_vec_x)
-                    cc.add_statement("vmovss", c_vec_x, f"({C})")
+                    self.horizontal_sum(cc, 'c', 'ancilla_vec')
+                    cc.add_statement("vmulps", f"({C})", xmm_beta, c_vec_x)
+                    cc.add_statement("vaddss", c_vec_x, ancilla, ancilla)
+                    cc.add_statement("vmovss", ancilla, f"({C})")
+                    cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", stack_ptr)
+                    cc.add_statement("addq", f"${self.experiment.constants.dtype_size_bytes}", C)
+                    
+                    cc.unset_variable("c")
+                    cc.unset_variable("ancilla_vec")     
+
+                cc.unset_variable("alpha")
+                cc.unset_variable("beta")
+
+            cc.add_statement("movq", frame_ptr, stack_ptr)
+
+            cc.unset_variable('D')
+            cc.unset_variable('frame_ptr')
+            cc.unset_variable('stack_ptr')
+            cc.unset_variable('offset')
+            cc.unset_variable('B')
+            cc.unset_variable('C')
+
+    def build_parametric(self, configuration):
+        stride_unrolls = configuration["stride_unrolls"]
+        portion_unrolls = configuration["portion_unrolls"]
+
+        sizes = self.get_sizes(configuration)
+        if not sizes:
+            return
+
+        with CodeContext(self, stride_unrolls, portion_unrolls, None, None, test_function_configuration=(self.test, configuration) if self.testing else None, sizes=sizes) as cc:
+            D = f"%{cc.set_variable('rdi', variable='D')}"
+            size = f"%{cc.set_variable('rsi', variable='size')}"
+            frame_ptr = f"%{cc.set_variable('rbp', variable='frame_ptr')}"
+            stack_ptr = f"%{cc.set_variable('rsp', variable='stack_ptr')}"
+            row_bytes = f"%{cc.get_register(variable='row_bytes')}"
+            stack_bytes = f"%{cc.get_register(variable='stack_bytes')}"
+            offset = f"%{cc.get_register(variable='offset')}"
+            B = f"%{cc.get_register(variable='B')}"
+            C = f"%{cc.get_register(variable='C')}"
+            column = f"%{cc.get_register(variable='column')}"
+
+            cc.add_statement("movq", size, row_bytes)
+            cc.add_statement("shlq", f"${self.experiment.constants.dtype_size_bytes.bit_length() - 1}", row_bytes)
+            cc.add_statement("movq", size, offset)
+            cc.add_statement("imul", row_bytes, offset)
+
+            cc.add_statement("leaq", f"({D},{offset})", B)
+            cc.add_statement("leaq", f"({B},{row_bytes})", C)
+
+            cc.add_statement("movq", size, stack_bytes)
+            cc.add_statement("shlq", f"${self.experiment.constants.simd_vec_bytes.bit_length() - 1}", stack_bytes)
+            cc.add_statement("movq", stack_ptr, frame_ptr)
+            cc.add_statement("subq", stack_bytes, stack_ptr)
+            cc.add_statement("andq", f"$-{self.experiment.constants.simd_vec_bytes}", stack_ptr)
+
+            if self.testing:
+                zero_vec = f"%{cc.get_register(register_set='simd', variable='zero_vec')}"
+                
+                cc.add_statement("vxorps", zero_vec, zero_vec, zero_vec)
+                with For (cc, size):
+                    cc.add_statement("vmovntdq", zero_vec, f"({stack_ptr})")
+                    cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", stack_ptr)
+                cc.add_statement("subq", stack_bytes, stack_ptr)
+
+                cc.unset_variable("zero_vec")
+
+            # The rows of a block are addressed through a pointer per row and an offset shared with the columns of B
+            def rows(strides):
+                pointers = [D]
+                for i in range(1, strides):
+                    pointers.append(f"%{cc.get_register(variable=f'row{i}')}")
+                    cc.add_statement("leaq", f"({pointers[i - 1]},{row_bytes})", pointers[i])
+
+                def columns(vector, portions):
+                    for j in range(portions):
+                        for i in range(strides):
+                            offset_c = self.aligned_z(i * self.experiment.constants.simd_vec_bytes)
+                            offset_j = self.z(j * vector.bytes)
+                            
+                            ymm_c = f"%{cc.get_register(register_set='simd', variable='c', size_column=vector.column)}"
+                            ymm_b = f"%{cc.get_register(register_set='simd', variable='b', size_column=vector.column)}"
+
+                            vector.add_statement(cc, "vmovaps", f"{offset_c}({stack_ptr})", ymm_c)
+                            vector.add_statement(cc, "vmovups", f"{offset_j}({B},{column})", ymm_b)
+                            vector.add_statement(cc, "vfmadd231ps", f"{offset_j}({pointers[i]},{column})", ymm_b, ymm_c)
+                            vector.add_statement(cc, "vmovaps", ymm_c, f"{offset_c}({stack_ptr})")
+
+                            cc.unset_variable("c")
+                            cc.unset_variable("b")
+                    
+                    cc.add_statement("addq", f"${portions * vector.bytes}", column)
+
+                cc.add_statement("xorq", column, column)
+                self.runtime_vector_blocks(cc, size, portion_unrolls, columns, pointer=column)
+                
+                cc.add_statement("leaq", f"({pointers[-1]},{row_bytes})", D)
+                cc.add_statement("addq", f"${self.aligned(strides * self.experiment.constants.simd_vec_bytes)}", stack_ptr)
+
+                # Row pointers are released, as the tail emits the rows again with fewer strides
+                for i in range(1, strides):
+                    cc.unset_variable(f"row{i}")
+
+            self.runtime_blocks(cc, size, stride_unrolls, rows, down=True)
+
+            cc.add_statement("subq", stack_bytes, stack_ptr)
+            cc.add_statement("subq", offset, D)
+
+            if self.testing:
+                ymm_alpha = f"%{cc.get_register(register_set='simd', variable='alpha')}"
+                ymm_beta = f"%{cc.get_register(register_set='simd', variable='beta')}"
+                xmm_beta = f"%{cc.get_variable('beta', size_column=2)}"
+
+                cc.add_statement("movl", "$1083179008", f"-8({stack_ptr})")
+                cc.add_statement("movl", "$3213675725", f"-16({stack_ptr})")
+
+                cc.add_statement("vbroadcastss", f"-8({stack_ptr})", ymm_alpha)
+                cc.add_statement("vbroadcastss", f"-16({stack_ptr})", ymm_beta)
+
+                with For (cc, size):
+                    c_vec_y = f"%{cc.get_register(register_set='simd', variable='c')}"
+                    c_vec_x = f"%{cc.get_variable('c', size_column=2)}"
+                    ancilla = f"%{cc.get_register(register_set='simd', variable='ancilla_vec', size_column=2)}"
+                    
+                    cc.add_statement("vmovups", f"({stack_ptr})", c_vec_y)
+                    cc.add_statement("vmulps", c_vec_y, ymm_alpha, c_vec_y)
+                    self.horizontal_sum(cc, 'c', 'ancilla_vec')
+                    cc.add_statement("vmulps", f"({C})", xmm_beta, c_vec_x)
+                    cc.add_statement("vaddss", c_vec_x, ancilla, ancilla)
+                    cc.add_statement("vmovss", ancilla, f"({C})")
                     cc.add_statement("addq", f"${self.experiment.constants.simd_vec_bytes}", stack_ptr)
                     cc.add_statement("addq", f"${self.experiment.constants.dtype_size_bytes}", C)
                     
@@ -137,8 +277,12 @@ class MxVGenerator(MxVBaseGenerator):
             cc.add_statement("movq", frame_ptr, stack_ptr)
 
             cc.unset_variable('D')
+            cc.unset_variable('size')
             cc.unset_variable('frame_ptr')
             cc.unset_variable('stack_ptr')
+            cc.unset_variable('row_bytes')
+            cc.unset_variable('stack_bytes')
             cc.unset_variable('offset')
             cc.unset_variable('B')
-            cc.unset_variable('C')
\ No newline at end of file
+            cc.unset_variable('C')
+            cc.unset_variable('column')
\ No newline at end of file
@@ -33,10 +33,6 @@ class MxVOptGenerator(MxVBaseGenerator):
             Logger.warn(f"Cannot generate for {self.kernel_name}")
             return
 
-        if stride_unrolls + 2 > self.experiment.constants.n_simd_regs:
-            Logger.note(f"Not generating for more than {self.experiment.constants.n_simd_regs} registers!")
-            return
-
         trueN = self.get_size_to_allocate_i({"P": trueP})
 
         with CodeContext(self, stride_unrolls, portion_unrolls, N, trueN, suffix=configuration["suffix"], test_function_configuration=(self.test, configuration) if self.testing else None) as cc:
@@ -105,10 +101,7 @@ class MxVOptGenerator(MxVBaseGenerator):
                     xmm_c = f"%{cc.get_variable(f'c{i}', size_column=2)}"
                     
                     cc.add_statement("vmulps", ymm_c, ymm_alpha, ymm_c)
-                    cc.add_statement("vextractf128", "$0x1", ymm_c, ancilla)
-                    cc.add_statement("vaddps", xmm_c, ancilla, ancilla)
-                    cc.add_statement("vhaddps", ancilla, ancilla, ancilla)
-                    cc.add_statement("vhaddps", ancilla, ancilla, ancilla)
+                    self.horizontal_sum(cc, f'c{i}', 'alpha' if i == 0 else 'ancilla')
 
                     if i < 3:
                         if i == 0:
@@ -8,13 +8,25 @@ import shutil
 REALPATH=os.path.dirname(os.path.realpath(__file__))
 
 def usage():
-    print(f"Usage {sys.argv[0]} E/T <machine> <experiment[,...]> [-g]")
+    print(f"Usage {sys.argv[0]} E/T <machine> <experiment[,...]> [-g] [-j] [-f] [-l] [-p] [-r] [-s] [-t] [-n <policy>] [-m <pages[,...]>] [-c <mode[,...]>] [-e <tolerance>[,<seconds>]] [-w <width[,...]>]")
     print(f"Usage {sys.argv[0]} P <machine> [<experiment[,...]>]")
     print(f"Usage {sys.argv[0]} U [<machine[,...]>]")
     print(f"Usage {sys.argv[0]} D [<machine[,...]>]")
     print(f"Usage {sys.argv[0]} C [-a]")
     print("Options include: ")
     print("\t-g: Debug mode")
+    print("\t-j: Execute generated kernels in-process instead of linking a binary per configuration")
+    print("\t-f: Link all configurations of a kernel into a single binary that dispatches over them")
+    print("\t-l: Remove redundant loads and stores from generated compute kernels instead of preserving their instructions")
+    print("\t-p: Pass problem sizes to generated kernels at runtime, building one binary per striding configuration for all sizes")
+    print("\t-r: Reuse the initialized data of the benchmark harness across runs, removing it once the experiments are done")
+    print("\t-s: Pass test data to the benchmark harness through shared memory instead of files in the resources directory")
+    print("\t-t: Additionally run the data movement kernels on 1 up to all cores at once, each on its own data")
+    print("\t-n: NUMA policy for the data of the benchmark harness, of local, remote, interleave or node<n> (default: none or that of the machine)")
+    print(f"\t-m: Pages backing the data of the benchmark harness, of {', '.join(config.memory_page_sizes.keys())} (default: those of the experiment)")
+    print(f"\t-c: State of the caches at the start of every repetition, of {', '.join(config.memory_cache_modes.keys())} (default: warm)")
+    print(f"\t-e: Repeat timed kernels until the confidence interval of their median is within a relative tolerance or a time budget per kernel is spent (default budget: {config.ADAPTIVE_BUDGET} seconds)")
+    print(f"\t-w: Vector widths to generate code for, of {', '.join(config.simd_vector_widths.keys())} (default: {config.DEFAULT_VECTOR_WIDTH})")
     print("\t-a: Clean all, so also the resources and results directories")
     exit()
 
@@ -60,17 +72,43 @@ def exec():
     configuration_options = {}
     configuration_options["realpath"] = REALPATH
     configuration_options["debug"] = "-g" in options
+    configuration_options["jit"] = "-j" in options
+    configuration_options["dispatch"] = "-f" in options
+    configuration_options["lean"] = "-l" in options
+    configuration_options["parametric"] = "-p" in options
+    configuration_options["dataset"] = "-r" in options
+    configuration_options["shared_test_data"] = "-s" in options
+    configuration_options["scaling"] = "-t" in options
+    if "-n" in options and options.index("-n") + 1 < len(options):
+        configuration_options["numa"] = options[options.index("-n") + 1]
+    if "-m" in options and options.index("-m") + 1 < len(options):
+        configuration_options["page_sizes"] = options[options.index("-m") + 1].split(',')
+    if "-c" in options and options.index("-c") + 1 < len(options):
+        configuration_options["cache_modes"] = options[options.index("-c") + 1].split(',')
+    if "-e" in options and options.index("-e") + 1 < len(options):
+        adaptive = [float(value) for value in options[options.index("-e") + 1].split(',')]
+        configuration_options["tolerance"] = adaptive[0]
+        if len(adaptive) > 1:
+            configuration_options["budget"] = adaptive[1]
+    if "-w" in options and options.index("-w") + 1 < len(options):
+        configuration_options["vector_widths"] = options[options.index("-w") + 1].split(',')
 
     experiments = config.configure(machine_name, experiment_names, **configuration_options)
 
     for experiment in experiments:
         if mode == "T":
             experiment.test()
+            experiment.report_tests()
         else:
             if mode != "P":
-                experiment.run()
+                experiment.sweep()
             experiment.plot()
 
+    if configuration_options["dataset"]:
+        config.clean_datasets(machine_name)
+    if configuration_options["shared_test_data"]:
+        config.clean_test_data(machine_name)
+
 def clean():
     for _, experiment_class in config.experiment_configurations.items():
         experiment_class.clean(REALPATH)
@@ -1,3 +1,4 @@
+#define _GNU_SOURCE
 #include "util.h"
 
 #include <math.h>
@@ -5,107 +6,794 @@
 #include <stdlib.h>
 #include <stddef.h>
 #include <errno.h>
+#include <fcntl.h>
+#include <linux/mempolicy.h>
+#include <pthread.h>
+#include <sched.h>
 #include <sys/mman.h>
+#include <sys/stat.h>
+#include <sys/syscall.h>
+#include <sys/vfs.h>
 #include <string.h>
 #include <time.h>
+#include <unistd.h>
 
+#define MAP_HUGE_2MB (21 << MAP_HUGE_SHIFT)
 #define MAP_HUGE_1GB (30 << MAP_HUGE_SHIFT)
-#define HUGEPAGE_SIZE (1UL << 30)  // 1GB hugepage size
 
+// Pages backing the data, from regular pages, transparent huge pages to 2MB and 1GB hugetlb pages
+#define PAGES_REGULAR 1
+#define PAGES_TRANSPARENT 2
+#define PAGES_HUGE_2MB 3
+#define PAGES_HUGE_1GB 4
+
+#ifndef PAGES
+#ifdef MMAP_FLAG_HUGE
+#define PAGES PAGES_HUGE_1GB
+#else
+#define PAGES PAGES_REGULAR
+#endif
+#endif
+
+// State of the caches at the start of every repetition, from warm, flushing the data, sweeping a buffer larger than the
+// last level cache, to flushing the data before every other repetition
+#define CACHE_WARM 1
+#define CACHE_FLUSH 2
+#define CACHE_SWEEP 3
+#define CACHE_MIXED 4
+
+#ifndef CACHE
+#define CACHE CACHE_WARM
+#endif
+
+// Bytes swept between repetitions, twice the last level cache when 0
+#ifndef SWEEP_SIZE
+#define SWEEP_SIZE 0
+#endif
+
+#define CACHE_LINE 64
+#define DEFAULT_LLC_SIZE (32UL << 20)
+
+// Allocations are rounded up to the largest page size in use
+#if PAGES == PAGES_HUGE_1GB
+#define HUGEPAGE_SIZE (1UL << 30)
+#else
+#define HUGEPAGE_SIZE (1UL << 21)
+#endif
+
+// Datasets are backed by files on tmpfs for regular pages and on hugetlbfs for hugetlb pages
+#if PAGES == PAGES_REGULAR
+#define DATASET_VARIABLE "MULTISTRIDING_DATASET"
+#elif PAGES >= PAGES_HUGE_2MB
+#define DATASET_VARIABLE "MULTISTRIDING_HUGE_DATASET"
+#endif
+
+// Notices go to the stream that does not hold the results, perf writes its results to stderr
+#if defined(TIME) || defined(SAMPLES) || defined(THREADS) || defined(DISPATCH)
+#define NOTICES stderr
+#else
+#define NOTICES stdout
+#endif
+
+#ifdef MMAP_POPULATE
+#define MMAP_POPULATE_FLAGS MAP_POPULATE
+#else
+#define MMAP_POPULATE_FLAGS 0
+#endif
+
+#ifndef INIT_THREADS
+#define INIT_THREADS 1
+#endif
+
+#ifndef INIT_STRIDES
+#define INIT_STRIDES 8
+#endif
+
+#ifndef MISMATCH_REPORT
+#define MISMATCH_REPORT 10
+#endif
+
+#define SLICE_ALIGNMENT (1UL << 21)  // Slices of threads do not share pages
+
+// Repetitions only adapt when every repetition is timed on its own, throughput and test runs repeat exactly as configured
+#if defined(ADAPTIVE) && (defined(TESTING) || defined(TIME) || !(defined(SAMPLES) || defined(DISPATCH)))
+#undef ADAPTIVE
+#endif
+
+#ifdef ADAPTIVE
+// Relative half-width of the confidence interval of the median to reach, in parts per million
+#ifndef TOLERANCE_PPM
+#define TOLERANCE_PPM 10000
+#endif
+
+// Time to spend on warming up and repeating a kernel, of which warming up takes at most half
+#ifndef TIME_BUDGET_MS
+#define TIME_BUDGET_MS 10000
+#endif
+
+#ifndef MAX_REPETITIONS
+#define MAX_REPETITIONS 10000
+#endif
+
+#ifndef MAX_WARMUP
+#define MAX_WARMUP 100
+#endif
+
+#define TOLERANCE (TOLERANCE_PPM / 1e6)
+#define STEADY_WINDOW 3  // Consecutive warmup samples within the tolerance of each other
+#else
+// Runs that do not adapt repeat exactly as configured, whatever maximum was passed along with the adaptive macros
+#undef MAX_REPETITIONS
+#define MAX_REPETITIONS REPETITIONS
+#endif
+
+#ifdef PARAMETRIC
+// The number of values to allocate and the problem size are given on the command line, such that a kernel serves all sizes
+#define SIZE_ARGUMENTS 2
+size_t N;
+size_t size;
+#else
+#define SIZE_ARGUMENTS 0
 #ifndef N
 extern const size_t N;
 #endif
+#endif
 
-void check_data_initialize(float * D, char * input_filename) {   
-    FILE *fptr;
+#ifdef DISPATCH
+// Dispatch table of all configurations in a multi-configuration kernel
+extern void (* const experiments[])(float *);
+extern const char * const experiment_names[];
+extern const size_t n_experiments;
+#endif
+
+// Whether the data is backed by hugetlb pages, which cannot be partially unmapped
+static int hugetlb = 0;
+
+// Map anonymous memory backed by the pages of PAGES, falling back to smaller pages when huge pages are not reserved
+static void * allocate(size_t size, int flags) {
+    int pages = PAGES;
+    for (; pages >= PAGES_HUGE_2MB; --pages) {
+        void * D = mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_ANONYMOUS | MAP_PRIVATE | MAP_HUGETLB | (pages == PAGES_HUGE_1GB ? MAP_HUGE_1GB : MAP_HUGE_2MB) | flags, -1, 0);
+        if (D != MAP_FAILED) {
+            hugetlb = 1;
+            return D;
+        }
+        fprintf(NOTICES, "Cannot map %s hugetlb pages, falling back to smaller pages.\n", pages == PAGES_HUGE_1GB ? "1GB" : "2MB");
+    }
+
+    // Aligned such that transparent huge pages can back the data, which are advised before it is populated
+    size_t alignment = 1UL << 21;
+    char * base = (char *) mmap(NULL, size + alignment, PROT_READ | PROT_WRITE, MAP_ANONYMOUS | MAP_PRIVATE | (flags & ~MAP_POPULATE), -1, 0);
+    if (base == MAP_FAILED) {
+        return MAP_FAILED;
+    }
+    char * D = (char *) (((size_t) base + alignment - 1) & ~(alignment - 1));
+    if (D > base) {
+        munmap(base, D - base);
+    }
+    if (base + alignment > D) {
+        munmap(D + size, base + alignment - D);
+    }
+
+    madvise(D, size, pages == PAGES_TRANSPARENT ? MADV_HUGEPAGE : MADV_NOHUGEPAGE);
+    #ifdef MADV_POPULATE_WRITE
+    if (flags & MAP_POPULATE) {
+        madvise(D, size, MADV_POPULATE_WRITE);
+    }
+    #endif
+    return D;
+}
 
+// Map the input file into the data, test data in memory, such as on /dev/shm, is then not copied
+void check_data_initialize(float * D, char * input_filename) {   
     #ifdef testN
     size_t N_expected = testN;
     #else
     size_t N_expected = N;
     #endif
 
-    if ((fptr = fopen(input_filename, "r")) == NULL){
+    int fd = open(input_filename, O_RDONLY);
+    struct stat file_stat;
+    if (fd < 0 || fstat(fd, &file_stat) != 0) {
         printf("Cannot open file %s.", input_filename);
         exit(1);
     }
 
-    fseek(fptr, 0, SEEK_END);
-    size_t num_elements = ftell(fptr) / sizeof(float);
-    fseek(fptr, 0, SEEK_SET);
-
+    size_t num_elements = file_stat.st_size / sizeof(float);
     if (num_elements != N_expected) {
         printf("Wrong number of values in input testfile %s: expected %lu, got %lu.\n", input_filename, N_expected, num_elements);
-        fclose(fptr); 
+        close(fd);
         exit(1);
     }
 
-    size_t read_elements = fread(D, sizeof(float), num_elements, fptr);
+    if (file_stat.st_size > 0) {
+        // Hugetlb pages cannot be partially replaced, the values are copied from the mapped file instead
+        void * input;
+        if (hugetlb) {
+            input = mmap(NULL, file_stat.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        } else {
+            input = mmap(D, file_stat.st_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_FIXED, fd, 0);
+        }
 
-    if (read_elements != num_elements) {
-        perror("Something went wrong reading file.");
-        fclose(fptr); 
-        exit(1);
+        if (input == MAP_FAILED) {
+            perror("Something went wrong mapping file.");
+            close(fd);
+            exit(1);
+        }
+
+        if (hugetlb) {
+            memcpy(D, input, file_stat.st_size);
+            munmap(input, file_stat.st_size);
+        }
     }
 
-    fclose(fptr); 
+    close(fd);
 }
 
-int check_data_compare(float * D, char * output_filename) {   
-    int valid = 1;
-    FILE *fptr;
+// Flush values close to zero, avoiding signed zeroes
+static inline __m128 flush_zero(__m128 x, __m128 sign) {
+    return _mm_andnot_ps(_mm_cmplt_ps(_mm_andnot_ps(sign, x), _mm_set1_ps(0.00001f)), x);
+}
 
+int check_data_compare(float * D, char * output_filename) {   
     #ifdef testN
     size_t N_expected = testN;
     #else
     size_t N_expected = N;
     #endif
 
-    if ((fptr = fopen(output_filename, "r")) == NULL){
+    int fd = open(output_filename, O_RDONLY);
+    struct stat file_stat;
+    if (fd < 0 || fstat(fd, &file_stat) != 0) {
         printf("Cannot open file %s.", output_filename);
         exit(1);
     }
 
-    fseek(fptr, 0, SEEK_END);
-    size_t num_elements = ftell(fptr) / sizeof(float);
-    fseek(fptr, 0, SEEK_SET);
-
+    size_t num_elements = file_stat.st_size / sizeof(float);
     if (num_elements != N_expected) {
         printf("Wrong number of values in output testfile %s: expected %lu, got %lu.\n", output_filename, N_expected, num_elements);
-        fclose(fptr); 
+        close(fd);
         exit(1);
     }
 
-    float f;
-    for (size_t i = 0; i < N_expected; ++i) {
-        if (fread(&f, sizeof(float), 1, fptr) != 1) {
-            perror("Error reading file");
-            fclose(fptr);
+    const float * expected = NULL;
+    if (file_stat.st_size > 0) {
+        expected = (const float *) mmap(NULL, file_stat.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (expected == MAP_FAILED) {
+            perror("Error mapping file");
+            close(fd);
             exit(1);
-        } 
+        }
+        madvise((void *) expected, file_stat.st_size, MADV_SEQUENTIAL);
+    }
+    close(fd);
+
+    // Mismatches are counted and only the first are reported, along with the largest errors over all values
+    size_t mismatches = 0;
+    size_t reported[MISMATCH_REPORT];
+    const __m128 sign = _mm_set1_ps(-0.0f);
+    __m128 max_absolute = _mm_setzero_ps();
+    __m128 max_relative = _mm_setzero_ps();
+
+    size_t vectors = N_expected / 4 * 4;
+    for (size_t i = 0; i < N_expected; i += 4) {
+        __m128 f, d;
+        if (i < vectors) {
+            f = _mm_load_ps(&expected[i]);
+            d = _mm_load_ps(&D[i]);
+        } else {
+            float f_tail[4] = {0}, d_tail[4] = {0};
+            memcpy(f_tail, &expected[i], (N_expected - i) * sizeof(float));
+            memcpy(d_tail, &D[i], (N_expected - i) * sizeof(float));
+            f = _mm_loadu_ps(f_tail);
+            d = _mm_loadu_ps(d_tail);
+        }
+        f = flush_zero(f, sign);
+        d = flush_zero(d, sign);
+
+        __m128 abs_f = _mm_andnot_ps(sign, f);
+        __m128 difference = _mm_andnot_ps(sign, _mm_sub_ps(d, f));
+        max_absolute = _mm_max_ps(max_absolute, difference);
+        max_relative = _mm_max_ps(max_relative, _mm_and_ps(_mm_cmpgt_ps(abs_f, _mm_setzero_ps()), _mm_div_ps(difference, abs_f)));
 
-        // Avoid signed zeroes
-        if (f < 0.00001 && f > -0.00001) {
-            f = 0;
+        // Large and small numbers must fall in specified margins
+        int mask = _mm_movemask_ps(_mm_and_ps(_mm_cmpgt_ps(difference, _mm_mul_ps(_mm_set1_ps(0.01f), abs_f)), _mm_cmpgt_ps(difference, _mm_set1_ps(1.0f))));
+        for (; mask; mask &= mask - 1) {
+            if (mismatches < MISMATCH_REPORT) {
+                reported[mismatches] = i + __builtin_ctz(mask);
+            }
+            ++mismatches;
         }
+    }
 
-        if (D[i] < 0.00001 && D[i] > -0.00001) {
-            D[i] = 0;
+    if (mismatches) {
+        float absolute[4], relative[4];
+        _mm_storeu_ps(absolute, max_absolute);
+        _mm_storeu_ps(relative, max_relative);
+        for (int l = 1; l < 4; ++l) {
+            absolute[0] = absolute[l] > absolute[0] ? absolute[l] : absolute[0];
+            relative[0] = relative[l] > relative[0] ? relative[l] : relative[0];
         }
 
-        // Margin
-        float abs_f = (f > 0)? f : -f;
+        printf("%lu of %lu values mismatch, maximum absolute error %f, maximum relative error %f.\n", mismatches, N_expected, absolute[0], relative[0]);
+        for (size_t m = 0; m < mismatches && m < MISMATCH_REPORT; ++m) {
+            printf("%lu Expected %f is not equal to actual %f.\n", reported[m], expected[reported[m]], D[reported[m]]);
+        }
+    }
 
-        // Large and small numbers must fall in specified margins
-        if ((D[i] + 0.01 * abs_f < f || D[i] - 0.01 * abs_f > f) && (D[i] + 1 < f || D[i] - 1 > f)) {
-            valid = 0;
-            printf("%lu Expected %f is not equal to actual %f.\n", i, f, D[i]);
+    if (expected != NULL) {
+        munmap((void *) expected, file_stat.st_size);
+    }
+    return mismatches == 0;
+}
+
+#ifndef TESTING
+// Fill with D[i] = i by non-temporal stores to INIT_STRIDES streams at once, the remaining values are filled in order
+static void fill(float * D, size_t begin, size_t end) {
+    const __m128i iota = _mm_setr_epi32(0, 1, 2, 3);
+    size_t vectors = (end - begin) / 4 / INIT_STRIDES;
+
+    for (size_t v = 0; v < vectors; ++v) {
+        for (size_t s = 0; s < INIT_STRIDES; ++s) {
+            size_t i = begin + (s * vectors + v) * 4;
+            _mm_stream_ps(&D[i], _mm_cvtepi32_ps(_mm_add_epi32(_mm_set1_epi32((int) i), iota)));
+        }
+    }
+
+    for (size_t i = begin + INIT_STRIDES * vectors * 4; i < end; ++i) {
+        D[i] = i;
+    }
+    _mm_sfence();
+}
+
+struct fill_range {
+    float * D;
+    size_t begin;
+    size_t end;
+};
+
+static void * fill_thread(void * argument) {
+    struct fill_range * range = (struct fill_range *) argument;
+    fill(range->D, range->begin, range->end);
+    return NULL;
+}
+
+// Initialize count values by INIT_THREADS threads, which touch their ranges first unless the mapping is populated
+static void initialize(float * D, size_t count) {
+    pthread_t threads[INIT_THREADS];
+    struct fill_range ranges[INIT_THREADS];
+    int started[INIT_THREADS];
+
+    // The threads may run on all cores, while the benchmark itself stays pinned
+    pthread_attr_t attributes;
+    pthread_attr_init(&attributes);
+    cpu_set_t cpus;
+    CPU_ZERO(&cpus);
+    for (long c = 0; c < sysconf(_SC_NPROCESSORS_ONLN) && c < CPU_SETSIZE; ++c) {
+        CPU_SET(c, &cpus);
+    }
+    pthread_attr_setaffinity_np(&attributes, sizeof(cpus), &cpus);
+
+    // Ranges are whole cache lines, such that the streams of every thread stay aligned
+    size_t chunk = count / INIT_THREADS / 16 * 16;
+    for (size_t t = 0; t < INIT_THREADS; ++t) {
+        ranges[t].D = D;
+        ranges[t].begin = t * chunk;
+        ranges[t].end = (t == INIT_THREADS - 1) ? count : (t + 1) * chunk;
+        started[t] = t > 0 && pthread_create(&threads[t], &attributes, fill_thread, &ranges[t]) == 0;
+    }
+
+    fill_thread(&ranges[0]);
+    for (size_t t = 1; t < INIT_THREADS; ++t) {
+        if (started[t]) {
+            pthread_join(threads[t], NULL);
+        } else {
+            fill_thread(&ranges[t]);
+        }
+    }
+    pthread_attr_destroy(&attributes);
+}
+
+// Reuse the dataset of previous runs from a file on tmpfs or hugetlbfs in the directory given by DATASET_VARIABLE
+// The private mapping is populated by copying the dataset, so kernels cannot modify it and take no page faults while timed
+static float * map_dataset(size_t aligned_size) {
+    #ifndef DATASET_VARIABLE
+    // Private copies of files are not backed by transparent huge pages
+    (void) aligned_size;
+    return NULL;
+    #else
+    const char * dataset_dir = getenv(DATASET_VARIABLE);
+    if (dataset_dir == NULL || dataset_dir[0] == '\0') {
+        return NULL;
+    }
+
+    // A hugetlbfs mount provides pages of a single size, which must match
+    #if PAGES >= PAGES_HUGE_2MB
+    struct statfs dataset_stat;
+    mkdir(dataset_dir, 0700);
+    if (statfs(dataset_dir, &dataset_stat) != 0 || (size_t) dataset_stat.f_bsize != (PAGES == PAGES_HUGE_1GB ? 1UL << 30 : 1UL << 21)) {
+        fprintf(NOTICES, "Dataset directory %s does not provide the requested hugetlb pages, initializing instead.\n", dataset_dir);
+        return NULL;
+    }
+    #endif
+
+    char path[4096];
+    snprintf(path, sizeof(path), "%s/dataset_%zu", dataset_dir, aligned_size);
+
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) {
+        // Build aside and move into place, runs may race to build the same dataset
+        char temp_path[sizeof(path) + 32];
+        snprintf(temp_path, sizeof(temp_path), "%s.%d.tmp", path, getpid());
+        mkdir(dataset_dir, 0700);
+
+        int temp_fd = open(temp_path, O_RDWR | O_CREAT | O_TRUNC, 0600);
+        if (temp_fd < 0 || ftruncate(temp_fd, aligned_size) != 0) {
+            perror("Cannot create dataset");
+            if (temp_fd >= 0) {
+                close(temp_fd);
+                unlink(temp_path);
+            }
+            return NULL;
+        }
+
+        float * dataset = (float *) mmap(NULL, aligned_size, PROT_READ | PROT_WRITE, MAP_SHARED, temp_fd, 0);
+        close(temp_fd);
+        if (dataset == MAP_FAILED) {
+            perror("Cannot map dataset");
+            unlink(temp_path);
+            return NULL;
+        }
+        initialize(dataset, aligned_size / sizeof(float));
+        munmap(dataset, aligned_size);
+
+        rename(temp_path, path);
+        fd = open(path, O_RDONLY);
+        if (fd < 0) {
+            perror("Cannot open dataset");
+            return NULL;
+        }
+    }
+
+    float * D = (float *) mmap(NULL, aligned_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_POPULATE, fd, 0);
+    close(fd);
+    if (D == MAP_FAILED) {
+        return NULL;
+    }
+    hugetlb = PAGES >= PAGES_HUGE_2MB;
+    return D;
+    #endif
+}
+
+#endif
+
+// Place the data by the NUMA policy in MULTISTRIDING_NUMA, relative to the node of the cpu the harness is pinned to
+static void place_data(void * D, size_t size) {
+    const char * policy = getenv("MULTISTRIDING_NUMA");
+    if (policy == NULL || policy[0] == '\0') {
+        return;
+    }
+
+    unsigned int cpu, node;
+    syscall(SYS_getcpu, &cpu, &node, NULL);
+
+    // Online nodes are listed as ranges, the last of which ends with the highest node
+    unsigned long nodes = 1;
+    FILE * online = fopen("/sys/devices/system/node/online", "r");
+    if (online != NULL) {
+        char line[256];
+        if (fgets(line, sizeof(line), online) != NULL) {
+            char * last = line + strcspn(line, "\n");
+            while (last > line && (last[-1] >= '0' && last[-1] <= '9')) {
+                --last;
+            }
+            nodes = strtoul(last, NULL, 10) + 1;
+        }
+        fclose(online);
+    }
+
+    int mode = MPOL_BIND;
+    unsigned long mask = 0;
+    unsigned int explicit_node;
+    if (strcmp(policy, "local") == 0) {
+        mask = 1UL << node;
+    } else if (strcmp(policy, "remote") == 0) {
+        if (nodes < 2) {
+            printf("No remote NUMA node to place the data on.\n");
+            exit(-1);
+        }
+        mask = 1UL << ((node + 1) % nodes);
+    } else if (strcmp(policy, "interleave") == 0) {
+        mode = MPOL_INTERLEAVE;
+        mask = nodes >= 64 ? ~0UL : (1UL << nodes) - 1;
+    } else if (sscanf(policy, "node%u", &explicit_node) == 1 && explicit_node < nodes && explicit_node < 64) {
+        mask = 1UL << explicit_node;
+    } else {
+        printf("Unknown NUMA policy %s.\n", policy);
+        exit(-1);
+    }
+
+    // Pages placed before, such as those of a populated mapping, are moved
+    if (syscall(SYS_mbind, D, size, mode, &mask, sizeof(mask) * 8, MPOL_MF_MOVE) != 0) {
+        perror("mbind failed");
+        exit(-1);
+    }
+}
+
+#if CACHE != CACHE_WARM && !defined(TESTING)
+#if CACHE == CACHE_SWEEP
+static char * sweep_buffer = NULL;
+static size_t sweep_size = 0;
+static volatile char sweep_sink;
+#endif
+
+static void allocate_sweep(void) {
+    #if CACHE == CACHE_SWEEP
+    sweep_size = SWEEP_SIZE;
+    if (sweep_size == 0) {
+        long llc = sysconf(_SC_LEVEL3_CACHE_SIZE);
+        if (llc <= 0) {
+            llc = sysconf(_SC_LEVEL2_CACHE_SIZE);
+        }
+        sweep_size = 2 * (llc > 0 ? (size_t) llc : DEFAULT_LLC_SIZE);
+    }
+
+    // Written once, such that its lines are backed by distinct pages instead of the zero page
+    sweep_buffer = mmap(NULL, sweep_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (sweep_buffer == MAP_FAILED) {
+        perror("mmap of sweep buffer failed");
+        exit(-1);
+    }
+    memset(sweep_buffer, 1, sweep_size);
+    #endif
+}
+
+// Evict the data from the caches before a repetition, outside of the timed region
+static void evict_caches(float * D, size_t size, unsigned int repetition) {
+    #if CACHE == CACHE_MIXED
+    if (repetition % 2) {
+        return;
+    }
+    #else
+    (void) repetition;
+    #endif
+
+    #if CACHE == CACHE_SWEEP
+    // Reading every line of the buffer also writes back the lines the kernel left dirty
+    (void) D;
+    (void) size;
+    char sum = 0;
+    for (size_t i = 0; i < sweep_size; i += CACHE_LINE) {
+        sum += sweep_buffer[i];
+    }
+    sweep_sink = sum;
+    #else
+    for (char * line = (char *) D; line < (char *) D + size; line += CACHE_LINE) {
+        _mm_clflush(line);
+    }
+    #endif
+    _mm_mfence();
+}
+#endif
+
+static inline long elapsed_ns(struct timespec * start, struct timespec * end) {
+    return (end->tv_sec - start->tv_sec) * 1000000000L + (end->tv_nsec - start->tv_nsec);
+}
+
+#ifndef DISPATCH
+static inline void run_experiment(float * D) {
+    #ifdef PARAMETRIC
+    experiment(D, size);
+    #else
+    experiment(D);
+    #endif
+}
+#endif
+
+#ifdef ADAPTIVE
+// Configuration e of the kernel, which only multi-configuration kernels dispatch over
+typedef void (* kernel_call)(float * D, size_t e);
+
+#ifdef DISPATCH
+static void call_dispatch(float * D, size_t e) {
+    experiments[e](D);
+}
+#else
+static void call_experiment(float * D, size_t e) {
+    (void) e;
+    run_experiment(D);
+}
+#endif
+
+static long time_call(kernel_call call, float * D, size_t e) {
+    struct timespec start, end;
+    clock_gettime(CLOCK_MONOTONIC_RAW, &start);
+    call(D, e);
+    clock_gettime(CLOCK_MONOTONIC_RAW, &end);
+    return elapsed_ns(&start, &end);
+}
+
+// Relative half-width of the 95% confidence interval of the median, from the order statistics of the sorted samples
+static double median_precision(long * sorted, unsigned int n) {
+    double spread = 1.96 * sqrt(n);
+    long lower = (long) floor((n - spread) / 2);
+    long upper = (long) ceil(1 + (n + spread) / 2);
+    lower = lower < 1 ? 1 : lower;
+    upper = upper > (long) n ? (long) n : upper;
+
+    double median = n % 2 ? sorted[n / 2] : (sorted[n / 2 - 1] + sorted[n / 2]) / 2.0;
+    return (sorted[upper - 1] - sorted[lower - 1]) / (2 * median);
+}
+
+// Warm up until steady, then repeat until the median is within the tolerance or the budget is spent, returning the number of samples
+static unsigned int run_adaptive(kernel_call call, float * D, size_t e, size_t data_size, long * samples, double * precision) {
+    struct timespec begin, now;
+    clock_gettime(CLOCK_MONOTONIC_RAW, &begin);
+
+    long window[STEADY_WINDOW];
+    for (unsigned int i = 0; i < MAX_WARMUP; ++i) {
+        window[i % STEADY_WINDOW] = time_call(call, D, e);
+        if (i + 1 >= STEADY_WINDOW) {
+            long lowest = window[0];
+            long highest = window[0];
+            for (unsigned int w = 1; w < STEADY_WINDOW; ++w) {
+                lowest = window[w] < lowest ? window[w] : lowest;
+                highest = window[w] > highest ? window[w] : highest;
+            }
+            if (highest - lowest <= TOLERANCE * lowest) {
+                break;
+            }
+        }
+
+        clock_gettime(CLOCK_MONOTONIC_RAW, &now);
+        if (elapsed_ns(&begin, &now) > TIME_BUDGET_MS * 500000L) {
+            break;
+        }
+    }
+
+    // Samples are also kept sorted by insertion, such that the median is at hand after every repetition
+    long sorted[MAX_REPETITIONS];
+    unsigned int n = 0;
+    while (n < MAX_REPETITIONS) {
+        #if CACHE != CACHE_WARM
+        evict_caches(D, data_size, n);
+        #else
+        (void) data_size;
+        #endif
+        samples[n] = time_call(call, D, e);
+
+        unsigned int j = n;
+        while (j > 0 && sorted[j - 1] > samples[n]) {
+            sorted[j] = sorted[j - 1];
+            --j;
+        }
+        sorted[j] = samples[n];
+        ++n;
+
+        *precision = median_precision(sorted, n);
+        clock_gettime(CLOCK_MONOTONIC_RAW, &now);
+        if (n >= REPETITIONS && (*precision <= TOLERANCE || elapsed_ns(&begin, &now) > TIME_BUDGET_MS * 1000000L)) {
+            break;
+        }
+    }
+    return n;
+}
+#endif
+
+#if defined(THREADS) && !defined(TESTING)
+struct slice {
+    float * D;
+    size_t count;
+    int cpu;
+    pthread_barrier_t * barrier;
+    struct timespec start[REPETITIONS];
+    struct timespec end[REPETITIONS];
+};
+
+static void * run_slice(void * argument) {
+    struct slice * slice = (struct slice *) argument;
+
+    // Pinned before touching the slice, such that its pages are placed near the core
+    cpu_set_t cpus;
+    CPU_ZERO(&cpus);
+    CPU_SET(slice->cpu, &cpus);
+    pthread_setaffinity_np(pthread_self(), sizeof(cpus), &cpus);
+    fill(slice->D, 0, slice->count);
+
+    for (unsigned int i = 0; i < WARMUP; ++i) {
+        run_experiment(slice->D);
+    }
+
+    // All threads start every repetition together, contending for the memory bandwidth
+    for (unsigned int i = 0; i < REPETITIONS; ++i) {
+        #if CACHE != CACHE_WARM
+        evict_caches(slice->D, slice->count * sizeof(float), i);
+        #endif
+        pthread_barrier_wait(slice->barrier);
+        clock_gettime(CLOCK_MONOTONIC_RAW, &slice->start[i]);
+        run_experiment(slice->D);
+        clock_gettime(CLOCK_MONOTONIC_RAW, &slice->end[i]);
+        pthread_barrier_wait(slice->barrier);
+    }
+    return NULL;
+}
+
+// Run the kernel on its own slice by every thread, printing the aggregate and per-thread throughput in GB/s per repetition
+static int run_threads(size_t threads, size_t data_size) {
+    cpu_set_t allowed;
+    sched_getaffinity(0, sizeof(allowed), &allowed);
+    if (threads < 1 || threads > (size_t) CPU_COUNT(&allowed)) {
+        printf("Expected between 1 and %d threads, got %lu.\n", CPU_COUNT(&allowed), threads);
+        return -2;
+    }
+
+    size_t slice_size = ((data_size + SLICE_ALIGNMENT - 1) / SLICE_ALIGNMENT) * SLICE_ALIGNMENT;
+    size_t aligned_size = ((threads * slice_size + HUGEPAGE_SIZE - 1) / HUGEPAGE_SIZE) * HUGEPAGE_SIZE;
+    float * D = (float*) allocate(aligned_size, 0);
+    if (D == MAP_FAILED) {
+        perror("mmap failed");
+        exit(-1);
+    }
+
+    // Threads touch their slices first, so local placement is left to them
+    const char * policy = getenv("MULTISTRIDING_NUMA");
+    if (policy != NULL && strcmp(policy, "local") != 0) {
+        place_data(D, aligned_size);
+    }
+
+    #if CACHE != CACHE_WARM
+    allocate_sweep();
+    #endif
+
+    pthread_barrier_t barrier;
+    pthread_barrier_init(&barrier, NULL, threads);
+    pthread_t * handles = malloc(threads * sizeof(pthread_t));
+    struct slice * slices = malloc(threads * sizeof(struct slice));
+
+    // Threads are pinned to the allowed cpus in order, such that taskset selects the cores
+    int cpu = -1;
+    for (size_t t = 0; t < threads; ++t) {
+        do {
+            ++cpu;
+        } while (!CPU_ISSET(cpu, &allowed));
+
+        slices[t].D = D + t * (slice_size / sizeof(float));
+        slices[t].count = slice_size / sizeof(float);
+        slices[t].cpu = cpu;
+        slices[t].barrier = &barrier;
+        if (pthread_create(&handles[t], NULL, run_slice, &slices[t]) != 0) {
+            perror("Cannot create thread");
+            exit(-1);
         }
     }
 
-    fclose(fptr);
-    return valid;
+    for (size_t t = 0; t < threads; ++t) {
+        pthread_join(handles[t], NULL);
+    }
+
+    // The aggregate throughput spans from the first start to the last end of a repetition
+    for (unsigned int i = 0; i < REPETITIONS; ++i) {
+        struct timespec * first = &slices[0].start[i];
+        struct timespec * last = &slices[0].end[i];
+        for (size_t t = 1; t < threads; ++t) {
+            first = elapsed_ns(first, &slices[t].start[i]) < 0 ? &slices[t].start[i] : first;
+            last = elapsed_ns(last, &slices[t].end[i]) > 0 ? &slices[t].end[i] : last;
+        }
+
+        printf("%f", (threads * data_size / (elapsed_ns(first, last) / 1e9)) / 1073741824);
+        for (size_t t = 0; t < threads; ++t) {
+            printf(",%f", (data_size / (elapsed_ns(&slices[t].start[i], &slices[t].end[i]) / 1e9)) / 1073741824);
+        }
+        printf("\n");
+    }
+
+    pthread_barrier_destroy(&barrier);
+    free(handles);
+    free(slices);
+    munmap(D, aligned_size);
+    return 0;
 }
+#endif
 
 int main (int argc, char ** argv) {
     #ifdef TIME
@@ -115,21 +803,54 @@ int main (int argc, char ** argv) {
     double cpu_time_used = 0;
     #endif
 
+    #if defined(SAMPLES) && !defined(DISPATCH)
+    // Only the kernel calls are timed, samples are printed after all repetitions to keep output out of the measurement
+    #ifndef ADAPTIVE
+    struct timespec sample_start, sample_end;
+    #endif
+    long samples[MAX_REPETITIONS];
+    #endif
+
+    #ifdef PARAMETRIC
+    if (argc < 1 + SIZE_ARGUMENTS) {
+        printf("Expected the number of values to allocate and the problem size.\n");
+        exit(-2);
+    }
+    N = strtoull(argv[argc - 2], NULL, 10);
+    size = strtoull(argv[argc - 1], NULL, 10);
+    #endif
+
     size_t data_size = N * sizeof(float);
+
+    #if defined(THREADS) && !defined(TESTING)
+    // The number of threads precedes the size arguments
+    if (argc < 2 + SIZE_ARGUMENTS) {
+        printf("Expected the number of threads.\n");
+        exit(-2);
+    }
+    return run_threads(strtoull(argv[1], NULL, 10), data_size);
+    #endif
+
     size_t aligned_size = ((data_size + HUGEPAGE_SIZE - 1) / HUGEPAGE_SIZE) * HUGEPAGE_SIZE;
-    #ifdef MMAP_FLAG_HUGE
-    float *D = (float*) mmap(NULL, aligned_size, PROT_READ | PROT_WRITE, MAP_ANONYMOUS | MAP_PRIVATE | MAP_HUGETLB | MAP_HUGE_1GB, -1, 0);
-    #else
-    float *D = (float*) mmap(NULL, aligned_size, PROT_READ | PROT_WRITE, MAP_ANONYMOUS | MAP_PRIVATE, -1, 0);
+    float *D = NULL;
+
+    #ifndef TESTING
+    D = map_dataset(aligned_size);
+    int initialized = D != NULL;
     #endif
 
+    if (D == NULL) {
+        D = (float*) allocate(aligned_size, MMAP_POPULATE_FLAGS);
+    }
+
     if (D == MAP_FAILED) {
         perror("mmap failed");
         exit(-1);
     }
+    place_data(D, aligned_size);
 
     #ifdef TESTING
-    if (argc > 2) {
+    if (argc > 2 + SIZE_ARGUMENTS) {
         printf("Initializing data...\n");
         check_data_initialize(D, argv[1]);
         printf("Done initializing data!\n");
@@ -142,21 +863,73 @@ int main (int argc, char ** argv) {
     (void) argv;
 
     // Initialize
-    for (unsigned int i = 0; i < aligned_size / sizeof(float); ++i) {
-        D[i] = i;
+    if (!initialized) {
+        initialize(D, aligned_size / sizeof(float));
     }
 
+    #ifndef DISPATCH
     // Warmup
     for (unsigned int i = 0; i < WARMUP; ++i){
-        experiment(D);
+        run_experiment(D);
     }
     #endif
 
+    #if CACHE != CACHE_WARM
+    allocate_sweep();
+    #endif
+    #endif
+
+    #ifdef DISPATCH
+    // Time every configuration on the same buffer, one row per configuration and repetition
+    for (size_t e = 0; e < n_experiments; ++e) {
+        for (unsigned int i = 0; i < WARMUP; ++i){
+            experiments[e](D);
+        }
+
+        #ifdef ADAPTIVE
+        // The precision of the median of a configuration follows its samples
+        long samples[MAX_REPETITIONS];
+        double precision;
+        unsigned int repetitions = run_adaptive(call_dispatch, D, e, data_size, samples, &precision);
+        for (unsigned int i = 0; i < repetitions; ++i) {
+            printf("%s,%u,%ld,%f\n", experiment_names[e], i, samples[i], precision);
+        }
+        #else
+        struct timespec dispatch_start, dispatch_end;
+        for (unsigned int i = 0; i < REPETITIONS; ++i) {
+            #if CACHE != CACHE_WARM && !defined(TESTING)
+            evict_caches(D, data_size, i);
+            #endif
+            clock_gettime(CLOCK_MONOTONIC_RAW, &dispatch_start);
+            experiments[e](D);
+            clock_gettime(CLOCK_MONOTONIC_RAW, &dispatch_end);
+            printf("%s,%u,%ld\n", experiment_names[e], i, elapsed_ns(&dispatch_start, &dispatch_end));
+        }
+        #endif
+    }
+    #elif defined(ADAPTIVE)
+    // Same layout as perf stat -x , with one row per repetition and the precision of the median as metric
+    double precision;
+    unsigned int repetitions = run_adaptive(call_experiment, D, 0, data_size, samples, &precision);
+    for (unsigned int i = 0; i < repetitions; ++i) {
+        printf("%ld,ns,kernel_time,%ld,100.00,%f,median_ci\n", samples[i], samples[i], precision);
+    }
+    #else
     for (unsigned int i = 0; i < REPETITIONS; ++i) {
+        #if CACHE != CACHE_WARM && !defined(TESTING)
+        evict_caches(D, data_size, i);
+        #endif
         #ifdef TIME
         clock_gettime(CLOCK_MONOTONIC_RAW, &start_clock);
         #endif
-        experiment(D);
+        #ifdef SAMPLES
+        clock_gettime(CLOCK_MONOTONIC_RAW, &sample_start);
+        #endif
+        run_experiment(D);
+        #ifdef SAMPLES
+        clock_gettime(CLOCK_MONOTONIC_RAW, &sample_end);
+        samples[i] = elapsed_ns(&sample_start, &sample_end);
+        #endif
         #ifdef TIME
         clock_gettime(CLOCK_MONOTONIC_RAW, &end_clock);
         start = start_clock.tv_sec + start_clock.tv_nsec / 1e9;
@@ -165,6 +938,14 @@ int main (int argc, char ** argv) {
         #endif
     }
 
+    #ifdef SAMPLES
+    // Same layout as perf stat -x , with one row per repetition
+    for (unsigned int i = 0; i < REPETITIONS; ++i) {
+        printf("%ld,ns,kernel_time,%ld,100.00,,\n", samples[i], samples[i]);
+    }
+    #endif
+    #endif
+
     int retval = 0;
 
     #ifdef TESTING
@@ -9,7 +9,11 @@
 extern "C" {
 #endif
 
+#ifdef PARAMETRIC
+void experiment(float * D, size_t size);
+#else
 void experiment(float * D);
+#endif
 
 #ifdef __cplusplus
 }